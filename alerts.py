@@ -0,0 +1,458 @@
+import os
+import time
+import queue
+import random
+import shutil
+import json
+import logging
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+from metrics import STAGE_SECONDS
+
+
+class Alert:
+    """One alert to deliver: the SMS text and the video clip around the detection (see clips.py)"""
+
+    def __init__(self, camera_name, message, clip, timestamp, priority=99, event_ids=None):
+        self.camera_name = camera_name
+        self.message = message
+        self.clip = clip
+        self.timestamp = timestamp
+        self.priority = priority    # clip upload order, lower first (the detection category, humans before farms)
+        self.event_ids = event_ids or []    # detections of the event store this alert is about
+        self.created_at = time.time()
+
+
+# ---------------------------------------------------------------------------
+# Backends. The Twilio/Cloudinary ones talk to the real services, the others are local stand-ins
+# with an optional artificial delay and failure rate, so the pipeline can be load-tested offline.
+# ---------------------------------------------------------------------------
+
+class TwilioSms:
+    """
+    Sends SMS through the Twilio API, with one client (and its kept-alive HTTPS session) for every message.
+    The client is only built in prepare() (called by the dispatcher off the startup path) or at the first SMS.
+    """
+
+    def __init__(self, account_sid, auth_token, from_number, to_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.to_number = to_number
+        self.client = None
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        with self._lock:
+            if self.client is None:
+                from twilio.rest import Client  # Twilio API, only needed when this backend is used
+                self.client = Client(self.account_sid, self.auth_token)
+        return self.client
+
+    def send(self, message):
+        client = self.client or self.prepare()
+        message = client.messages.create(
+            body=message,
+            from_=self.from_number,
+            to=self.to_number
+        )
+        print(f"SMS Sent: {message.sid}")
+        return message.sid
+
+
+class HttpSms:
+    """
+    Posts the SMS as JSON ({"to", "from", "body"}) to an HTTP gateway, e.g. a local GSM modem
+    service or the fake server of benchmarks/notifier_bench.py. Every delivery worker keeps its
+    own connection alive between messages, `keep_alive=False` opens a new one each time.
+    """
+
+    def __init__(self, url, to_number, from_number=None, token=None, timeout=10.0, keep_alive=True):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.netloc
+        self.path = parts.path or '/'
+        self.to_number = to_number
+        self.from_number = from_number
+        self.token = token
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.connections_opened = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self.connection_class(self.host, timeout=self.timeout)
+            self._local.connection = connection
+            self.connections_opened += 1
+        return connection
+
+    def _close(self):
+        self._local.connection.close()
+        self._local.connection = None
+
+    def send(self, message):
+        body = json.dumps({'to': self.to_number, 'from': self.from_number, 'body': message}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+
+        connection = self._connection()
+        try:
+            connection.request('POST', self.path, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self._close()   # the gateway may have closed an idle connection, the retry opens a new one
+            raise
+        if not self.keep_alive or response.will_close:
+            self._close()
+        if response.status >= 300:
+            raise ConnectionError(f"SMS gateway returned {response.status}: {data[:200]!r}")
+        try:
+            return json.loads(data).get('sid')
+        except ValueError:
+            return None
+
+
+class ConsoleSms:
+    """Prints the SMS instead of sending it"""
+
+    def __init__(self, delay=0.0, failure_rate=0.0, verbose=True):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.verbose = verbose      # False only counts the messages (benchmarks)
+        self.sent = 0
+
+    def send(self, message):
+        time.sleep(self.delay)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("simulated SMS failure")
+        self.sent += 1
+        if self.verbose:
+            print(f"[SMS] {message}")
+        return f"local-{self.sent}"
+
+
+class CloudinaryStorage:
+    """Uploads clips to Cloudinary, the SDK is imported and configured with `config` in prepare() or at the first upload"""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.uploader = None
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        with self._lock:
+            if self.uploader is None:
+                import cloudinary
+                import cloudinary.uploader
+                if self.config:
+                    cloudinary.config(**self.config)
+                self.uploader = cloudinary.uploader
+        return self.uploader
+
+    def upload(self, filename):
+        uploader = self.uploader or self.prepare()
+        result = uploader.upload(filename, resource_type="video")
+        link = result.get('secure_url')
+        print(f"[INFO] Uploaded to Cloudinary: {link}")
+        return link
+
+
+class LocalStorage:
+    """Copies clips into a local directory and returns a file:// link"""
+
+    def __init__(self, directory="./clips", delay=0.0, failure_rate=0.0):
+        self.directory = directory
+        self.delay = delay
+        self.failure_rate = failure_rate
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, filename):
+        time.sleep(self.delay)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("simulated upload failure")
+        destination = os.path.join(self.directory, os.path.basename(filename))
+        shutil.copy(filename, destination)
+        return f"file://{os.path.abspath(destination)}"
+
+
+class HttpStorage:
+    """
+    POSTs the clip to an HTTP endpoint (own server, or a stand-in for Cloudinary in tests), which
+    answers with JSON {"url": ...}. The file is streamed in chunks, so a bandwidth `throttle`
+    (see spool.TokenBucket) paces the upload itself.
+    """
+
+    def __init__(self, url, token=None, timeout=60.0, chunk_size=64 * 1024):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.netloc
+        self.path = parts.path or '/'
+        self.token = token
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.throttle = None
+
+    def _chunks(self, f):
+        while True:
+            chunk = f.read(self.chunk_size)
+            if not chunk:
+                return
+            if self.throttle is not None:
+                self.throttle.consume(len(chunk))
+            yield chunk
+
+    def upload(self, filename):
+        headers = {'Content-Type': 'video/mp4', 'Content-Length': str(os.path.getsize(filename)),
+                   'X-Filename': os.path.basename(filename)}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        connection = self.connection_class(self.host, timeout=self.timeout)
+        try:
+            with open(filename, 'rb') as f:
+                connection.request('POST', self.path, body=self._chunks(f), headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+        if response.status >= 300:
+            raise ConnectionError(f"Upload server returned {response.status}: {data[:200]!r}")
+        return json.loads(data)['url']
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts on a pool of background workers, so the detection loop never waits for
+    the clip encoding, the upload or the SMS.
+
+    Alerts go through a bounded queue. When it is full, `overflow` decides what happens:
+    'drop_oldest' throws away the oldest waiting alert, 'drop_newest' rejects the new one and
+    'block' waits up to `block_timeout` seconds for space before rejecting it.
+    Every SMS/upload is retried with an exponential backoff.
+
+    With a `spool` (spool.UploadSpool) clips are handed to the on-disk spool instead of being uploaded
+    here, and the SMS waits at most `link_wait` seconds for the link. After that it goes out without
+    it and the link follows in a second SMS as soon as the spool has uploaded the clip.
+    With an `event_store` (event_store.EventStore) the detections of every SMS sent are marked as
+    alerted there, with the clip link once it is known.
+    """
+
+    def __init__(self, sms_backend, storage_backend, workers=2, max_queue=8, overflow='drop_oldest',
+                 block_timeout=1.0, max_retries=3, retry_delay=1.0, clip_dir=".", spool=None, link_wait=20.0,
+                 event_store=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+
+        self.sms_backend = sms_backend
+        self.storage_backend = storage_backend
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.clip_dir = clip_dir
+        self.spool = spool
+        self.link_wait = link_wait
+        self.event_store = event_store
+        if spool is not None:
+            spool.on_uploaded = self._send_follow_up
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._submit_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.counters = {
+            'submitted': 0,
+            'delivered': 0,
+            'failed': 0,
+            'dropped': 0,
+            'retries': 0,
+        }
+        self.max_depth = 0
+        self.last_report = time.time()
+
+        self.workers = [threading.Thread(target=self._worker, name=f"alert-worker-{i}", daemon=True)
+                        for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        # SDK imports and client setup of the backends happen here, off the startup path, before the first alert
+        threading.Thread(target=self._prepare_backends, name="alert-prepare", daemon=True).start()
+
+    def _prepare_backends(self):
+        for backend in (self.sms_backend, self.storage_backend):
+            prepare = getattr(backend, 'prepare', None)
+            if prepare is None:
+                continue
+            try:
+                prepare()
+            except Exception as e:
+                logging.warning(f"Could not prepare {type(backend).__name__}, retrying at the first alert: {e}")
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def submit(self, alert):
+        """Queue an alert for delivery. Returns False if it was dropped because the queue is full."""
+        self._count('submitted')
+        with self._submit_lock:
+            try:
+                if self.overflow == 'block':
+                    self.queue.put(alert, timeout=self.block_timeout)
+                else:
+                    self.queue.put_nowait(alert)
+            except queue.Full:
+                if self.overflow != 'drop_oldest':
+                    self._drop(alert)
+                    return False
+                try:
+                    self._drop(self.queue.get_nowait())
+                    self.queue.task_done()
+                except queue.Empty:
+                    pass
+                self.queue.put_nowait(alert)
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _drop(self, alert):
+        self._count('dropped')
+        if alert.clip is not None:
+            alert.clip.release()
+        logging.warning(f"Alert queue full ({self.overflow}), dropped alert from {alert.camera_name} at {alert.timestamp}")
+
+    def _with_retries(self, what, func, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                self._count('retries')
+                logging.warning(f"{what} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _worker(self):
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                self.queue.task_done()
+                return
+            try:
+                self._deliver(alert)
+                self._count('delivered')
+            except Exception as e:
+                self._count('failed')
+                print(f"[ERROR] Alert delivery failed: {e}")
+                logging.error(f"Alert delivery failed for {alert.camera_name} at {alert.timestamp}: {e}")
+            finally:
+                if alert.clip is not None:
+                    alert.clip.release()    # lets the recorder delete segments nobody needs anymore
+                self.queue.task_done()
+
+    def _deliver(self, alert):
+        """Upload the clip first, so the alert and its link go out as one SMS"""
+        video_link = None
+        entry_id = None
+        if alert.clip is not None:
+            try:
+                if self.spool is not None:
+                    entry_id = self._spool_clip(alert)
+                    video_link = self.spool.wait(entry_id, self.link_wait)
+                else:
+                    video_link = self._upload_clip(alert)
+            except Exception as e:
+                print(f"[ERROR] Clip upload failed: {e}")
+                logging.warning(f"Video upload failed for {alert.camera_name} at {alert.timestamp}: {e}")
+
+        message = alert.message
+        if video_link:      # send the link of the video saved.
+            message += f"\nWatch video clip here: {video_link}"
+        try:
+            with STAGE_SECONDS.time('sms'):
+                self._with_retries("SMS", self.sms_backend.send, message)
+        finally:
+            if entry_id is not None and video_link:
+                self.spool.forget(entry_id)
+        logging.info(f"Sent SMS: {message}")
+        if self.event_store is not None:
+            self.event_store.mark_alerted(alert.event_ids, video_link)
+
+        if entry_id is not None and not video_link:
+            # The clip is safe in the spool, its link follows once the connection allows the upload
+            link = self.spool.request_follow_up(entry_id, f"Video clip of {alert.camera_name} ({alert.timestamp}): ")
+            if link:
+                self._send_follow_up({'event_ids': alert.event_ids, 'link': link},
+                                     f"Video clip of {alert.camera_name} ({alert.timestamp}): {link}")
+
+    def _send_follow_up(self, entry, message):
+        with STAGE_SECONDS.time('sms'):
+            self._with_retries("SMS", self.sms_backend.send, message)
+        logging.info(f"Sent SMS: {message}")
+        if self.event_store is not None:
+            self.event_store.mark_alerted(entry.get('event_ids'), entry.get('link'))
+
+    def _export_clip(self, alert, filename):
+        # A clip with post-roll is only complete a few seconds after the detection
+        alert.clip.wait()
+        with STAGE_SECONDS.time('clip_export'):
+            alert.clip.export(filename)
+
+    def _spool_clip(self, alert):
+        filename = self.spool.incoming_path()
+        try:
+            self._export_clip(alert, filename)
+            return self.spool.add(filename, alert.camera_name, alert.priority, alert.timestamp, alert.event_ids)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _upload_clip(self, alert):
+        filename = os.path.join(self.clip_dir, f"detection_{alert.camera_name}_{alert.timestamp}.mp4")
+        try:
+            self._export_clip(alert, filename)
+            with STAGE_SECONDS.time('upload'):
+                return self._with_retries("Clip upload", self.storage_backend.upload, filename)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def metrics(self):
+        """Snapshot of the queue depth and delivery counters"""
+        with self._counter_lock:
+            metrics = dict(self.counters)
+        metrics['queue_depth'] = self.queue.qsize()
+        metrics['max_queue_depth'] = self.max_depth
+        return metrics
+
+    def report_if_due(self, interval=10.0):
+        now = time.time()
+        if now - self.last_report < interval:
+            return None
+        self.last_report = now
+        metrics = self.metrics()
+        report = "[ALERTS] " + ", ".join(f"{name} {value}" for name, value in metrics.items())
+        logging.info(report)
+        return metrics
+
+    def stop(self, timeout=30.0):
+        """Let the workers finish what is queued, then shut them down"""
+        for _ in self.workers:
+            self.queue.put(None)
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            worker.join(timeout=max(0.0, deadline - time.time()))
+        if self.spool is not None:
+            self.spool.stop()
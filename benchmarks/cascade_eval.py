@@ -0,0 +1,85 @@
+"""
+Throughput and recall of the two-stage cascade against the single full-resolution pass.
+
+Runs both on the val split of animals.yaml, through the same engine main.py uses, and scores
+them the way main.py alerts: a ground-truth box counts as found when a detection of the same
+class with at least MIN_CONFIDENCE percent overlaps it with IoU >= 0.5.
+
+    python benchmarks/cascade_eval.py --engine torch --images 500 --output cascade_eval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2 as cv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cascade import Cascade
+from dataset_utils import dataset_images
+from engines import ENGINE_WEIGHTS, load_engine
+from roi import detect_frames
+from validation import ground_truth, score
+
+
+def evaluate(name, detect, frames, truths, min_confidence):
+    found = total = predicted = 0
+    start = time.perf_counter()
+    for frame, truth in zip(frames, truths):
+        boxes = detect([frame])[0]
+        tp, gt, det = score(truth, boxes, min_confidence)
+        found, total, predicted = found + tp, total + gt, predicted + det
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': name,
+        'fps': round(len(frames) / elapsed, 2),
+        'ms_per_frame': round(elapsed * 1000 / len(frames), 1),
+        'recall': round(found / max(total, 1), 4),
+        'precision': round(found / max(predicted, 1), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade vs single-pass detection on the val split")
+    parser.add_argument('--data', default='animals.yaml')
+    parser.add_argument('--engine', default='torch', choices=list(ENGINE_WEIGHTS))
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--min-confidence', type=int, default=85)
+    parser.add_argument('--screen-imgsz', type=int, default=320)
+    parser.add_argument('--screen-conf', type=float, default=0.25)
+    parser.add_argument('--output', default='cascade_eval.json')
+    args = parser.parse_args()
+
+    paths = dataset_images(args.data, 'val')[:args.images]
+    frames, truths = [], []
+    for path in paths:
+        frame = cv.imread(path)
+        if frame is not None:
+            frames.append(frame)
+            truths.append(ground_truth(path, frame.shape))
+    if not frames:
+        raise SystemExit(f"No val images found for {args.data}")
+
+    model = load_engine(args.engine, imgsz=args.imgsz, conf=(args.min_confidence - 1) / 100)
+    cascade = Cascade(screen_imgsz=args.screen_imgsz, screen_conf=args.screen_conf, confirm_imgsz=args.imgsz)
+    model.predict(frames[:2])   # warm-up
+
+    rows = [
+        evaluate('single-pass', lambda batch: detect_frames(model, batch, [None], args.imgsz, 1), frames, truths, args.min_confidence),
+        evaluate('cascade', lambda batch: cascade.detect(model, batch, [None], args.imgsz, 8), frames, truths, args.min_confidence),
+    ]
+    rows[1]['confirm_regions_per_frame'] = round(cascade.regions_confirmed / max(cascade.frames_screened, 1), 2)
+
+    with open(args.output, 'w') as f:
+        json.dump({'engine': args.engine, 'images': len(frames), 'results': rows}, f, indent=2)
+
+    print(f"\n{'mode':<13}{'fps':>8}{'ms/frame':>10}{'recall':>9}{'precision':>11}")
+    for row in rows:
+        print(f"{row['mode']:<13}{row['fps']:>8}{row['ms_per_frame']:>10}{row['recall']:>9}{row['precision']:>11}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
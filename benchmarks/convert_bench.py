@@ -0,0 +1,216 @@
+"""
+Speed of the dataset conversion (dataset_scripts/convert_to_YOLOv8Format.py) against the serial
+conversion it replaced (PIL size read, shutil.copy and per-line prints, kept below as legacy_convert),
+on a synthetic OIDv4 ToolKit download.
+
+Runs: the legacy conversion, a cold conversion per worker count, a rerun with nothing changed and a
+rerun after `--touch` percent of the labels changed. The YOLO labels of both conversions are compared.
+
+    python benchmarks/convert_bench.py --images 6600 --workers 1 4 8 --output convert_bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from glob import glob
+
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset_scripts'))
+import convert_to_YOLOv8Format as convert
+
+SIZES = [(1024, 768), (1024, 683), (768, 1024), (1024, 576), (800, 600), (1024, 1024)]
+
+
+def make_download(base, images, classes, seed):
+    """OIDv4_ToolKit/OID/Dataset/<split>/<Class>/ with JPEGs and a Label folder, 80% train"""
+    rng = np.random.default_rng(seed)
+    encoded = []
+    for width, height in SIZES:
+        # smooth gradient plus noise, compresses to the size of a typical photo
+        ramp = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        image = np.clip(ramp + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+        encoded.append((width, height, cv.imencode('.jpg', image, [cv.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()))
+
+    random_ = random.Random(seed)
+    for index in range(images):
+        split = 'train' if index % 5 else 'test'
+        animal = classes[index % len(classes)]
+        folder = os.path.join(base, split, animal)
+        os.makedirs(os.path.join(folder, 'Label'), exist_ok=True)
+        width, height, data = encoded[index % len(encoded)]
+        name = f"{index:016x}"
+        with open(os.path.join(folder, name + '.jpg'), 'wb') as f:
+            f.write(data)
+        lines = []
+        for _ in range(random_.randint(1, 4)):
+            x1, y1 = random_.uniform(0, width / 2), random_.uniform(0, height / 2)
+            lines.append(f"{animal} {x1:.2f} {y1:.2f} {x1 + random_.uniform(20, width / 2):.2f} "
+                         f"{y1 + random_.uniform(20, height / 2):.2f}\n")
+        with open(os.path.join(folder, 'Label', name + '.txt'), 'w') as f:
+            f.writelines(lines)
+
+
+def legacy_convert(source_base, output_base, classes):
+    """The conversion loop of convert_to_YOLOv8Format.py before the rewrite"""
+    from PIL import Image
+    for split in ['train', 'test']:
+        os.makedirs(f"{output_base}/images/{split}", exist_ok=True)
+        os.makedirs(f"{output_base}/labels/{split}", exist_ok=True)
+    for animal in classes:
+        for split in ['train', 'test']:
+            input_dir = f"{source_base}/{split}/{animal}"
+            label_dir = os.path.join(input_dir, "Label")
+            print(f"\n🔍 Processing class: {animal} [{split}]")
+            print(f"📂 Checking for label files in: {label_dir}")
+            label_files = glob(os.path.join(label_dir, "*.txt"))
+            print(f"📁 Found {len(label_files)} label files")
+            for label_path in label_files:
+                image_filename = os.path.basename(label_path).replace(".txt", ".jpg")
+                image_path = os.path.join(input_dir, image_filename)
+                if not os.path.exists(image_path):
+                    print(f"⚠️ Image missing for label: {label_path}")
+                    continue
+                img = Image.open(image_path)
+                img_width, img_height = img.size
+                with open(label_path, "r") as f:
+                    lines = f.readlines()
+                yolo_labels = ""
+                for line in lines:
+                    print(f"🔎 Raw label line: {line.strip()}")
+                    parts = line.strip().split()
+                    if len(parts) != 5 or parts[0] not in convert.animals_map:
+                        print("⛔ Skipping invalid or unknown class line")
+                        continue
+                    cls_id = convert.animals_map[parts[0]]
+                    xmin, xmax = float(parts[1]), float(parts[3])
+                    ymin, ymax = float(parts[2]), float(parts[4])
+                    x_center = ((xmin + xmax) / 2) / img_width
+                    y_center = ((ymin + ymax) / 2) / img_height
+                    height = (ymax - ymin) / img_height
+                    width = (xmax - xmin) / img_width
+                    yolo_labels += f"{cls_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n"
+                split_folder = 'train' if split == 'train' else 'test'
+                dest_img = os.path.join(output_base, 'images', split_folder, image_filename)
+                dest_lbl = os.path.join(output_base, 'labels', split_folder, image_filename.replace('.jpg', '.txt'))
+                shutil.copy(image_path, dest_img)
+                print(f"✅ Copied image → {dest_img}")
+                with open(dest_lbl, "w") as f:
+                    f.write(yolo_labels)
+                print(f"✅ Wrote labels → {dest_lbl}")
+
+
+def read_labels(output_base):
+    labels = {}
+    for path in glob(os.path.join(output_base, 'labels', '*', '*.txt')):
+        with open(path) as f:
+            labels[os.path.relpath(path, output_base)] = f.read()
+    return labels
+
+
+def drop_page_cache(folder):
+    """
+    Write back what the previous run left dirty, then ask the kernel to forget the pages of `folder` (Linux),
+    so no run pays for the writes of the one before and every run reads from disk the same way
+    """
+    if hasattr(os, 'sync'):
+        os.sync()
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in glob(os.path.join(folder, '**', '*'), recursive=True):
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def timed(function, *args, **kwargs):
+    began = time.perf_counter()
+    result = function(*args, **kwargs)
+    return round(time.perf_counter() - began, 2), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs parallel incremental dataset conversion")
+    parser.add_argument('--images', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--mode', choices=('link', 'reflink', 'copy'), default='link')
+    parser.add_argument('--touch', type=float, default=5.0, help="percent of the labels changed before the last rerun")
+    parser.add_argument('--legacy-output', choices=('devnull', 'stdout'), default='devnull',
+                        help="where the per-line prints of the legacy run go (a terminal is slower still)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='convert_bench.json')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='convert-bench-')
+    source = os.path.join(tmp, 'OID', 'Dataset')
+    classes = convert.animals
+    try:
+        print(f"🧪 Writing a synthetic download of {args.images} images...")
+        make_download(source, args.images, classes, args.seed)
+        size_mb = sum(os.path.getsize(path) for path in glob(os.path.join(source, '**', '*.jpg'), recursive=True)) / 2 ** 20
+
+        rows = []
+        legacy_base = os.path.join(tmp, 'legacy')
+        drop_page_cache(source)
+        if args.legacy_output == 'devnull':
+            with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+                seconds, _ = timed(legacy_convert, source, legacy_base, classes)
+        else:
+            seconds, _ = timed(legacy_convert, source, legacy_base, classes)
+        rows.append({'run': 'legacy', 'workers': 1, 'seconds': seconds, 'converted': args.images})
+        expected = read_labels(legacy_base)
+
+        for run, workers in enumerate(args.workers):
+            output = os.path.join(tmp, f"new-{run}")
+            drop_page_cache(source)
+            seconds, counts = timed(convert.convert_dataset, source, output, classes, workers=workers,
+                                    mode=args.mode, progress=False)
+            same = read_labels(output) == expected
+            rows.append({'run': 'cold', 'workers': workers, 'seconds': seconds, 'converted': counts['converted'],
+                         'placed': {key: counts[key] for key in ('linked', 'reflinked', 'copied')},
+                         'labels_match_legacy': same})
+            if not same:
+                print(f"[ERROR] labels of the {workers} worker run differ from the legacy conversion")
+
+        output = os.path.join(tmp, f"new-{len(args.workers) - 1}")
+        drop_page_cache(source)
+        seconds, counts = timed(convert.convert_dataset, source, output, classes, workers=args.workers[-1],
+                                mode=args.mode, progress=False)
+        rows.append({'run': 'rerun, unchanged', 'workers': args.workers[-1], 'seconds': seconds,
+                     'converted': counts['converted']})
+
+        labels = sorted(glob(os.path.join(source, '*', '*', 'Label', '*.txt')))
+        for path in random.Random(args.seed).sample(labels, int(len(labels) * args.touch / 100)):
+            with open(path, 'a') as f:
+                f.write("Unknown 1 1 2 2\n")
+        drop_page_cache(source)
+        seconds, counts = timed(convert.convert_dataset, source, output, classes, workers=args.workers[-1],
+                                mode=args.mode, progress=False)
+        rows.append({'run': f"rerun, {args.touch:g}% changed", 'workers': args.workers[-1], 'seconds': seconds,
+                     'converted': counts['converted']})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    base = rows[0]['seconds'] or 1
+    for row in rows:
+        row['speedup'] = round(base / row['seconds'], 1) if row['seconds'] else None
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'cpu_count': os.cpu_count(), 'images_mb': round(size_mb, 1),
+                   'results': rows}, f, indent=2)
+
+    print(f"\n{args.images} images ({size_mb:.0f} MB), {os.cpu_count()} cores, images placed by {args.mode}")
+    print(f"{'run':<22}{'workers':>8}{'seconds':>9}{'converted':>11}{'speedup':>9}")
+    for row in rows:
+        print(f"{row['run']:<22}{row['workers']:>8}{row['seconds']:>9}{row['converted']:>11}{row['speedup']:>9}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Epoch time with the shard cache (dataset_cache.py, sharded_dataset.py) against the current loading:
+every image decoded from JPEG and resized, every label .txt parsed, on the main process ('workers': 0).
+
+  loader:  one epoch of image + label loading in shuffled order, as the ultralytics dataset does it,
+           with the page cache dropped first (the first epoch) and warm (the epochs after it)
+  train:   `--train-epochs` real epochs of the stock trainer and of ShardedDetectionTrainer
+           (needs ultralytics and torch), seconds per epoch with and without validation
+
+Without `--data`, a synthetic dataset of `--images` photos-sized JPEGs is written to a temporary folder.
+
+    python benchmarks/dataset_cache_bench.py --data animals.yaml --train-epochs 2 --output dataset_cache_bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from glob import glob
+
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_cache
+from dataset_utils import load_data_yaml
+from convert_bench import drop_page_cache
+
+SIZES = [(1024, 768), (1024, 683), (768, 1024), (1024, 576), (800, 600)]
+
+
+def make_dataset(root, images, seed):
+    """Animals-like YOLO dataset (80% train) and its yaml, returns the yaml path"""
+    rng = np.random.default_rng(seed)
+    random_ = random.Random(seed)
+    for index in range(images):
+        split = 'train' if index % 5 else 'test'
+        width, height = SIZES[index % len(SIZES)]
+        ramp = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        image = np.clip(ramp + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+        for folder in ('images', 'labels'):
+            os.makedirs(os.path.join(root, folder, split), exist_ok=True)
+        cv.imwrite(os.path.join(root, 'images', split, f"{index:06d}.jpg"), image, [cv.IMWRITE_JPEG_QUALITY, 85])
+        with open(os.path.join(root, 'labels', split, f"{index:06d}.txt"), 'w') as f:
+            for _ in range(random_.randint(1, 3)):
+                w, h = random_.uniform(0.05, 0.5), random_.uniform(0.05, 0.5)
+                f.write(f"{random_.randint(0, 9)} {random_.uniform(w / 2, 1 - w / 2):.6f} "
+                        f"{random_.uniform(h / 2, 1 - h / 2):.6f} {w:.6f} {h:.6f}\n")
+    data_yaml = os.path.join(root, 'data.yaml')
+    with open(data_yaml, 'w') as f:
+        f.write(f"path: {root}\ntrain: images/train\nval: images/test\nnc: 10\n"
+                "names: ['Tiger','Leopard','Cheetah','Elephant','Monkey','Deer','Lion','Bear','Pig','Bull']\n")
+    return data_yaml
+
+
+def jpeg_epoch(images, imgsz, order):
+    """Decode + resize + label parse of every image, like BaseDataset.load_image() and the label scan"""
+    for index in order:
+        dataset_cache.load_resized(images[index], imgsz, augment=True)
+        dataset_cache.load_checked_labels(images[index])
+
+
+def shard_epoch(reader, order):
+    for index in order:
+        reader.image(index)
+        reader.labels(index)
+
+
+def timed(function, *args):
+    began = time.perf_counter()
+    function(*args)
+    return round(time.perf_counter() - began, 2)
+
+
+def train_epochs(data_yaml, model_path, epochs, imgsz, batch, sharded, project):
+    """Seconds of every epoch (training only, and training + validation) of one training run"""
+    from ultralytics import YOLO
+    from sharded_dataset import ShardedDetectionTrainer
+
+    model = YOLO(model_path)
+    marks = {'start': [], 'train_end': [], 'fit_end': []}
+    model.add_callback('on_train_epoch_start', lambda trainer: marks['start'].append(time.perf_counter()))
+    model.add_callback('on_train_epoch_end', lambda trainer: marks['train_end'].append(time.perf_counter()))
+    model.add_callback('on_fit_epoch_end', lambda trainer: marks['fit_end'].append(time.perf_counter()))
+    model.train(data=data_yaml, epochs=epochs, imgsz=imgsz, batch=batch, workers=0, cache=False, plots=False,
+                project=project, name='sharded' if sharded else 'stock', exist_ok=True, verbose=False,
+                trainer=ShardedDetectionTrainer if sharded else None)
+    train = [end - start for start, end in zip(marks['start'], marks['train_end'])]
+    fit = [end - start for start, end in zip(marks['start'], marks['fit_end'])]
+    return [round(seconds, 2) for seconds in train], [round(seconds, 2) for seconds in fit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Epoch time, JPEG dataset vs shard cache")
+    parser.add_argument('--data', default=None, help="dataset yaml, default: a synthetic dataset")
+    parser.add_argument('--images', type=int, default=1000, help="size of the synthetic dataset")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--train-epochs', type=int, default=0, help="also time real training epochs (needs ultralytics)")
+    parser.add_argument('--model', default='yolov8n.yaml', help="model of the training runs")
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='dataset_cache_bench.json')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='dataset-cache-bench-')
+    try:
+        data_yaml = args.data
+        if data_yaml is None:
+            print(f"🧪 Writing a synthetic dataset of {args.images} images...")
+            data_yaml = make_dataset(os.path.join(tmp, 'dataset'), args.images, args.seed)
+        data = load_data_yaml(data_yaml)
+        img_path = os.path.join(data['root'], data['train'])
+        if args.data:
+            dataset_cache.SHARD_ROOT = os.path.join(tmp, 'shards')     # leave the cache of the real dataset alone
+
+        images = dataset_cache.split_images(img_path)
+        began = time.perf_counter()
+        reader = dataset_cache.ensure_shards(img_path, args.imgsz, augment=True, verbose=False)
+        pack_seconds = round(time.perf_counter() - began, 2)
+        began = time.perf_counter()
+        dataset_cache.ensure_shards(img_path, args.imgsz, augment=True, verbose=False)
+        check_seconds = round(time.perf_counter() - began, 3)
+        cache_gb = sum(os.path.getsize(path) for path in glob(os.path.join(reader.directory, '*'))) / 2 ** 30
+
+        order = list(range(len(reader)))
+        random.Random(args.seed).shuffle(order)
+        loader = {}
+        drop_page_cache(img_path)
+        drop_page_cache(os.path.join(os.path.dirname(os.path.dirname(img_path)), 'labels'))
+        loader['jpeg_cold'] = timed(jpeg_epoch, images, args.imgsz, order)
+        loader['jpeg_warm'] = timed(jpeg_epoch, images, args.imgsz, order)
+        drop_page_cache(reader.directory)
+        reader = dataset_cache.ShardReader(reader.directory)
+        loader['shards_cold'] = timed(shard_epoch, reader, order)
+        loader['shards_warm'] = timed(shard_epoch, reader, order)
+
+        training = None
+        if args.train_epochs:
+            training = {}
+            for sharded in (False, True):
+                train, fit = train_epochs(data_yaml, args.model, args.train_epochs, args.imgsz, args.batch, sharded,
+                                          os.path.join(tmp, 'runs'))
+                training['sharded' if sharded else 'stock'] = {'train_epoch_s': train, 'epoch_with_val_s': fit}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'images': len(images), 'pack_s': pack_seconds, 'up_to_date_check_s': check_seconds,
+                   'cache_gb': round(cache_gb, 2), 'loader_epoch_s': loader, 'training': training}, f, indent=2)
+
+    print(f"\n{len(images)} training images at {args.imgsz}: packed in {pack_seconds}s ({cache_gb:.2f} GB), "
+          f"up-to-date check {check_seconds}s")
+    print(f"{'loading one epoch':<22}{'cold':>8}{'warm':>8}")
+    for name in ('jpeg', 'shards'):
+        print(f"{name:<22}{loader[name + '_cold']:>8}{loader[name + '_warm']:>8}")
+    print(f"speedup {loader['jpeg_cold'] / max(loader['shards_cold'], 1e-3):.1f}x cold, "
+          f"{loader['jpeg_warm'] / max(loader['shards_warm'], 1e-3):.1f}x warm")
+    if training:
+        for name, epochs in training.items():
+            print(f"⏱️  {name}: {epochs['train_epoch_s']} s per training epoch, {epochs['epoch_with_val_s']} s with validation")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Wall time of the dataset download (dataset_scripts/download_dataset.py) one job at a time, like the
+old script, against `--jobs` concurrent jobs, and what a rerun costs after failures or cut-off images.
+
+No network: this script doubles as the toolkit (`--fake-toolkit`). Like the OIDv4 Toolkit it takes a
+while to start (reading the annotation CSV), downloads the images of one class on a few threads and
+skips the images already on disk. Its timings come from the environment (see FAKE_* below).
+
+    python benchmarks/download_bench.py --classes 10 --train-count 60 --test-count 15 --jobs 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset_scripts'))
+import download_dataset as download
+
+# Settings of the fake toolkit, passed to it through the environment
+FAKE_SETTINGS = {
+    'FAKE_CSV_SECONDS': 2.0,        # first run of a split: download of the annotation CSV
+    'FAKE_START_SECONDS': 1.0,      # every run: loading the CSV and picking the images
+    'FAKE_IMAGE_SECONDS': 0.05,     # latency of one image
+    'FAKE_THREADS': 4,              # images downloaded at a time within one run
+    'FAKE_FAIL_RATE': 0.0,          # chance that a run dies half way
+    'FAKE_TRUNCATE_RATE': 0.0,      # chance that an image is written cut off
+}
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 2000 + b'\xff\xd9'
+
+
+def fake_toolkit(argv):
+    """`downloader --classes X --type_csv train --limit N --yes`, run inside the toolkit folder"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command')
+    parser.add_argument('--classes', nargs='+')
+    parser.add_argument('--type_csv')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--yes', action='store_true')
+    args = parser.parse_args(argv)
+    settings = {key: float(os.environ.get(key, value)) for key, value in FAKE_SETTINGS.items()}
+    rng = random.Random()
+
+    csv_folder = os.path.join('OID', 'csv_folder')
+    os.makedirs(csv_folder, exist_ok=True)
+    csv = os.path.join(csv_folder, f"{args.type_csv}-annotations-bbox.csv")
+    if not os.path.exists(csv):
+        time.sleep(settings['FAKE_CSV_SECONDS'])
+        for name in (csv, os.path.join(csv_folder, 'class-descriptions-boxable.csv')):
+            with open(name, 'w') as f:
+                f.write('fake\n')
+    time.sleep(settings['FAKE_START_SECONDS'])
+
+    for class_name in args.classes:
+        folder = os.path.join('OID', 'Dataset', args.type_csv, class_name)
+        os.makedirs(os.path.join(folder, 'Label'), exist_ok=True)
+        wanted = [f"{class_name.lower()}{index:05d}" for index in range(args.limit)]
+        on_disk = {os.path.basename(path)[:-4] for path in glob(os.path.join(folder, '*.jpg'))}
+        missing = [name for name in wanted if name not in on_disk]
+        print(f"{len(on_disk)} images on disk, downloading {len(missing)}")
+        if rng.random() < settings['FAKE_FAIL_RATE']:
+            missing = missing[:len(missing) // 2]
+            fail = True
+        else:
+            fail = False
+
+        def fetch(name):
+            time.sleep(settings['FAKE_IMAGE_SECONDS'])
+            data = JPEG[:len(JPEG) // 2] if rng.random() < settings['FAKE_TRUNCATE_RATE'] else JPEG
+            with open(os.path.join(folder, name + '.jpg'), 'wb') as f:
+                f.write(data)
+            with open(os.path.join(folder, 'Label', name + '.txt'), 'w') as f:
+                f.write(f"{class_name} 10 10 100 100\n")
+
+        with ThreadPoolExecutor(max_workers=int(settings['FAKE_THREADS'])) as pool:
+            list(pool.map(fetch, missing))
+        with open('fake_downloads.log', 'a') as f:
+            f.write(f"{len(missing)}\n")
+        if fail:
+            print("connection reset")
+            sys.exit(1)
+
+
+def downloaded(toolkit_path):
+    """Images the fake toolkit has fetched in this folder so far"""
+    try:
+        with open(os.path.join(toolkit_path, 'fake_downloads.log')) as f:
+            return sum(int(line) for line in f)
+    except OSError:
+        return 0
+
+
+def run(toolkit_path, classes, counts, jobs, retries=0, **fake):
+    """One download_all() with the fake toolkit, returns seconds, statuses and images fetched"""
+    os.environ.update({key: str(value) for key, value in {**FAKE_SETTINGS, **fake}.items()})
+    toolkit_cmd = f"{sys.executable} {os.path.abspath(__file__)} --fake-toolkit"
+    before = downloaded(toolkit_path)
+    began = time.perf_counter()
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        results = download.download_all(classes, counts, jobs, toolkit_path, toolkit_cmd, retries)
+    statuses = {}
+    for status in results.values():
+        statuses[status] = statuses.get(status, 0) + 1
+    return round(time.perf_counter() - began, 2), statuses, downloaded(toolkit_path) - before
+
+
+def main():
+    if sys.argv[1:2] == ['--fake-toolkit']:
+        fake_toolkit(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent dataset download, and resuming")
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--train-count', type=int, default=60)
+    parser.add_argument('--test-count', type=int, default=15)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--output', default='download_bench.json')
+    args = parser.parse_args()
+
+    classes = download.animals[:args.classes]
+    counts = {'train': args.train_count, 'test': args.test_count}
+    expected = len(classes) * (args.train_count + args.test_count)
+    tmp = tempfile.mkdtemp(prefix='download-bench-')
+    rows = []
+
+    def row(name, jobs, seconds, statuses, fetched):
+        rows.append({'run': name, 'jobs': jobs, 'seconds': seconds, 'statuses': statuses, 'images_fetched': fetched})
+
+    try:
+        for jobs in (1, args.jobs):
+            row(f"fresh", jobs, *run(os.path.join(tmp, f"fresh-{jobs}"), classes, counts, jobs))
+
+        # A third of the toolkit runs die half way, then the rerun picks up the rest
+        toolkit_path = os.path.join(tmp, 'resume')
+        row("30% of jobs fail", args.jobs, *run(toolkit_path, classes, counts, args.jobs, FAKE_FAIL_RATE=0.3))
+        row("rerun after failures", args.jobs, *run(toolkit_path, classes, counts, args.jobs))
+        row("rerun, all done", args.jobs, *run(toolkit_path, classes, counts, args.jobs))
+
+        # Cut-off images (a killed download) are found, deleted and fetched again
+        images = sorted(glob(os.path.join(toolkit_path, 'OID', 'Dataset', '*', '*', '*.jpg')))
+        for path in random.Random(0).sample(images, 10):
+            with open(path, 'r+b') as f:
+                f.truncate(1000)
+        row("rerun, 10 images cut off", args.jobs, *run(toolkit_path, classes, counts, args.jobs))
+        complete = sum(download.is_complete_image(path)
+                       for path in glob(os.path.join(toolkit_path, 'OID', 'Dataset', '*', '*', '*.jpg')))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': {**vars(args), **FAKE_SETTINGS}, 'results': rows}, f, indent=2)
+
+    print(f"{len(classes)} classes x 2 splits, {expected} images")
+    print(f"{'run':<26}{'jobs':>5}{'seconds':>9}{'fetched':>9}   jobs")
+    for item in rows:
+        statuses = ", ".join(f"{count} {status}" for status, count in sorted(item['statuses'].items()))
+        print(f"{item['run']:<26}{item['jobs']:>5}{item['seconds']:>9}{item['images_fetched']:>9}   {statuses}")
+    print(f"\n{complete}/{expected} complete images at the end")
+    print(f"📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Per-frame latency and mAP of every inference engine, so the fastest one that keeps accuracy can
+be picked for main.py (ENGINE = ...).
+
+Latency is measured through engines.py exactly as main.py calls it, one frame at a time on the
+val split images. mAP comes from ultralytics' validator, which loads .pt, .onnx and OpenVINO
+exports alike. Engines whose weights are missing are skipped (run export_engines.py first).
+
+    python benchmarks/engine_report.py --data animals.yaml --images 200 --output engine_report.json
+"""
+import os
+import sys
+import json
+import argparse
+
+import cv2 as cv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_utils import dataset_images
+from engines import ENGINE_WEIGHTS, load_engine
+from validation import accuracy, measure_latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency / mAP report of the inference engines")
+    parser.add_argument('--data', default='animals.yaml')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--images', type=int, default=200, help="val images used for the latency measurement")
+    parser.add_argument('--engines', nargs='+', default=list(ENGINE_WEIGHTS), choices=list(ENGINE_WEIGHTS))
+    parser.add_argument('--skip-map', action='store_true', help="only measure latency")
+    parser.add_argument('--output', default='engine_report.json')
+    args = parser.parse_args()
+
+    frames = [cv.imread(path) for path in dataset_images(args.data, 'val')[:args.images]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise SystemExit(f"No val images found for {args.data}")
+
+    report = []
+    for kind in args.engines:
+        weights = ENGINE_WEIGHTS[kind]
+        if not os.path.exists(weights):
+            print(f"⚠️  {kind}: {weights} not found, skipping")
+            continue
+        print(f"⏱️  {kind}...")
+        row = {'engine': kind, 'weights': weights}
+        row.update(measure_latency(load_engine(kind, weights, imgsz=args.imgsz), frames))
+        if not args.skip_map:
+            row.update(accuracy(weights, args.data, args.imgsz))
+        report.append(row)
+
+    with open(args.output, 'w') as f:
+        json.dump({'imgsz': args.imgsz, 'images': len(frames), 'engines': report}, f, indent=2)
+
+    print(f"\n{'engine':<15}{'mean ms':>9}{'p95 ms':>9}{'fps':>7}{'mAP50-95':>10}{'mAP50':>8}")
+    for row in report:
+        print(f"{row['engine']:<15}{row['mean_ms']:>9}{row['p95_ms']:>9}{row['fps']:>7}"
+              f"{row.get('map50_95', '-'):>10}{row.get('map50', '-'):>8}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
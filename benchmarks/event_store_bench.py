@@ -0,0 +1,103 @@
+"""
+Write and query cost of the detection event store (event_store.py) at months of data.
+
+Feeds synthetic detections spread over `--days` through EventStore.record() (the call the detection
+loop makes), then times typical queries against the filled database.
+
+    python benchmarks/event_store_bench.py --events 2000000 --days 180 --output event_store_bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_store import EventStore, query_events, count_events
+
+CLASSES = ['Tiger', 'Leopard', 'Elephant', 'Bear', 'Deer', 'Monkey', 'Pig', 'Nilgai']
+
+
+def fill(store, events, days, cameras, seed):
+    """Record `events` detections, returns the time of every record() call"""
+    rng = random.Random(seed)
+    end = time.time()
+    start = end - days * 86400
+    timestamps = sorted(rng.uniform(start, end) for _ in range(events))
+    call_times = np.empty(events)
+    for index, timestamp in enumerate(timestamps):
+        x, y = rng.randint(0, 1800), rng.randint(0, 1000)
+        began = time.perf_counter()
+        store.record(f"Camera {rng.randint(1, cameras)}", rng.choice(CLASSES), rng.randint(1, 2), rng.randint(40, 99),
+                     (x, y, x + 120, y + 90), index % 5000, timestamp)
+        call_times[index] = time.perf_counter() - began
+        if store.pending > store.max_pending // 2:
+            time.sleep(0.001)   # a real camera never sends this fast, let the writer catch up instead of dropping
+    return call_times
+
+
+def time_query(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event store write and query benchmark")
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--days', type=float, default=180)
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='event_store_bench.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events.db')
+        store = EventStore(path)
+        started = time.time()
+        call_times = fill(store, args.events, args.days, args.cameras, args.seed)
+        store.stop(timeout=600)
+        write_seconds = time.time() - started
+        print(f"✍️  {args.events} events in {write_seconds:.1f}s "
+              f"({args.events / write_seconds:.0f}/s), record() p99 {np.percentile(call_times, 99) * 1e6:.1f} µs")
+
+        week = time.time() - 7 * 86400
+        queries = {
+            'bear_camera3_last_week': lambda: query_events(path, 'Camera 3', 'Bear', since=week, limit=None),
+            'camera3_last_week': lambda: query_events(path, 'Camera 3', since=week, limit=None),
+            'latest_100': lambda: query_events(path, limit=100),
+            'tiger_all_time_latest_100': lambda: query_events(path, class_name='Tiger', limit=100),
+            'counts_last_30_days': lambda: count_events(path, since=time.time() - 30 * 86400),
+        }
+        results = {}
+        for name, function in queries.items():
+            ms, rows = time_query(function)
+            results[name] = {'ms': ms, 'rows': len(rows)}
+            print(f"   {name:<28}{ms:>9} ms  {len(rows)} rows")
+
+        report = {
+            'settings': vars(args),
+            'write_seconds': round(write_seconds, 2),
+            'events_per_second': round(args.events / write_seconds),
+            'record_p50_us': round(float(np.percentile(call_times, 50)) * 1e6, 2),
+            'record_p99_us': round(float(np.percentile(call_times, 99)) * 1e6, 2),
+            'database_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+            'store': store.metrics(),
+            'queries': results,
+        }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Measures the resident memory of the pre-event clip buffer.
+
+Fills one camera's 5-second buffer with synthetic 1080p frames, once with the old
+`deque(maxlen=fps * 5)` of raw frames and once per frame_buffer.py mode, each in a fresh
+process so the RSS numbers do not influence each other.
+
+    python benchmarks/frame_buffer_rss.py --width 1920 --height 1080 --fps 30
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from collections import deque
+
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_buffer import make_frame_buffer
+from clips import write_clip
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def synthetic_frames(width, height, count):
+    """A textured outdoor-like scene with a moving blob, so JPEG sizes are realistic"""
+    rng = np.random.default_rng(0)
+    base = np.zeros((height, width, 3), np.uint8)
+    base[:] = np.linspace(60, 200, width, dtype=np.uint8)[None, :, None]
+    noise = rng.integers(0, 40, size=(height, width, 3), dtype=np.uint8)
+    base = cv.add(base, noise)
+    base = cv.GaussianBlur(base, (5, 5), 0)
+    for i in range(count):
+        frame = base.copy()
+        x = int((i / max(count, 1)) * (width - 200))
+        cv.circle(frame, (x + 100, height // 2), 80, (30, 60, 90), -1)
+        yield frame
+
+
+def measure(mode, width, height, fps, seconds, max_mb):
+    max_frames = fps * seconds
+    frames = synthetic_frames(width, height, max_frames)
+    before = rss_mb()
+
+    start = time.perf_counter()
+    if mode == 'deque':
+        buffer = deque(maxlen=max_frames)   # what main.py used to do
+        for frame in frames:
+            buffer.append(frame)
+    else:
+        buffer = make_frame_buffer(mode, max_frames, max_bytes=max_mb * 1024 * 1024 if max_mb else None)
+        for frame in frames:
+            buffer.append(frame)
+            if mode == 'jpeg':
+                buffer.flush()      # a live camera is paced, here we wait for the encoder instead of skipping frames
+    append_ms = (time.perf_counter() - start) * 1000 / max_frames
+    after = rss_mb()
+
+    start = time.perf_counter()
+    clip = list(buffer) if mode == 'deque' else buffer.snapshot()
+    snapshot_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    clip_file = os.path.join(tempfile.gettempdir(), "frame_buffer_rss.mp4")
+    write_clip(clip, fps, (width, height), clip_file)
+    export_s = time.perf_counter() - start
+    os.remove(clip_file)
+
+    return {
+        'mode': mode,
+        'frames': len(buffer),
+        'buffer_rss_mb': round(after - before, 1),
+        'append_ms_per_frame': round(append_ms, 2),
+        'encode_ms_per_frame': round(buffer.encode_seconds * 1000 / max(buffer.frames_encoded, 1), 2) if mode == 'jpeg' else 0.0,
+        'snapshot_ms': round(snapshot_ms, 3),
+        'clip_export_s': round(export_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS of the pre-event clip buffer")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seconds', type=int, default=5)
+    parser.add_argument('--max-mb', type=int, default=64, help="memory cap for the frame_buffer.py modes")
+    parser.add_argument('--mode', choices=['deque', 'raw', 'jpeg'], help="run a single mode (used internally)")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.width, args.height, args.fps, args.seconds, args.max_mb)))
+        return
+
+    print(f"{'mode':<8}{'frames':>8}{'RSS MB':>10}{'encode ms':>12}{'snapshot ms':>13}{'export s':>10}")
+    for mode in ['deque', 'raw', 'jpeg']:
+        cmd = [sys.executable, __file__, '--mode', mode, '--width', str(args.width), '--height', str(args.height),
+               '--fps', str(args.fps), '--seconds', str(args.seconds),
+               '--max-mb', str(args.max_mb if mode == 'jpeg' else 0)]
+        result = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+        print(f"{result['mode']:<8}{result['frames']:>8}{result['buffer_rss_mb']:>10}{result['encode_ms_per_frame']:>12}"
+              f"{result['snapshot_ms']:>13}{result['clip_export_s']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Throughput of the single-process detection loop against the multi-process mode (multiproc.py) as
+inference workers are added, on the same replayed cameras.
+
+Sources must arrive faster than one process can handle them (several cameras, high fps), otherwise
+both modes just keep up with the cameras. Every inference worker loads its own copy of the model.
+
+    python benchmarks/multiproc_bench.py --cameras 8 --source synthetic:1280x720@30:100000 --workers 1 2 4 8 --seconds 30
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main as app
+from alerts import AlertDispatcher, ConsoleSms, LocalStorage
+from pipeline_replay import run_replay, open_source
+
+
+def run_pool(sources, engine, weights, workers, seconds):
+    """Frames per second processed by a WorkerPool with `workers` inference processes"""
+    clip_dir = tempfile.mkdtemp(prefix='multiproc-bench-')
+    sms = ConsoleSms(verbose=False)
+    dispatcher = AlertDispatcher(sms, LocalStorage(os.path.join(clip_dir, 'uploaded')), workers=app.ALERT_WORKERS,
+                                 max_queue=app.ALERT_QUEUE_SIZE, overflow=app.ALERT_OVERFLOW, clip_dir=clip_dir)
+    notifier = app.build_notifier(dispatcher)
+
+    configs = [{'name': f'bench-{index}', 'source': source, 'latitude': app.LATITUDE, 'longitude': app.LONGITUDE}
+               for index, source in enumerate(sources)]
+    app.MULTIPROC = {**app.MULTIPROC, 'inference_workers': workers,
+                     'encoding_workers': app.MULTIPROC['encoding_workers'] or max(1, workers // 2)}
+    grabber_options = {'capture_factory': partial(open_source, loops=1000), 'max_reconnects': 0}
+    pool = app.build_worker_pool(notifier, None, configs, grabber_options=grabber_options,
+                                 segment_dir=os.path.join(clip_dir, 'segments'), engine=engine, weights=weights)
+    pool.start()
+    pool.wait_until_ready()
+    time.sleep(2)   # stats of the workers arrive once a second
+    processed_before, started = pool.frames_processed, time.time()
+
+    stop_event = threading.Event()
+    threading.Timer(seconds, stop_event.set).start()
+    pool.run(stop_event)
+    elapsed = time.time() - started
+    processed = pool.frames_processed - processed_before
+
+    pool.stop_intake()
+    metrics = pool.metrics()
+    notifier.stop()
+    dispatcher.stop()
+    pool.stop()
+    shutil.rmtree(clip_dir, ignore_errors=True)
+    return {
+        'mode': 'multiproc',
+        'inference_workers': workers,
+        'processes': len(pool.workers),
+        'seconds': round(elapsed, 2),
+        'sustained_fps': round(processed / elapsed, 2),
+        'frames_dropped': sum(metrics['frames_dropped'].values()),
+        'restarts': metrics['restarts'],
+        'alerts_fired': metrics['alerts_fired'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single process vs multi-process worker pool throughput")
+    parser.add_argument('--source', default='synthetic:1280x720@30:100000', help="file or synthetic spec, replayed per camera")
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--engine', default=None, help="default: ENGINE of main.py")
+    parser.add_argument('--weights', default=None)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--output', default='multiproc_bench.json')
+    args = parser.parse_args()
+
+    sources = [args.source] * args.cameras
+    engine = args.engine or app.ENGINE
+
+    print(f"🎥 {args.cameras} camera(s) of {args.source}, {os.cpu_count()} cores")
+    single = run_replay(sources, engine, args.weights, loops=1000, max_seconds=args.seconds)
+    rows = [{'mode': 'single', 'inference_workers': 1, 'processes': 1, 'seconds': single['seconds'],
+             'sustained_fps': single['sustained_fps'], 'frames_dropped': single['frames_dropped'],
+             'restarts': {}, 'alerts_fired': single['alerts_fired']}]
+    for workers in args.workers:
+        rows.append(run_pool(sources, engine, args.weights, workers, args.seconds))
+
+    base = rows[0]['sustained_fps'] or 1
+    for row in rows:
+        row['speedup'] = round(row['sustained_fps'] / base, 2)
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'cpu_count': os.cpu_count(), 'results': rows}, f, indent=2)
+
+    print(f"\n{'mode':<11}{'workers':>8}{'processes':>10}{'fps':>9}{'speedup':>9}{'dropped':>9}")
+    for row in rows:
+        print(f"{row['mode']:<11}{row['inference_workers']:>8}{row['processes']:>10}{row['sustained_fps']:>9}"
+              f"{row['speedup']:>9}{row['frames_dropped']:>9}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
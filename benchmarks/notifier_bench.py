@@ -0,0 +1,214 @@
+"""
+Outbound SMS round-trips and alert latency against a local fake SMS gateway.
+
+Replays bursts of sightings through
+  legacy:   one new connection per message, an alert SMS and a separate link SMS per sighting
+  notifier: notifier.Notifier + AlertDispatcher + alerts.HttpSms (kept-alive connections,
+            per-class cooldowns, coalescing, the link inside the alert SMS)
+and counts what reaches the fake gateway, which can add a connection setup delay (TLS handshake)
+and a per-request delay (provider API).
+
+    python benchmarks/notifier_bench.py --bursts 20 --connect-ms 80 --request-ms 120 --output notifier_bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alerts import AlertDispatcher, HttpSms, LocalStorage
+from detections import CATEGORY_HUMANS, CATEGORY_FARMS
+from notifier import Notifier, Sighting, compose_message
+
+CLASSES = [('Tiger', CATEGORY_HUMANS), ('Leopard', CATEGORY_HUMANS), ('Elephant', CATEGORY_HUMANS),
+           ('Deer', CATEGORY_FARMS), ('Monkey', CATEGORY_FARMS), ('Pig', CATEGORY_FARMS)]
+
+
+class FakeSmsGateway:
+    """Local HTTP server that accepts POSTed SMS and remembers when each one arrived"""
+
+    def __init__(self, connect_delay=0.0, request_delay=0.0):
+        self.messages = []      # (received at, body)
+        self.connections = 0
+        self.lock = threading.Lock()
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive unless the client asks to close
+
+            def setup(self):
+                super().setup()
+                with gateway.lock:
+                    gateway.connections += 1
+                time.sleep(connect_delay)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(request_delay)
+                with gateway.lock:
+                    gateway.messages.append((time.time(), body['body']))
+                    sid = f"fake-{len(gateway.messages)}"
+                reply = json.dumps({'sid': sid}).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/messages"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.messages = []
+            self.connections = 0
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class TinyClip:
+    """Stands in for a recorded clip, a few bytes written at export"""
+
+    def wait(self, timeout=None):
+        return True
+
+    def export(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(b'\0' * 1024)
+        return filename
+
+    def release(self):
+        pass
+
+
+def make_bursts(bursts, per_burst, gap, seed):
+    """[(offset seconds, Sighting)], each burst seen by several cameras within half a second"""
+    rng = random.Random(seed)
+    schedule = []
+    for burst in range(bursts):
+        for index in range(per_burst):
+            class_name, category = rng.choice(CLASSES)
+            camera = f"cam{burst:03d}-{index}"      # unique tag, used to find the sighting in the SMS
+            schedule.append((burst * gap + rng.uniform(0, 0.5),
+                             Sighting(camera, class_name, category, rng.randint(85, 99), "https://maps.example/0,0")))
+    return sorted(schedule, key=lambda item: item[0])
+
+
+def replay(schedule, handle):
+    started = time.time()
+    for offset, sighting in schedule:
+        delay = started + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        sighting.timestamp = time.time()
+        sighting.clip = TinyClip()
+        handle(sighting)
+
+
+def run_legacy(gateway, schedule, workers):
+    sms = HttpSms(gateway.url, '+10000000000', keep_alive=False)
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def deliver(sighting):
+        sms.send(compose_message([sighting]))
+        sms.send(f"Watch video clip here: file:///clips/detection_{sighting.camera_name}.mp4")
+
+    replay(schedule, lambda sighting: pool.submit(deliver, sighting))
+    pool.shutdown(wait=True)
+
+
+def run_notifier(gateway, schedule, workers, clip_dir, cooldowns, coalesce_seconds):
+    sms = HttpSms(gateway.url, '+10000000000')
+    dispatcher = AlertDispatcher(sms, LocalStorage(os.path.join(clip_dir, 'uploaded')), workers=workers,
+                                 max_queue=64, clip_dir=clip_dir)
+    notifier = Notifier(dispatcher, cooldowns=cooldowns, coalesce_seconds=coalesce_seconds)
+    replay(schedule, notifier.notify)
+    notifier.stop()
+    dispatcher.stop()
+
+
+def percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+def summarize(mode, gateway, schedule, seconds):
+    """Latency from each sighting to the first SMS naming it, and to the SMS with its clip link"""
+    first_sms, link_sms = {}, {}
+    for received_at, body in gateway.messages:
+        for _, sighting in schedule:
+            if sighting.camera_name not in body:
+                continue
+            first_sms.setdefault(sighting.camera_name, received_at - sighting.timestamp)
+            if "Watch video clip here" in body:
+                link_sms.setdefault(sighting.camera_name, received_at - sighting.timestamp)
+    alert_latencies, link_latencies = list(first_sms.values()), list(link_sms.values())
+    return {
+        'mode': mode,
+        'sightings': len(schedule),
+        'sms_round_trips': len(gateway.messages),
+        'connections_opened': gateway.connections,
+        'sightings_in_an_sms': len(alert_latencies),
+        'alert_latency_p50_ms': percentile_ms(alert_latencies, 50),
+        'alert_latency_p95_ms': percentile_ms(alert_latencies, 95),
+        'link_latency_p50_ms': percentile_ms(link_latencies, 50),
+        'link_latency_p95_ms': percentile_ms(link_latencies, 95),
+        'seconds': round(seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy SMS path vs the notifier against a fake SMS gateway")
+    parser.add_argument('--bursts', type=int, default=20)
+    parser.add_argument('--per-burst', type=int, default=4, help="sightings per burst")
+    parser.add_argument('--gap', type=float, default=1.0, help="seconds between bursts")
+    parser.add_argument('--connect-ms', type=float, default=80, help="connection setup delay of the gateway")
+    parser.add_argument('--request-ms', type=float, default=120, help="per-request delay of the gateway")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--cooldown', type=float, default=60, help="seconds, for both categories")
+    parser.add_argument('--coalesce', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='notifier_bench.json')
+    args = parser.parse_args()
+
+    gateway = FakeSmsGateway(args.connect_ms / 1000, args.request_ms / 1000)
+    rows = []
+    for mode in ('legacy', 'notifier'):
+        schedule = make_bursts(args.bursts, args.per_burst, args.gap, args.seed)
+        gateway.reset()
+        started = time.time()
+        if mode == 'legacy':
+            run_legacy(gateway, schedule, args.workers)
+        else:
+            with tempfile.TemporaryDirectory() as clip_dir:
+                cooldowns = {CATEGORY_HUMANS: args.cooldown, CATEGORY_FARMS: args.cooldown}
+                run_notifier(gateway, schedule, args.workers, clip_dir, cooldowns, args.coalesce)
+        rows.append(summarize(mode, gateway, schedule, time.time() - started))
+    gateway.stop()
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'results': rows}, f, indent=2)
+
+    print(f"\n{'mode':<10}{'sightings':>10}{'SMS':>6}{'conns':>7}{'alert p50':>11}{'alert p95':>11}{'link p50':>10}{'link p95':>10}")
+    for row in rows:
+        print(f"{row['mode']:<10}{row['sightings']:>10}{row['sms_round_trips']:>6}{row['connections_opened']:>7}"
+              f"{row['alert_latency_p50_ms']:>11}{row['alert_latency_p95_ms']:>11}"
+              f"{row['link_latency_p50_ms']:>10}{row['link_latency_p95_ms']:>10}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Offline replay of the live detection pipeline.
+
+Recorded video files (paced to their own fps, like a camera) or synthetic frame streams go through
+the same capture -> inference -> post-processing -> alert path as main.py, headless, with the SMS
+printed nowhere and the clips written to a temporary folder. Reports sustained fps, end-to-end
+frame latency percentiles, peak RSS and the alerts fired, and saves them as JSON so runs of
+different models or pipeline changes can be compared.
+
+    python benchmarks/pipeline_replay.py --sources field.mp4 gate.mp4 --engine onnx --output replay.json
+    python benchmarks/pipeline_replay.py --sources synthetic:1280x720@30:900 --engine openvino-int8
+
+A synthetic source is `synthetic:WIDTHxHEIGHT@FPS:FRAMES`, a noisy background with a blob crossing it.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+import cv2 as cv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as app
+from alerts import AlertDispatcher, ConsoleSms, LocalStorage
+from engines import ENGINE_WEIGHTS
+from metrics import STAGE_SECONDS
+
+
+class ReplayCapture:
+    """A video file read at its native frame rate, so the pipeline sees it like a live camera"""
+
+    def __init__(self, path, loops=1):
+        self.cap = cv.VideoCapture(path)
+        self.fps = self.cap.get(cv.CAP_PROP_FPS) or 30
+        self.loops = loops
+        self.started_at = None
+        self.frames = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def read(self):
+        if self.started_at is None:
+            self.started_at = time.time()
+        ret, frame = self.cap.read()
+        if not ret and self.loops > 1:
+            self.loops -= 1
+            self.cap.set(cv.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if ret:
+            # Frames are not handed out faster than the camera would have recorded them
+            wait = self.started_at + self.frames / self.fps - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self.frames += 1
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class SyntheticCapture:
+    """`synthetic:WxH@FPS:FRAMES`: a noisy still background with a bright blob moving across it"""
+
+    def __init__(self, spec):
+        size, _, rest = spec.partition(':')[2].partition('@')
+        fps, _, frames = rest.partition(':')
+        self.width, self.height = (int(v) for v in size.split('x'))
+        self.fps = float(fps or 30)
+        self.total = int(frames or self.fps * 30)
+        self.started_at = None
+        self.frames = 0
+
+        rng = np.random.default_rng(0)
+        self.background = rng.integers(60, 120, (self.height, self.width, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return {cv.CAP_PROP_FPS: self.fps, cv.CAP_PROP_FRAME_WIDTH: self.width,
+                cv.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0)
+
+    def set(self, prop, value):
+        return False
+
+    def read(self):
+        if self.frames >= self.total:
+            return False, None
+        if self.started_at is None:
+            self.started_at = time.time()
+        wait = self.started_at + self.frames / self.fps - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+        frame = self.background.copy()
+        radius = max(8, self.height // 12)
+        x = int((self.frames * 4) % (self.width + 2 * radius)) - radius
+        cv.circle(frame, (x, self.height // 2), radius, (40, 200, 230), -1)
+        self.frames += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def open_source(source, loops=1):
+    """capture_factory for the FrameGrabbers: synthetic streams or recorded files"""
+    if str(source).startswith('synthetic:'):
+        return SyntheticCapture(source)
+    return ReplayCapture(source, loops)
+
+
+def percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(app.__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_replay(sources, engine, weights=None, loops=1, max_seconds=None):
+    """Replay `sources` through the pipeline of main.py and return the measurements"""
+    clip_dir = tempfile.mkdtemp(prefix='replay-clips-')
+    sms = ConsoleSms(verbose=False)
+    event_store = app.build_event_store(os.path.join(clip_dir, 'events.db')) if app.EVENT_DB else None
+    dispatcher = AlertDispatcher(sms, LocalStorage(os.path.join(clip_dir, 'uploaded')), workers=app.ALERT_WORKERS,
+                                 max_queue=app.ALERT_QUEUE_SIZE, overflow=app.ALERT_OVERFLOW, clip_dir=clip_dir,
+                                 event_store=event_store)
+
+    configs = [{'name': f'replay-{index}', 'source': source, 'latitude': app.LATITUDE, 'longitude': app.LONGITUDE}
+               for index, source in enumerate(sources)]
+    grabber_options = {'capture_factory': lambda source: open_source(source, loops), 'max_reconnects': 0}
+    cameras, frame_event = app.create_cameras(configs, grabber_options=grabber_options,
+                                              segment_dir=os.path.join(clip_dir, 'segments'))
+
+    notifier = app.build_notifier(dispatcher)
+    pipeline = app.build_pipeline(cameras, frame_event, notifier, engine=engine, weights=weights, display=False,
+                                  event_store=event_store)
+    pipeline.latencies = []     # build_pipeline() has already warmed the model up, outside the measurement
+
+    stop_event = threading.Event()
+    timer = threading.Timer(max_seconds, stop_event.set) if max_seconds else None
+    if timer is not None:
+        timer.start()
+
+    started = time.time()
+    for camera in cameras:
+        camera.start()
+    pipeline.run(stop_event)
+    elapsed = time.time() - started
+    if timer is not None:
+        timer.cancel()
+
+    notifier.stop()
+    dispatcher.stop()
+    if event_store is not None:
+        event_store.stop()
+    for camera in cameras:
+        camera.stop()
+    shutil.rmtree(clip_dir, ignore_errors=True)
+
+    latencies = pipeline.latencies
+    return {
+        'engine': engine,
+        'model': weights or (app.MODEL_DIR if engine == 'torch' else ENGINE_WEIGHTS[engine]),
+        'git_commit': git_commit(),
+        'sources': list(sources),
+        'settings': {
+            'imgsz': app.IMGSZ,
+            'max_batch': app.MAX_BATCH_SIZE,
+            'min_confidence': app.MIN_CONFIDENCE,
+            'detect_every': app.DETECT_EVERY_N,
+            'motion_gate': app.MOTION_GATE,
+            'tracker': app.TRACKER,
+            'cascade': app.CASCADE if app.USE_CASCADE else None,
+            'clip_buffer': app.CLIP_BUFFER_MODE,
+            'clip_pre_roll': app.CLIP_PRE_ROLL,
+            'clip_post_roll': app.CLIP_POST_ROLL,
+        },
+        'seconds': round(elapsed, 2),
+        'frames_read': sum(camera.grabber.frames_read for camera in cameras),
+        'frames_processed': pipeline.frames_processed,
+        'frames_dropped': sum(camera.grabber.frames_dropped for camera in cameras),
+        'frames_inferred': sum(camera.motion_gate.inferred for camera in cameras if camera.motion_gate),
+        'frames_skipped': sum(camera.motion_gate.skipped for camera in cameras if camera.motion_gate),
+        'sustained_fps': round(pipeline.frames_processed / elapsed, 2) if elapsed else None,
+        'latency_p50_ms': percentile_ms(latencies, 50),
+        'latency_p95_ms': percentile_ms(latencies, 95),
+        'latency_p99_ms': percentile_ms(latencies, 99),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),   # KB on Linux
+        'alerts_fired': pipeline.alerts_fired,
+        'sms_sent': sms.sent,
+        'notifier': notifier.metrics(),
+        'dispatcher': dispatcher.metrics(),
+        'event_store': event_store.metrics() if event_store is not None else None,
+        'stages': STAGE_SECONDS.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic video through the detection pipeline")
+    parser.add_argument('--sources', nargs='+', required=True, help="video files or synthetic:WxH@FPS:FRAMES, one camera each")
+    parser.add_argument('--engine', default=app.ENGINE, choices=list(ENGINE_WEIGHTS))
+    parser.add_argument('--weights', default=None, help="defaults to the engine's weights from engines.py")
+    parser.add_argument('--loops', type=int, default=1, help="play every video file this many times")
+    parser.add_argument('--max-seconds', type=float, default=None)
+    parser.add_argument('--output', default='pipeline_replay.json')
+    args = parser.parse_args()
+
+    report = run_replay(args.sources, args.engine, args.weights, args.loops, args.max_seconds)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n⏱️  {report['frames_processed']} frames in {report['seconds']}s: {report['sustained_fps']} fps")
+    print(f"   latency p50 {report['latency_p50_ms']} ms, p95 {report['latency_p95_ms']} ms, p99 {report['latency_p99_ms']} ms")
+    print(f"   peak RSS {report['peak_rss_mb']} MB, {report['alerts_fired']} alerts, {report['frames_dropped']} frames dropped")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
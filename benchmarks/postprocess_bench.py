@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of the detection post-processing in main.py.
+
+Compares the old per-box loop (box.conf[0], box.cls[0], box.xyxy[0], math.ceil and list
+membership checks) with detections.extract_detections() on crowded frames, e.g. a herd of
+deer or a troop of monkeys. Uses real ultralytics Boxes on torch tensors when they are
+installed, otherwise a NumPy stand-in with the same per-box indexing.
+
+    python benchmarks/postprocess_bench.py --boxes 10 50 200
+"""
+import os
+import sys
+import math
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detections import class_categories, extract_detections
+
+class_names = ['Tiger','Leopard','Cheetah','Elephant','Monkey','Deer','Lion','Bear','Pig','Bull']
+harmful_to_farms = ['Monkey','Deer','Pig','Bull']
+harmful_to_humans = ['Tiger','Leopard','Cheetah','Elephant','Lion','Bear']
+
+
+class NumpyBoxes:
+    """Minimal stand-in for ultralytics.engine.results.Boxes"""
+
+    def __init__(self, data):
+        self.data = data if data.ndim == 2 else data[None, :]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return NumpyBoxes(self.data[index])
+
+    @property
+    def xyxy(self):
+        return self.data[:, :4]
+
+    @property
+    def conf(self):
+        return self.data[:, -2]
+
+    @property
+    def cls(self):
+        return self.data[:, -1]
+
+
+def make_boxes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 1800, size=(count, 2))
+    wh = rng.uniform(20, 200, size=(count, 2))
+    conf = rng.uniform(0.25, 1.0, size=(count, 1))
+    cls = rng.choice([4, 5], size=(count, 1))    # Monkey / Deer
+    data = np.concatenate([xy, xy + wh, conf, cls], axis=1).astype(np.float32)
+    try:
+        import torch
+        from ultralytics.engine.results import Boxes
+        return Boxes(torch.from_numpy(data), (1080, 1920)), "ultralytics Boxes (torch)"
+    except ImportError:
+        return NumpyBoxes(data), "NumPy stand-in"
+
+
+def old_loop(boxes):
+    """The loop main.py used to run, minus drawing and alerting"""
+    kept = []
+    for box in boxes:
+        confidence = box.conf[0]
+        confidence = math.ceil(confidence * 100)
+        class_index = int(box.cls[0])
+        if confidence >= 85:
+            x1, y1, x2, y2 = box.xyxy[0]
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+            if class_names[class_index] in harmful_to_humans or class_names[class_index] in harmful_to_farms:
+                kept.append((x1, y1, x2, y2, confidence, class_index))
+    return kept
+
+
+def time_it(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-box loop vs vectorized detection post-processing")
+    parser.add_argument('--boxes', type=int, nargs='+', default=[10, 50, 200, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    categories = class_categories(class_names, harmful_to_humans, harmful_to_farms)
+    print(f"{'boxes':>6}{'kept':>6}{'loop ms':>10}{'vector ms':>11}{'speedup':>9}")
+    for count in args.boxes:
+        boxes, kind = make_boxes(count)
+        loop_ms, kept = time_it(lambda: old_loop(boxes), args.repeat)
+        vector_ms, detections = time_it(lambda: extract_detections(boxes, 85, categories), args.repeat)
+        assert len(kept) == len(detections)
+        print(f"{count:>6}{len(kept):>6}{loop_ms:>10.3f}{vector_ms:>11.3f}{loop_ms / vector_ms:>8.1f}x")
+    print(f"(boxes: {kind})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Cold-start time of the detector: seconds from process start until the loop is ready and until the
+first inference, for
+  sequential: the old order, everything imported and configured up front, model loaded, then the
+              cameras opened, no warm-up
+  parallel:   main.start_up(), lazy imports and client setup, the model loading and warming up
+              while the cameras connect
+Every run is a fresh Python process, so imports are cold (up to the OS file cache).
+`--open-delay` adds the connection time of a real RTSP camera to the replayed sources.
+
+    python benchmarks/startup_bench.py --sources synthetic:1280x720@15:300 --engine onnx --open-delay 2 --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(mode, sources, engine, weights, open_delay):
+    """One cold start, prints the startup milestones and stages as JSON"""
+    from startup import StartupTimer        # first, like main.py
+    startup = StartupTimer()
+    if mode == 'sequential':
+        # What main.py imported and configured at module level before the lazy start-up
+        import PIL.Image
+        try:
+            import cloudinary
+            import cloudinary.uploader
+        except ImportError:
+            pass
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    import time
+    import threading
+    import main as app
+    from pipeline_replay import open_source
+    startup.add('imports', startup.mark('imports'))
+
+    tmp = tempfile.mkdtemp(prefix='startup-bench-')
+    app.METRICS_PORT = None
+    app.ALERT_BACKEND = 'local'
+    app.EVENT_DB = os.path.join(tmp, 'events.db')
+    app.SPOOL_DIR = os.path.join(tmp, 'spool')
+
+    def slow_open(source):
+        time.sleep(open_delay)      # RTSP connect and first keyframe
+        return open_source(source, loops=100)
+
+    configs = [{'name': f'startup-{index}', 'source': source, 'latitude': app.LATITUDE, 'longitude': app.LONGITUDE}
+               for index, source in enumerate(sources)]
+    grabber_options = {'capture_factory': slow_open, 'max_reconnects': 0}
+
+    if mode == 'sequential':
+        with startup.stage('model_load'):
+            model = app.load_engine(engine or app.ENGINE, weights or (app.MODEL_DIR if (engine or app.ENGINE) == 'torch' else None),
+                                    imgsz=app.IMGSZ, conf=(app.MIN_CONFIDENCE - 1) / 100)
+        with startup.stage('cameras'):
+            cameras, frame_event = app.create_cameras(configs, grabber_options=grabber_options,
+                                                      segment_dir=os.path.join(tmp, 'segments'))
+            for camera in cameras:
+                camera.start()
+        with startup.stage('alerting'):
+            event_store = app.build_event_store()
+            dispatcher = app.build_alert_dispatcher(event_store=event_store)
+            notifier = app.build_notifier(dispatcher)
+        pipeline = app.build_pipeline(cameras, frame_event, notifier, display=False, event_store=event_store,
+                                      model=model, startup=startup)
+        with startup.stage('wait_for_cameras'):
+            for camera in cameras:
+                camera.grabber.wait_until_ready(timeout=30)
+        startup.report('ready')
+    else:
+        app.SEGMENT_DIR = os.path.join(tmp, 'segments')
+        cameras, pipeline, notifier, dispatcher, event_store = app.start_up(
+            startup, configs, grabber_options, engine, weights, display=False)
+
+    while 'first inference' not in startup.milestones:
+        pipeline.step()
+
+    notifier.stop()
+    dispatcher.stop()
+    event_store.stop()
+    for camera in cameras:
+        camera.stop()
+    print(json.dumps({'milestones': startup.milestones, 'stages': startup.stages}))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time, old sequential start-up vs main.start_up()")
+    parser.add_argument('--sources', nargs='+', default=['synthetic:1280x720@15:300'])
+    parser.add_argument('--engine', default=None, help="default: ENGINE of main.py")
+    parser.add_argument('--weights', default=None)
+    parser.add_argument('--open-delay', type=float, default=2.0, help="seconds each camera takes to connect")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--output', default='startup_bench.json')
+    parser.add_argument('--child', choices=('sequential', 'parallel'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.sources, args.engine, args.weights, args.open_delay)
+        return
+
+    rows = []
+    for mode in ('sequential', 'parallel'):
+        runs = []
+        for _ in range(args.runs):
+            command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--sources', *args.sources,
+                       '--open-delay', str(args.open_delay)]
+            if args.engine:
+                command += ['--engine', args.engine]
+            if args.weights:
+                command += ['--weights', args.weights]
+            result = subprocess.run(command, capture_output=True, text=True, cwd=tempfile.gettempdir())
+            if result.returncode != 0:
+                print(f"[ERROR] {mode} run failed:\n{result.stderr[-2000:]}")
+                sys.exit(1)
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        stages = {name: round(median([run['stages'].get(name, 0.0) for run in runs]), 3)
+                  for name in runs[0]['stages']}
+        rows.append({
+            'mode': mode,
+            'ready_s': round(median([run['milestones']['ready'] for run in runs]), 3),
+            'first_inference_s': round(median([run['milestones']['first inference'] for run in runs]), 3),
+            'stages_s': stages,
+        })
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'results': rows}, f, indent=2)
+
+    print(f"\n{'mode':<12}{'ready':>8}{'first inference':>17}   stages (median s)")
+    for row in rows:
+        stages = ", ".join(f"{name} {seconds}" for name, seconds in row['stages_s'].items())
+        print(f"{row['mode']:<12}{row['ready_s']:>8}{row['first_inference_s']:>17}   {stages}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Wall time of a hyperparameter sweep (hyperparameter_sweep.py) as sequential full runs, against the
+sweep runner on a data fraction with median pruning, one and `--parallel` trials at a time.
+
+No training: this script doubles as the trial process (`--fake-trial`). A fake trial reports a
+fitness curve per epoch through the same SweepStore as a real one and obeys the same pruning rule.
+Its final fitness depends on the sampled arguments (best near lr0 3e-3, mosaic 0.8, box 7) plus a
+little noise. An epoch sleeps FAKE_EPOCH_SECONDS x (fraction + validation share), so parallel trials
+stand for trials on separate devices or cores.
+
+    python benchmarks/sweep_bench.py --trials 16 --epochs 12 --parallel 4
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hyperparameter_sweep as sweep
+
+FAKE_EPOCH_SECONDS = float(os.environ.get('FAKE_EPOCH_SECONDS', 0.2))     # one epoch on all training images
+VALIDATION_SHARE = 0.1                                                      # validation, whatever the fraction
+
+
+def quality(config):
+    """Final fitness of a trial's arguments, the base arguments (trial 0) are decent but not the best"""
+    config = {'lr0': 0.008, 'mosaic': 0.7, 'box': 5.0, **config}
+    return (0.62 - 0.05 * (math.log10(config['lr0']) - math.log10(3e-3)) ** 2
+            - 0.2 * (config['mosaic'] - 0.8) ** 2 - 0.004 * (config['box'] - 7.0) ** 2)
+
+
+def fake_trial(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('trial', type=int)
+    parser.add_argument('--db')
+    parser.add_argument('--device')
+    parser.add_argument('--threads')
+    args = parser.parse_args(argv)
+
+    store = sweep.SweepStore(args.db)
+    settings = store.settings()
+    final = quality(store.trial(args.trial)['config'])
+    rng = random.Random(args.trial)
+    status = 'complete'
+    for epoch in range(1, settings['epochs'] + 1):
+        time.sleep(FAKE_EPOCH_SECONDS * (settings['fraction'] + VALIDATION_SHARE))
+        fitness = final * (1 - math.exp(-4 * epoch / settings['epochs'])) + rng.gauss(0, 0.005)
+        store.report(args.trial, epoch, fitness)
+        if settings['prune'] and store.should_prune(args.trial, epoch, settings['warmup_epochs'], settings['min_trials']):
+            status = 'pruned'
+            break
+    store.finish(args.trial, status)
+
+
+def run(folder, trials, epochs, fraction, parallel, prune, seed):
+    """One sweep with fake trials, returns seconds, statuses, epochs trained and the winning trial"""
+    db_path = os.path.join(folder, 'sweep.db')
+    store = sweep.SweepStore(db_path)
+    store.init_settings({'data': 'fake', 'base': 'training', 'model': 'fake', 'space': sweep.SEARCH_SPACE, 'seed': seed,
+                         'epochs': epochs, 'fraction': fraction, 'imgsz': 640, 'batch': 16, 'prune': prune,
+                         'warmup_epochs': 3, 'min_trials': 3, 'use_shards': False, 'project': folder})
+    store.add_trials(trials, sweep.SEARCH_SPACE, seed)
+    began = time.perf_counter()
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        sweep.run_sweep(store, db_path, parallel, ['cpu'], 1, os.path.join(folder, 'logs'),
+                        trial_cmd=[sys.executable, os.path.abspath(__file__), '--fake-trial'], poll_interval=0.05)
+    seconds = time.perf_counter() - began
+
+    results = store.trials()
+    statuses = {}
+    for trial in results:
+        statuses[trial['status']] = statuses.get(trial['status'], 0) + 1
+    best = sweep.leaderboard(results, top=1)[0]
+    return {'seconds': round(seconds, 2), 'statuses': statuses,
+            'epochs_trained': sum(trial['epochs_run'] for trial in results),
+            'best_trial': best['id'], 'best_quality': round(quality(best['config']), 4)}
+
+
+def main():
+    if sys.argv[1:2] == ['--fake-trial']:
+        fake_trial(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Sequential full runs vs the parallel, pruned sweep")
+    parser.add_argument('--trials', type=int, default=16)
+    parser.add_argument('--epochs', type=int, default=12)
+    parser.add_argument('--fraction', type=float, default=0.25)
+    parser.add_argument('--parallel', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='sweep_bench.json')
+    args = parser.parse_args()
+
+    configs = [{} if trial == 0 else sweep.sample_config(sweep.SEARCH_SPACE, args.seed, trial) for trial in range(args.trials)]
+    oracle = max(range(args.trials), key=lambda trial: quality(configs[trial]))
+    runs = [
+        ("sequential, full data", 1.0, 1, False),
+        ("sequential, fraction + pruning", args.fraction, 1, True),
+        (f"{args.parallel} parallel, fraction + pruning", args.fraction, args.parallel, True),
+    ]
+    tmp = tempfile.mkdtemp(prefix='sweep-bench-')
+    rows = []
+    try:
+        for index, (name, fraction, parallel, prune) in enumerate(runs):
+            folder = os.path.join(tmp, str(index))
+            os.makedirs(folder)
+            rows.append({'run': name, 'fraction': fraction, 'parallel': parallel, 'prune': prune,
+                         **run(folder, args.trials, args.epochs, fraction, parallel, prune, args.seed)})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'settings': {**vars(args), 'FAKE_EPOCH_SECONDS': FAKE_EPOCH_SECONDS}, 'best_possible_trial': oracle,
+                   'results': rows}, f, indent=2)
+
+    print(f"{args.trials} trials x {args.epochs} epochs, best possible trial {oracle} "
+          f"(quality {quality(configs[oracle]):.4f})")
+    print(f"{'run':<34}{'seconds':>9}{'epochs':>8}{'best':>6}{'quality':>9}   trials")
+    for row in rows:
+        statuses = ", ".join(f"{count} {status}" for status, count in sorted(row['statuses'].items()))
+        print(f"{row['run']:<34}{row['seconds']:>9}{row['epochs_trained']:>8}{row['best_trial']:>6}"
+              f"{row['best_quality']:>9}   {statuses}")
+    print(f"\n📁 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import threading
+from capture import FrameGrabber, LatencyStats
+from frame_buffer import RawFrameBuffer
+from motion import MotionGate
+from tracker import IouTracker
+from roi import RegionOfInterest
+
+
+class Camera:
+    """Everything that belongs to one camera: its capture thread, GPS location and alert state"""
+
+    def __init__(self, name, source, latitude, longitude, buffer_seconds=5, frame_event=None, buffer_factory=None,
+                 motion_gate=None, tracker=None, detect_every=1, roi=None, grabber_options=None, grabber_factory=FrameGrabber):
+        self.name = name
+        self.source = source
+        self.latitude = latitude.strip()
+        self.longitude = longitude.strip()
+        self.location_on_map = f"https://www.google.com/maps?q={self.latitude},{self.longitude}"
+
+        self.grabber = grabber_factory(source, buffer_seconds=buffer_seconds, frame_event=frame_event,
+                                       buffer_factory=buffer_factory or RawFrameBuffer, **(grabber_options or {}))
+        self.stats = LatencyStats(interval=10)
+        self.motion_gate = motion_gate  # None means every frame goes to the detector
+        self.tracker = tracker or IouTracker()
+        self.roi = roi                  # None means the whole frame is watched
+        self.detect_every = detect_every
+        self.frames_since_detection = 0
+
+    @property
+    def fps(self):
+        return self.grabber.fps
+
+    @property
+    def frame_size(self):
+        return self.grabber.frame_size
+
+    def wants_detection(self, frame):
+        """
+        Decide whether this frame goes through the detector. While tracks are alive the detector only
+        runs every `detect_every` frames, the tracker fills the gaps. Otherwise the motion gate decides.
+        """
+        self.frames_since_detection += 1
+        if len(self.tracker) and self.frames_since_detection < self.detect_every:
+            return False
+        if self.motion_gate is not None and not self.motion_gate.should_infer(frame):
+            return False
+        self.frames_since_detection = 0
+        return True
+
+    def start(self):
+        self.grabber.start()
+
+    def stop(self):
+        self.grabber.stop()
+        self.grabber.join(timeout=5)
+
+
+def load_cameras(camera_configs, buffer_seconds=5, buffer_factory=None, motion_settings=None,
+                 tracker_settings=None, detect_every=1, roi_imgsz=416, grabber_options=None, grabber_factory=FrameGrabber):
+    """
+    Build a Camera for every entry of the camera config list.
+    All grabbers share one event, so the detection loop can sleep until any camera has a new frame.
+    `motion_settings` are the MotionGate knobs (None disables the gate), a camera entry can override
+    them with its own 'motion' dict. `tracker_settings` are the IouTracker knobs. A camera entry with a
+    'roi' list of polygons only watches those regions, at `roi_imgsz` unless it sets its own 'roi_imgsz'.
+    `grabber_options` are passed on to every FrameGrabber (e.g. a capture_factory for recorded files).
+    `grabber_factory` replaces the FrameGrabber, e.g. by a reader of frames decoded in another process (multiproc.py).
+    """
+    frame_event = threading.Event()
+    cameras = []
+    for index, config in enumerate(camera_configs):
+        motion_gate = None
+        if motion_settings is not None:
+            motion_gate = MotionGate(**{**motion_settings, **config.get('motion', {})})
+
+        cameras.append(Camera(
+            name=config.get('name', f"camera_{index}"),
+            source=config['source'],
+            latitude=config['latitude'],
+            longitude=config['longitude'],
+            buffer_seconds=buffer_seconds,
+            frame_event=frame_event,
+            buffer_factory=buffer_factory,
+            motion_gate=motion_gate,
+            tracker=IouTracker(**(tracker_settings or {})),
+            detect_every=detect_every,
+            roi=RegionOfInterest(config['roi'], imgsz=config.get('roi_imgsz', roi_imgsz)) if config.get('roi') else None,
+            grabber_options=grabber_options,
+            grabber_factory=grabber_factory,
+        ))
+    return cameras, frame_event
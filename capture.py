@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+import cv2 as cv
+from frame_buffer import RawFrameBuffer
+from metrics import STAGE_SECONDS
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Keeps decoding a camera stream on its own thread, so the detector always works on the newest frame.
+
+    Every decoded frame goes into the pre-event frame buffer (at the full camera fps), but read_latest()
+    only ever hands out the most recent one. Frames that were replaced before anybody read them are
+    counted as dropped. A failed read does not stop the grabber, it reconnects with an exponential backoff.
+    """
+
+    def __init__(self, source, buffer_seconds=5, reconnect_delay=1.0, max_reconnect_delay=30.0,
+                 capture_factory=cv.VideoCapture, frame_event=None, buffer_factory=RawFrameBuffer, max_reconnects=None):
+        super().__init__(name=f"capture-{source}", daemon=True)
+        self.source = source
+        self.buffer_seconds = buffer_seconds
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.capture_factory = capture_factory
+        self.frame_event = frame_event      # optional threading.Event shared by several grabbers, set on every new frame
+        self.buffer_factory = buffer_factory    # called with the buffer length in frames, see frame_buffer.py
+        self.max_reconnects = max_reconnects    # None retries forever, 0 ends at the first failed read (recorded files)
+
+        self.fps = 0
+        self.frame_size = (0, 0)
+        self.frame_buffer = None    # the last `buffer_seconds` of frames, created once the fps is known
+
+        # Counters, read by the main loop for reporting
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+
+        self._latest = None         # (frame_id, frame, capture_time) of the newest decoded frame
+        self._last_read_id = 0
+        self._condition = threading.Condition()
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self.finished = threading.Event()   # set once the grabber gave up on its source or was stopped
+
+    def _open(self):
+        cap = self.capture_factory(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+
+        cap.set(cv.CAP_PROP_BUFFERSIZE, 1)      # keep OpenCV's own queue short, we do the buffering ourselves
+        fps = int(cap.get(cv.CAP_PROP_FPS)) or 30   # some IP streams report 0 fps
+        frame_size = (int(cap.get(cv.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)))
+
+        if self.frame_buffer is None:
+            self.frame_buffer = self.buffer_factory(fps * self.buffer_seconds)
+        self.frame_buffer.set_stream(fps, frame_size)
+        self.fps = fps
+        self.frame_size = frame_size
+        self._ready.set()
+        return cap
+
+    def run(self):
+        delay = self.reconnect_delay
+        cap = None
+
+        while not self._stop_event.is_set():
+            if cap is None:
+                cap = self._open()
+                if cap is None:
+                    if self._out_of_retries():
+                        break
+                    logging.warning(f"Could not open camera {self.source}, retrying in {delay:.0f}s")
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+
+            # On a live stream this includes waiting for the camera, at ~1/fps the decoder keeps up
+            with STAGE_SECONDS.time('decode'):
+                ret, frame = cap.read()
+            if not ret:
+                if self._out_of_retries():
+                    break
+                print(f"Failed to retrieve frame from {self.source}. Reconnecting in {delay:.0f}s...")
+                logging.warning(f"Lost camera {self.source}, reconnecting in {delay:.0f}s")
+                cap.release()
+                cap = None
+                self.reconnects += 1
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay    # stream is healthy again, reset the backoff
+            captured_at = time.time()
+            self.frame_buffer.append(frame, captured_at)
+
+            with self._condition:
+                self.frames_read += 1
+                if self._latest is not None and self._latest[0] != self._last_read_id:
+                    self.frames_dropped += 1     # the detector never saw the previous frame
+                self._latest = (self.frames_read, frame, captured_at)
+                self._condition.notify_all()
+            if self.frame_event is not None:
+                self.frame_event.set()
+
+        if cap is not None:
+            cap.release()
+        if self.frame_buffer is not None:
+            self.frame_buffer.close()
+        self.finished.set()
+        if self.frame_event is not None:
+            self.frame_event.set()      # wake up the detection loop so it notices
+
+    def _out_of_retries(self):
+        if self.max_reconnects is None or self.reconnects < self.max_reconnects:
+            return False
+        logging.info(f"Camera {self.source} ended after {self.reconnects} reconnects")
+        return True
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the stream has been opened once (fps and frame size are known)"""
+        return self._ready.wait(timeout)
+
+    def read_latest(self, timeout=1.0):
+        """
+        Return (frame_id, frame, capture_time) of the newest frame that has not been read yet.
+        Waits up to `timeout` seconds for one to arrive (0 to just poll) and returns None if nothing new came in.
+        """
+        with self._condition:
+            if not self._condition.wait_for(self._has_new_frame, timeout):
+                return None
+            self._last_read_id = self._latest[0]
+            return self._latest
+
+    def _has_new_frame(self):
+        return self._latest is not None and self._latest[0] != self._last_read_id
+
+    def clip(self, pre_roll, post_roll=0):
+        """The alert clip around this moment (see frame_buffer.py), None before the stream was opened"""
+        if self.frame_buffer is None:
+            return None
+        return self.frame_buffer.clip(pre_roll, post_roll)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class LatencyStats:
+    """Collects end-to-end frame latencies and reports them every `interval` seconds"""
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self.latencies = []
+        self.last_report = time.time()
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def report_if_due(self, grabber, motion_gate=None):
+        now = time.time()
+        elapsed = now - self.last_report
+        if elapsed < self.interval or not self.latencies:
+            return None
+
+        processed_fps = len(self.latencies) / elapsed
+        avg_latency = sum(self.latencies) / len(self.latencies)
+        max_latency = max(self.latencies)
+        report = (f"[STATS] {grabber.source}: processed {processed_fps:.1f} fps, "
+                  f"latency avg {avg_latency * 1000:.0f} ms / max {max_latency * 1000:.0f} ms, "
+                  f"read {grabber.frames_read}, dropped {grabber.frames_dropped}, reconnects {grabber.reconnects}")
+        if motion_gate is not None:
+            report += f", inferred {motion_gate.inferred}, skipped {motion_gate.skipped} (static)"
+        print(report)
+        logging.info(report)
+
+        self.latencies = []
+        self.last_report = now
+        return report
@@ -0,0 +1,69 @@
+import numpy as np
+
+from roi import detect_frames, merge_overlapping
+
+
+class Cascade:
+    """
+    Two-stage detection.
+
+    1. Screening: the whole frame (or its ROI crops) goes through the model at a low `screen_imgsz`
+       with a permissive `screen_conf`. This is cheap and returns candidate regions.
+    2. Confirmation: each candidate, grown by `margin` (fraction of the box size) and at least
+       `min_crop` pixels wide, is cut out of the full-resolution frame and run again at `confirm_imgsz`.
+
+    Only the confirmed boxes are returned, so the MIN_CONFIDENCE check, tracking and the SMS/upload
+    path only ever see high-resolution results. Frames without candidates cost one small pass.
+    """
+
+    def __init__(self, screen_imgsz=320, screen_conf=0.25, confirm_imgsz=640, margin=0.5, min_crop=160,
+                 max_candidates=8):
+        self.screen_imgsz = screen_imgsz
+        self.screen_conf = screen_conf
+        self.confirm_imgsz = confirm_imgsz
+        self.margin = margin
+        self.min_crop = min_crop
+        self.max_candidates = max_candidates
+
+        # Counters, to see how often the expensive pass runs
+        self.frames_screened = 0
+        self.regions_confirmed = 0
+
+    def candidate_regions(self, boxes, frame_shape):
+        """Grow the screening boxes into crop rectangles, merged where they overlap"""
+        height, width = frame_shape[:2]
+        boxes = boxes[np.argsort(-boxes[:, 4])][:self.max_candidates]   # most confident candidates first
+        rects = []
+        for x1, y1, x2, y2 in boxes[:, :4]:
+            grow_x = max((x2 - x1) * self.margin, (self.min_crop - (x2 - x1)) / 2, 0)
+            grow_y = max((y2 - y1) * self.margin, (self.min_crop - (y2 - y1)) / 2, 0)
+            rects.append([int(max(0, x1 - grow_x)), int(max(0, y1 - grow_y)),
+                          int(min(width, x2 + grow_x)), int(min(height, y2 + grow_y))])
+        return merge_overlapping(rects)
+
+    def detect(self, model, frames, rois, imgsz, max_batch):
+        """Same contract as roi.detect_frames(): one (N, 6) array of confirmed boxes per frame"""
+        screened = detect_frames(model, frames, rois, self.screen_imgsz, max_batch, conf=self.screen_conf)
+        self.frames_screened += len(frames)
+
+        jobs = []   # (frame index, crop, (x offset, y offset))
+        for index, (frame, boxes) in enumerate(zip(frames, screened)):
+            for x1, y1, x2, y2 in self.candidate_regions(boxes, frame.shape) if len(boxes) else ():
+                jobs.append((index, frame[y1:y2, x1:x2], (x1, y1)))
+        self.regions_confirmed += len(jobs)
+
+        per_frame = [[] for _ in frames]
+        for start in range(0, len(jobs), max_batch):
+            chunk = jobs[start:start + max_batch]
+            results = model.predict([crop for _, crop, _ in chunk], imgsz=self.confirm_imgsz or imgsz)
+            for (index, _, (dx, dy)), result in zip(chunk, results):
+                result = result.copy()
+                result[:, [0, 2]] += dx
+                result[:, [1, 3]] += dy
+                per_frame[index].append(result)
+
+        outputs = []
+        for frame, roi, results in zip(frames, rois, per_frame):
+            boxes = np.concatenate(results) if results else np.zeros((0, 6), dtype=np.float32)
+            outputs.append(roi.filter(boxes, frame.shape) if roi is not None else boxes)
+        return outputs
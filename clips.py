@@ -0,0 +1,108 @@
+import os
+import shutil
+import logging
+import subprocess
+import cv2 as cv
+
+FFMPEG = 'ffmpeg'   # binary used to join recorded segments, without it clips are re-encoded with OpenCV
+
+
+def write_clip(frames, fps, frame_size, filename):
+    """Encode the buffered frames into an mp4 file"""
+    out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
+    for frame in frames:
+        out.write(frame)
+    out.release()
+    return filename
+
+
+class BufferedClip:
+    """Frames copied out of a memory buffer (raw or JPEG), encoded when the alert is delivered"""
+
+    def __init__(self, frames, fps, frame_size):
+        self.frames = frames
+        self.fps = fps
+        self.frame_size = frame_size
+
+    def wait(self, timeout=None):
+        return True     # every frame is already there
+
+    def export(self, filename):
+        return write_clip(self.frames, self.fps, self.frame_size, filename)
+
+    def release(self):
+        pass
+
+
+class SegmentClip:
+    """
+    A time window of a SegmentRecorder (see frame_buffer.py), from `pre_roll` seconds before the
+    detection to `post_roll` seconds after it. Exporting joins the recorded segments, no re-encode.
+    """
+
+    def __init__(self, recorder, pin_id, start, end):
+        self.recorder = recorder
+        self.pin_id = pin_id
+        self.start = start
+        self.end = end
+
+    def wait(self, timeout=None):
+        """Block until the post-roll has been recorded (or the camera stopped)"""
+        if timeout is None:
+            timeout = max(0.0, self.end - self.recorder.now()) + 2 * self.recorder.segment_seconds + 5
+        return self.recorder.wait_until(self.end, timeout)
+
+    def export(self, filename):
+        try:
+            segments = self.recorder.segments_between(self.start, self.end)
+            if not segments:
+                raise RuntimeError(f"No recorded segments between {self.start:.1f} and {self.end:.1f}")
+            return concat_segments(segments, self.start, self.end, filename)
+        finally:
+            self.release()
+
+    def release(self):
+        self.recorder.unpin(self.pin_id)
+
+
+def concat_segments(segments, start, end, filename):
+    """Join (path, start, end) segments into one mp4, trimmed to [start, end] at the nearest keyframes"""
+    ffmpeg = shutil.which(FFMPEG)
+    if ffmpeg is None:
+        logging.warning(f"{FFMPEG} not found, re-encoding the clip with OpenCV")
+        return _reencode_segments(segments, filename)
+
+    list_path = filename + '.txt'
+    with open(list_path, 'w') as f:
+        for path, segment_start, segment_end in segments:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            if segment_start < start:
+                f.write(f"inpoint {start - segment_start:.3f}\n")
+            if segment_end > end:
+                f.write(f"outpoint {end - segment_start:.3f}\n")
+    try:
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                        '-c', 'copy', '-movflags', '+faststart', filename], check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg could not join the segments: {e.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_path)
+    return filename
+
+
+def _reencode_segments(segments, filename):
+    out = None
+    for path, _, _ in segments:
+        cap = cv.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if out is None:
+                out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*'mp4v'), cap.get(cv.CAP_PROP_FPS) or 30,
+                                     (frame.shape[1], frame.shape[0]))
+            out.write(frame)
+        cap.release()
+    if out is not None:
+        out.release()
+    return filename
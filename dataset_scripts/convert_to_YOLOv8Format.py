@@ -1,91 +1,349 @@
+"""
+Convert the OIDv4 ToolKit download (OIDv4_ToolKit/OID/Dataset/<split>/<Class>/ with a Label subfolder)
+into the YOLOv8 layout (Animals/images/<split>, Animals/labels/<split>).
+
+Image sizes come from the JPEG header, images are hard-linked (or reflinked / copied when the output is
+on another filesystem) instead of copied, and the labels are converted on a pool of processes.
+A manifest in the output folder remembers what was converted from which source file, so a rerun only
+touches new or changed labels and images, and drops the outputs of sources that are gone.
+
+    python dataset_scripts/convert_to_YOLOv8Format.py
+    python dataset_scripts/convert_to_YOLOv8Format.py --classes Tiger Bear --workers 8 --mode copy
+"""
 import os
+import sys
+import json
+import time
 import shutil
+import struct
+import argparse
 from glob import glob
-from PIL import Image       # for getting image dimensions that is used for normalization.
+from concurrent.futures import ProcessPoolExecutor
 
 # 👇 Class name to YOLO class ID mapping
 animals_map = {
     'Tiger' : 0,
-    'Leopard' : 1, 
-    'Cheetah' : 2, 
-    'Elephant' : 3, 
-    'Monkey' : 4, 
-    'Deer' : 5, 
-    'Lion' : 6, 
-    'Bear' : 7, 
-    'Pig' : 8, 
+    'Leopard' : 1,
+    'Cheetah' : 2,
+    'Elephant' : 3,
+    'Monkey' : 4,
+    'Deer' : 5,
+    'Lion' : 6,
+    'Bear' : 7,
+    'Pig' : 8,
     'Bull' : 9
 }
 
+# Define the animals(or classes) to convert
+animals = ['Tiger', 'Leopard', 'Cheetah', 'Elephant', 'Monkey', 'Deer', 'Lion', 'Bear', 'Pig', 'Bull']  # Add all your classes here
+SPLITS = ['train', 'test']
+SOURCE_BASE = "OIDv4_ToolKit/OID/Dataset"
+OUTPUT_BASE = "Animals"
+MANIFEST = ".convert_manifest.json"     # inside the output folder
+
+# Start Of Frame markers carry the image size, C4 (DHT), C8 (JPG) and CC (DAC) are not SOF
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+FICLONE = 0x40049409    # Linux ioctl for a copy-on-write clone (btrfs, XFS)
+
+
 def create_dirs(base):
     """Create YOLOv8-compliant folder structure"""
-    for split in ['train', 'test']:
+    for split in SPLITS:
         os.makedirs(f"{base}/images/{split}", exist_ok=True)
         os.makedirs(f"{base}/labels/{split}", exist_ok=True)
 
-def convert_labels_for_class(animal, split, output_base):
+
+def jpeg_size(path):
+    """(width, height) read from the SOF segment of a JPEG without decoding it, None if there is none"""
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            while byte and byte != b'\xff':
+                byte = f.read(1)
+            while byte == b'\xff':      # fill bytes
+                byte = f.read(1)
+            if not byte:
+                return None
+            marker = byte[0]
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                continue                # markers without a length
+            length = f.read(2)
+            if len(length) < 2:
+                return None
+            if marker in SOF_MARKERS:
+                data = f.read(5)
+                if len(data) < 5:
+                    return None
+                height, width = struct.unpack('>xHH', data)
+                return width, height
+            f.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
+
+
+def image_size(path):
+    size = jpeg_size(path) if path.lower().endswith(('.jpg', '.jpeg')) else None
+    if not size or not all(size):
+        from PIL import Image       # not a JPEG, or a header this parser does not know
+        with Image.open(path) as img:
+            size = img.size
+    return size
+
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        return False                # Windows
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def place_image(src, dst, mode='link'):
     """
-    Convert OID labels (with Label subfolder) to YOLO format
-    and copy images/labels to YOLOv8 structure
+    Put `src` at `dst` without copying its bytes where possible, returns how it was done.
+    'link' tries a hard link, then a reflink, then copies. 'reflink' skips the hard link, 'copy' always copies.
+    A hard-linked image is the same file as the download, edit neither in place.
     """
-    input_dir = f"OIDv4_ToolKit/OID/Dataset/{split}/{animal}"
-    label_dir = os.path.join(input_dir, "Label")
-    print(f"\n🔍 Processing class: {animal} [{split}]")
-    print(f"📂 Checking for label files in: {label_dir}")
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == 'link':
+        try:
+            os.link(src, dst)
+            return 'linked'
+        except OSError:
+            pass                    # another filesystem, or one without hard links
+    if mode in ('link', 'reflink') and _reflink(src, dst):
+        return 'reflinked'
+    shutil.copyfile(src, dst)
+    return 'copied'
 
-    label_files = glob(os.path.join(label_dir, "*.txt"))
-    print(f"📁 Found {len(label_files)} label files")
 
-    for label_path in label_files:
-        image_filename = os.path.basename(label_path).replace(".txt", ".jpg")
-        image_path = os.path.join(input_dir, image_filename)
-
-        if not os.path.exists(image_path):
-            print(f"⚠️ Image missing for label: {label_path}")
+def convert_label_lines(lines, img_width, img_height):
+    """OID 'Class xmin ymin xmax ymax' pixel boxes -> YOLO label text, and the number of skipped lines"""
+    yolo_labels = ""
+    skipped = 0
+    for line in lines:
+        parts = line.strip().split()
+        if len(parts) != 5 or parts[0] not in animals_map:
+            skipped += 1            # invalid or unknown class line
             continue
 
-        img = Image.open(image_path)
-        img_width, img_height = img.size
+        cls_id = animals_map[parts[0]]
+        xmin, xmax = float(parts[1]), float(parts[3])
+        ymin, ymax = float(parts[2]), float(parts[4])
 
-        with open(label_path, "r") as f:
-            lines = f.readlines()
+        x_center = ((xmin + xmax) / 2) / img_width
+        y_center = ((ymin + ymax) / 2) / img_height
+        height = (ymax - ymin) / img_height
+        width = (xmax - xmin) / img_width
+
+        yolo_labels += f"{cls_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n"
+    return yolo_labels, skipped
 
-        yolo_labels = ""
-        for line in lines:
-            print(f"🔎 Raw label line: {line.strip()}")
-            parts = line.strip().split()
-            if len(parts) != 5 or parts[0] not in animals_map:
-                print("⛔ Skipping invalid or unknown class line")
-                continue
 
-            cls_id = animals_map[parts[0]]
-            xmin, xmax = float(parts[1]), float(parts[3])
-            ymin, ymax = float(parts[2]), float(parts[4])
-            
-            x_center = ((xmin + xmax) / 2) / img_width
-            y_center = ((ymin + ymax) / 2) / img_height
-            height = (ymax - ymin) / img_height
-            width = (xmax - xmin) / img_width
+def convert_one(task):
+    """Convert one label file and place its image (runs in the worker processes)"""
+    label_path, image_path, dest_img, dest_lbl, mode = task
+    try:
+        img_width, img_height = image_size(image_path)
+        with open(label_path, "r") as f:
+            yolo_labels, skipped = convert_label_lines(f.readlines(), img_width, img_height)
+        how = place_image(image_path, dest_img, mode)
+        with open(dest_lbl, "w") as f:
+            f.write(yolo_labels)
+        return label_path, how, skipped, None
+    except Exception as e:
+        return label_path, 'failed', 0, str(e)
 
 
-            yolo_labels += f"{cls_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n"
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
 
-        # Save image and label
+
+def find_tasks(source_base, output_base, classes, splits, mode):
+    """
+    Every (label, image) pair of the download as a conversion task, with the manifest entry it would get.
+    Labels without an image are returned apart. An image downloaded for several classes has a label file
+    in each class folder and all of them write the same outputs, the last class wins (like the serial
+    conversion did), the others are returned as shadowed.
+    """
+    tasks, missing, shadowed = {}, [], []
+    for split in splits:
         split_folder = 'train' if split == 'train' else 'test'
-        dest_img = os.path.join(output_base, 'images', split_folder, image_filename)
-        dest_lbl = os.path.join(output_base, 'labels', split_folder, image_filename.replace('.jpg', '.txt'))
+        for animal in classes:
+            input_dir = os.path.join(source_base, split, animal)
+            for label_path in sorted(glob(os.path.join(input_dir, "Label", "*.txt"))):
+                image_filename = os.path.basename(label_path).replace(".txt", ".jpg")
+                image_path = os.path.join(input_dir, image_filename)
+                if not os.path.exists(image_path):
+                    missing.append(label_path)
+                    continue
+                dest_img = os.path.join(output_base, 'images', split_folder, image_filename)
+                dest_lbl = os.path.join(output_base, 'labels', split_folder, image_filename.replace('.jpg', '.txt'))
+                entry = {'label': _signature(label_path), 'image': _signature(image_path),
+                         'outputs': [dest_img, dest_lbl]}
+                if dest_lbl in tasks:
+                    shadowed.append(tasks[dest_lbl][0][0])
+                tasks[dest_lbl] = ((label_path, image_path, dest_img, dest_lbl, mode), entry)
+    return list(tasks.values()), missing, shadowed
 
-        shutil.copy(image_path, dest_img)
-        print(f"✅ Copied image → {dest_img}") # for debugging
-        with open(dest_lbl, "w") as f:
-            f.write(yolo_labels)
-        print(f"✅ Wrote labels → {dest_lbl}") # for debugging
 
-# Define the animals(or classes) and run
-animals = ['Tiger', 'Leopard', 'Cheetah', 'Elephant', 'Monkey', 'Deer', 'Lion', 'Bear', 'Pig', 'Bull']  # Add all your classes here
-OUTPUT_BASE = "Animals"
+def load_manifest(output_base):
+    path = os.path.join(output_base, MANIFEST)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Another class mapping changes every label, convert everything again
+    return manifest.get('files', {}) if manifest.get('classes') == animals_map else {}
+
+
+def save_manifest(output_base, files):
+    path = os.path.join(output_base, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'classes': animals_map, 'files': files}, f)
+    os.replace(path + '.tmp', path)
+
+
+class Progress:
+    """One self-updating line: done/total, rate and time left, redrawn at most every `interval` seconds"""
+
+    def __init__(self, total, interval=0.5, stream=sys.stdout):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.started = time.time()
+        self._drawn = 0.0
+
+    def update(self, count=1):
+        self.done += count
+        now = time.time()
+        if now - self._drawn >= self.interval or self.done == self.total:
+            self._drawn = now
+            elapsed = max(now - self.started, 1e-6)
+            rate = self.done / elapsed
+            left = (self.total - self.done) / rate if rate else 0
+            percent = 100 * self.done / self.total if self.total else 100
+            self.stream.write(f"\r⏳ {self.done}/{self.total} ({percent:.0f}%) {rate:.0f} files/s, {left:.0f}s left ")
+            self.stream.flush()
+
+    def close(self):
+        if self.total:
+            self.stream.write("\n")
+
+
+def convert_dataset(source_base=SOURCE_BASE, output_base=OUTPUT_BASE, classes=None, splits=None, workers=None,
+                    mode='link', force=False, verbose=False, progress=True):
+    """
+    Convert the download into `output_base`, returns the counts of what was done.
+    Unchanged files (same size and mtime as at the last run, outputs still there) are skipped unless `force`.
+    """
+    started = time.time()
+    classes = classes or animals
+    splits = splits or SPLITS
+    create_dirs(output_base)
+
+    previous = {} if force else load_manifest(output_base)
+    tasks, missing, shadowed = find_tasks(source_base, output_base, classes, splits, mode)
+    files, todo = {}, []
+    for task, entry in tasks:
+        label_path = task[0]
+        old = previous.get(label_path)
+        if old and old['label'] == entry['label'] and old['image'] == entry['image'] \
+                and old['outputs'] == entry['outputs'] and all(os.path.exists(path) for path in entry['outputs']):
+            files[label_path] = old
+        else:
+            todo.append((task, entry))
+
+    # Outputs of labels that are no longer in the download (only of the classes and splits converted now)
+    scanned = tuple(os.path.join(source_base, split, animal) + os.sep for split in splits for animal in classes)
+    entries = {task[0]: entry for task, entry in todo}
+    removed = 0
+    shadowed_set = set(shadowed)
+    for label_path, old in previous.items():
+        if label_path in files or label_path in entries or label_path in shadowed_set:
+            continue
+        if not label_path.startswith(scanned):
+            files[label_path] = old         # another class or split, not looked at in this run
+            continue
+        for path in old['outputs']:
+            if os.path.exists(path):
+                os.remove(path)
+        removed += 1
+
+    counts = {'labels': len(tasks), 'unchanged': len(tasks) - len(todo), 'converted': 0, 'removed': removed,
+              'missing_images': len(missing), 'shadowed': len(shadowed), 'skipped_lines': 0, 'failed': 0,
+              'linked': 0, 'reflinked': 0, 'copied': 0}
+    for label_path in missing:
+        if verbose:
+            print(f"⚠️ Image missing for label: {label_path}")
+
+    print(f"🔍 {len(tasks)} labels in {len(classes)} classes, {len(todo)} new or changed, "
+          f"{counts['unchanged']} unchanged, {len(missing)} without image, "
+          f"{len(shadowed)} overwritten by another class of the same image")
+    workers = workers or os.cpu_count() or 1
+    bar = Progress(len(todo)) if progress else None
+
+    def collect(results):
+        for label_path, how, skipped, error in results:
+            if error:
+                counts['failed'] += 1
+                print(f"\n❌ {label_path}: {error}")
+            else:
+                counts['converted'] += 1
+                counts[how] += 1
+                counts['skipped_lines'] += skipped
+                files[label_path] = entries[label_path]
+                if verbose and skipped:
+                    print(f"\n⛔ Skipped {skipped} invalid or unknown class line(s) in {label_path}")
+            if bar:
+                bar.update()
+
+    try:
+        if workers <= 1 or len(todo) < 2:
+            collect(map(convert_one, (task for task, _ in todo)))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, min(64, len(todo) // (workers * 4)))
+                collect(pool.map(convert_one, [task for task, _ in todo], chunksize=chunksize))
+    finally:
+        if bar:
+            bar.close()
+        save_manifest(output_base, files)   # what is done stays done if the run is interrupted
+
+    counts['seconds'] = round(time.time() - started, 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the OIDv4 ToolKit download to the YOLOv8 layout")
+    parser.add_argument('--source', default=SOURCE_BASE, help="OID/Dataset folder of the toolkit")
+    parser.add_argument('--output', default=OUTPUT_BASE)
+    parser.add_argument('--classes', nargs='+', default=animals)
+    parser.add_argument('--splits', nargs='+', default=SPLITS)
+    parser.add_argument('--workers', type=int, default=None, help="processes, default: one per core")
+    parser.add_argument('--mode', choices=('link', 'reflink', 'copy'), default='link',
+                        help="how images are placed, link falls back to reflink and copy")
+    parser.add_argument('--force', action='store_true', help="ignore the manifest, convert everything")
+    parser.add_argument('--verbose', action='store_true', help="list missing images and skipped label lines")
+    args = parser.parse_args()
+
+    counts = convert_dataset(args.source, args.output, args.classes, args.splits, args.workers, args.mode,
+                             args.force, args.verbose)
+    print(f"✅ Converted {counts['converted']} ({counts['linked']} linked, {counts['reflinked']} reflinked, "
+          f"{counts['copied']} copied), {counts['unchanged']} unchanged, {counts['removed']} removed, "
+          f"{counts['failed']} failed, {counts['skipped_lines']} label lines skipped in {counts['seconds']}s")
+
 
-create_dirs(OUTPUT_BASE)
-for animal in animals:
-    convert_labels_for_class(animal, 'train', OUTPUT_BASE)
-    convert_labels_for_class(animal, 'test', OUTPUT_BASE)
+if __name__ == '__main__':
+    main()
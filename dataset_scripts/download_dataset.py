@@ -1,8 +1,38 @@
+"""
+Download the training images of every class from Open Images with the OIDv4 Toolkit.
+
+The (class, split) jobs run a few at a time, each toolkit run logs to OIDv4_ToolKit/logs/. A manifest
+records the finished jobs, so an interrupted or failed run picks up where it stopped. Before a job is
+skipped or run again, its images are checked and truncated ones deleted, the toolkit downloads only the
+images that are not on disk. `--toolkit-cmd` runs something else than the toolkit (no network needed),
+e.g. `python benchmarks/download_bench.py --fake-toolkit`.
+
+    python dataset_scripts/download_dataset.py --jobs 4
+    python dataset_scripts/download_dataset.py --classes Tiger Bear --train-count 100 --test-count 20
+"""
 import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import threading
 import subprocess
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+# Modify this list and counts as needed
+animals = ['Tiger', 'Leopard', 'Cheetah', 'Elephant', 'Monkey', 'Deer', 'Lion', 'Bear', 'Pig', 'Bull']
+train_count = 600
+test_count = 150
+
+TOOLKIT_PATH = "OIDv4_ToolKit"
+TOOLKIT_CMD = "python main.py"      # run inside TOOLKIT_PATH
+MANIFEST = ".download_manifest.json"    # inside TOOLKIT_PATH
 
 
-def download_class(class_name, num_images, dataset_type):
+def download_class(class_name, num_images, dataset_type, toolkit_path=TOOLKIT_PATH, toolkit_cmd=TOOLKIT_CMD,
+                   log_path=None):
     """
     This is the function used to download images of particular class from Open Images using OIDv4 Toolkit.
 
@@ -10,30 +40,187 @@ def download_class(class_name, num_images, dataset_type):
         class_name (string)-> The class to download (ex-> Elephant, Tiger, etc.).
         num_images (integer)-> Number of images to download.
         dataset_type (string)-> 'train' or 'test'.
+        toolkit_path (string)-> Folder of the toolkit, the command runs there.
+        toolkit_cmd (string)-> Command that starts the toolkit.
+        log_path (string)-> File for the output of the toolkit, None prints it.
+
+    Returns the exit code of the toolkit.
     """
     dataset_type = dataset_type.lower()
     if dataset_type not in ['train', 'test']:
         raise ValueError("dataset_type must be 'train' or 'test'")
 
-    toolkit_path = "OIDv4_ToolKit"
     os.makedirs(toolkit_path, exist_ok=True)
 
-    cmd = [                         # This is the command that would run in terminal, using subprocess.run();
-        "python", "main.py", "downloader",
+    cmd = shlex.split(toolkit_cmd) + [      # This is the command that would run in terminal, using subprocess.run();
+        "downloader",
         "--classes", class_name,
         "--type_csv", dataset_type,
-        "--limit", str(num_images)
+        "--limit", str(num_images),
+        "--yes",                            # download missing CSV files without asking, nobody answers a parallel job
     ]
 
-    print(f"\n🚀 Downloading {num_images} images for class '{class_name}' as {dataset_type} set...\n")
-    subprocess.run(cmd, cwd=toolkit_path)
+    if log_path is None:
+        print(f"\n🚀 Downloading {num_images} images for class '{class_name}' as {dataset_type} set...\n")
+        return subprocess.run(cmd, cwd=toolkit_path, stdin=subprocess.DEVNULL).returncode
+    with open(log_path, 'a') as log:
+        log.write(f"\n$ {' '.join(cmd)}\n")
+        log.flush()
+        return subprocess.run(cmd, cwd=toolkit_path, stdin=subprocess.DEVNULL, stdout=log,
+                              stderr=subprocess.STDOUT).returncode
 
 
-# Modify this list and counts as needed
-animals = ['Tiger', 'Leopard', 'Cheetah', 'Elephant', 'Monkey', 'Deer', 'Lion', 'Bear', 'Pig', 'Bull']
-train_count = 600
-test_count = 150
+def is_complete_image(path):
+    """A JPEG that starts with its SOI marker and ends with EOI (trailing padding allowed), i.e. not cut off"""
+    try:
+        size = os.path.getsize(path)
+        if size < 4:
+            return False
+        with open(path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                return False
+            f.seek(max(0, size - 64))
+            return b'\xff\xd9' in f.read()
+    except OSError:
+        return False
+
+
+def verify_images(toolkit_path, class_name, split):
+    """Delete the truncated images (and their labels) of a job, returns (complete images, deleted)"""
+    folder = os.path.join(toolkit_path, 'OID', 'Dataset', split, class_name)
+    complete, deleted = 0, 0
+    for path in glob(os.path.join(folder, '*.jpg')):
+        if is_complete_image(path):
+            complete += 1
+            continue
+        os.remove(path)
+        label = os.path.join(folder, 'Label', os.path.basename(path)[:-4] + '.txt')
+        if os.path.exists(label):
+            os.remove(label)
+        deleted += 1
+    return complete, deleted
+
+
+def csv_ready(toolkit_path, split):
+    """The toolkit fetches the class list and the annotations of a split on its first run there"""
+    csv_folder = os.path.join(toolkit_path, 'OID', 'csv_folder')
+    return os.path.exists(os.path.join(csv_folder, 'class-descriptions-boxable.csv')) and \
+        os.path.exists(os.path.join(csv_folder, f"{split}-annotations-bbox.csv"))
+
+
+class DownloadManifest:
+    """Status of every job ('Tiger/train' -> {status, limit, images, ...}) in a JSON file, saved on every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def get(self, key):
+        return self.jobs.get(key, {})
+
+    def update(self, key, **fields):
+        with self._lock:
+            self.jobs[key] = {**self.jobs.get(key, {}), **fields}
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.jobs, f, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+
+
+def run_job(manifest, class_name, split, limit, toolkit_path, toolkit_cmd, retries, log_dir):
+    """Verify, skip or download one (class, split) job, retrying a failing toolkit. Returns the job status"""
+    key = f"{class_name}/{split}"
+    complete, deleted = verify_images(toolkit_path, class_name, split)
+    previous = manifest.get(key)
+    if previous.get('status') == 'done' and previous.get('limit') == limit and not deleted:
+        return 'skipped', complete, deleted
+    if complete >= limit and not deleted:
+        manifest.update(key, status='done', limit=limit, images=complete, finished_at=time.time())
+        return 'skipped', complete, deleted
+
+    log_path = os.path.join(log_dir, f"{class_name}_{split}.log")
+    manifest.update(key, status='running', limit=limit, started_at=time.time())
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(5 * 2 ** (attempt - 1), 60))
+        code = download_class(class_name, limit, split, toolkit_path, toolkit_cmd, log_path)
+        complete, cut_off = verify_images(toolkit_path, class_name, split)
+        deleted += cut_off
+        if code == 0 and not cut_off:
+            manifest.update(key, status='done', images=complete, attempts=attempt + 1, finished_at=time.time())
+            return 'done', complete, deleted
+    manifest.update(key, status='failed', images=complete, attempts=retries + 1, exit_code=code,
+                    finished_at=time.time())
+    return 'failed', complete, deleted
+
+
+def download_all(classes=None, counts=None, jobs=3, toolkit_path=TOOLKIT_PATH, toolkit_cmd=TOOLKIT_CMD, retries=2):
+    """
+    Run every (class, split) job, `jobs` at a time. `counts` maps split -> images per class.
+    Returns {'Tiger/train': status, ...}, a status is 'done', 'skipped' or 'failed'.
+    """
+    classes = classes or animals
+    counts = counts or {'train': train_count, 'test': test_count}
+    os.makedirs(toolkit_path, exist_ok=True)
+    log_dir = os.path.join(toolkit_path, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    manifest = DownloadManifest(os.path.join(toolkit_path, MANIFEST))
+
+    pending = [(animal, split, limit) for animal in classes for split, limit in counts.items()]
+    # Jobs of one split would all fetch its annotation CSV at once, the first of each one goes alone
+    first = []
+    for split in counts:
+        if not csv_ready(toolkit_path, split):
+            job = next(job for job in pending if job[1] == split)
+            first.append(job)
+            pending.remove(job)
+
+    results = {}
+    started = time.time()
+    print(f"🚀 {len(first) + len(pending)} download jobs, {jobs} at a time, logs in {log_dir}")
+
+    def run(job):
+        class_name, split, limit = job
+        began = time.time()
+        status, complete, deleted = run_job(manifest, class_name, split, limit, toolkit_path, toolkit_cmd,
+                                            retries, log_dir)
+        results[f"{class_name}/{split}"] = status
+        note = f", {deleted} cut-off image(s) deleted" if deleted else ""
+        icon = {'done': '✅', 'skipped': '⏭️', 'failed': '❌'}[status]
+        print(f"{icon} {class_name} [{split}] {status}: {complete} images in {time.time() - began:.0f}s{note} "
+              f"({len(results)}/{len(first) + len(pending)})")
+
+    for job in first:
+        run(job)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        list(pool.map(run, pending))
+
+    failed = [key for key, status in results.items() if status == 'failed']
+    print(f"\n🏁 {len(results) - len(failed)}/{len(results)} jobs complete in {time.time() - started:.0f}s")
+    if failed:
+        print(f"[ERROR] Failed: {', '.join(sorted(failed))}, see {log_dir}. Run again to retry them.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the dataset with the OIDv4 Toolkit, concurrently and resumably")
+    parser.add_argument('--classes', nargs='+', default=animals)
+    parser.add_argument('--train-count', type=int, default=train_count)
+    parser.add_argument('--test-count', type=int, default=test_count)
+    parser.add_argument('--jobs', type=int, default=3, help="toolkit runs at the same time")
+    parser.add_argument('--retries', type=int, default=2, help="extra attempts of a failing job")
+    parser.add_argument('--toolkit-path', default=TOOLKIT_PATH)
+    parser.add_argument('--toolkit-cmd', default=TOOLKIT_CMD, help="command starting the toolkit inside --toolkit-path")
+    args = parser.parse_args()
+
+    results = download_all(args.classes, {'train': args.train_count, 'test': args.test_count}, args.jobs,
+                           args.toolkit_path, args.toolkit_cmd, args.retries)
+    sys.exit(1 if 'failed' in results.values() else 0)
+
 
-for animal in animals:
-    download_class(animal, train_count, 'train')
-    download_class(animal, test_count, 'test')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+from glob import glob
+import yaml
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_data_yaml(data_yaml_path):
+    """Read a YOLO dataset yaml (like animals.yaml) and resolve its root folder"""
+    with open(data_yaml_path) as f:
+        data = yaml.safe_load(f)
+
+    root = data.get('path', '.')
+    if not os.path.isabs(root):
+        # relative to the yaml file if that folder exists, else to the working directory (what ultralytics falls back to)
+        beside_yaml = os.path.join(os.path.dirname(os.path.abspath(data_yaml_path)), root)
+        root = beside_yaml if os.path.isdir(beside_yaml) else os.path.abspath(root)
+    data['root'] = root
+    return data
+
+
+def dataset_images(data_yaml_path, split='val'):
+    """Sorted image paths of one split ('train' or 'val') of the dataset, a folder or a .txt list of images"""
+    data = load_data_yaml(data_yaml_path)
+    split_dir = os.path.join(data['root'], data[split])
+    if os.path.isfile(split_dir):
+        folder = os.path.dirname(split_dir)
+        with open(split_dir) as f:
+            # './' entries are relative to the list, like ultralytics reads them
+            lines = [line.strip() for line in f if line.strip()]
+        return sorted(os.path.join(folder, line[2:]) if line.startswith('./') else line for line in lines)
+    return sorted(path for path in glob(os.path.join(split_dir, '**', '*'), recursive=True)
+                  if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def label_path(image_path):
+    """YOLO layout: Animals/images/<split>/x.jpg -> Animals/labels/<split>/x.txt"""
+    head, tail = image_path.rsplit(f"{os.sep}images{os.sep}", 1)
+    return os.path.join(head, 'labels', os.path.splitext(tail)[0] + '.txt')
+
+
+def read_labels(image_path):
+    """(N, 5) array of class, x_center, y_center, width, height (normalized), empty for negative images"""
+    path = label_path(image_path)
+    if not os.path.exists(path):
+        return np.zeros((0, 5), dtype=np.float32)
+    labels = np.loadtxt(path, dtype=np.float32, ndmin=2)
+    return labels.reshape(-1, 5)
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Alert category of a class
+CATEGORY_NONE = 0
+CATEGORY_HUMANS = 1     # harmful_to_humans
+CATEGORY_FARMS = 2      # harmful_to_farms
+
+# One confident detection. Annotation, tracking, alerting and logging all work on arrays of these.
+DETECTION_DTYPE = np.dtype([
+    ('x1', np.int32),
+    ('y1', np.int32),
+    ('x2', np.int32),
+    ('y2', np.int32),
+    ('confidence', np.int16),   # percent, rounded up like the original math.ceil(conf * 100)
+    ('class_index', np.int16),
+    ('category', np.int8),
+])
+
+EMPTY_DETECTIONS = np.zeros(0, dtype=DETECTION_DTYPE)
+
+
+def class_categories(class_names, harmful_to_humans, harmful_to_farms):
+    """Lookup table class index -> category, so filtering is a single array index"""
+    categories = np.full(len(class_names), CATEGORY_NONE, dtype=np.int8)
+    for index, name in enumerate(class_names):
+        if name in harmful_to_humans:
+            categories[index] = CATEGORY_HUMANS
+        elif name in harmful_to_farms:
+            categories[index] = CATEGORY_FARMS
+    return categories
+
+
+def to_numpy(data):
+    """Torch tensor (on any device) or array -> NumPy array"""
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    return np.asarray(data)
+
+
+def detections_from_array(data, min_confidence, categories):
+    """
+    Turn an (N, 6) array of x1, y1, x2, y2, conf, cls rows into detection records, keeping only
+    boxes with at least `min_confidence` percent that belong to an alert category.
+    """
+    data = to_numpy(data)
+    if not len(data):
+        return EMPTY_DETECTIONS
+
+    confidence = np.ceil(data[:, 4] * 100)
+    class_index = data[:, 5].astype(np.int16)
+    category = categories[class_index]
+    keep = (confidence >= min_confidence) & (category != CATEGORY_NONE)
+
+    detections = np.empty(int(keep.sum()), dtype=DETECTION_DTYPE)
+    boxes = data[keep, :4].astype(np.int32)
+    detections['x1'] = boxes[:, 0]
+    detections['y1'] = boxes[:, 1]
+    detections['x2'] = boxes[:, 2]
+    detections['y2'] = boxes[:, 3]
+    detections['confidence'] = confidence[keep]
+    detections['class_index'] = class_index[keep]
+    detections['category'] = category[keep]
+    return detections
+
+
+def extract_detections(boxes, min_confidence, categories):
+    """Detection records from an ultralytics Boxes result, pulling it off the device in one go"""
+    data = to_numpy(boxes.data)
+    # boxes.data is x1, y1, x2, y2, (track id,) conf, cls
+    return detections_from_array(data[:, [0, 1, 2, 3, -2, -1]], min_confidence, categories)
+
+
+def detection_boxes(detections):
+    """(N, 4) float array of x1, y1, x2, y2"""
+    return np.stack([detections['x1'], detections['y1'], detections['x2'], detections['y2']], axis=1).astype(np.float32)
@@ -0,0 +1,322 @@
+"""
+Edge-sized detector from best.pt: knowledge distillation into a smaller student, optional structured
+channel pruning, a short fine-tune and a latency / mAP comparison of the student against the teacher.
+
+  student:    the teacher's architecture with --width of its channels and --depth of its block repeats,
+              trained from scratch or from --student-weights (e.g. yolov8n.pt when the widths match),
+              or with --prune the teacher itself with that share of its channels removed
+              (needs `pip install torch-pruning`)
+  distill:    the stock YOLOv8 loss on the labels plus DistillationLoss against the frozen teacher
+  fine-tune:  --finetune-epochs on the labels only, at a tenth of the learning rate
+  report:     parameters, GFLOPs, file size, CPU latency through engines.py (like main.py) and mAP
+
+    python distillation.py --teacher best.pt --width 0.5 --epochs 60 --finetune-epochs 10
+    python distillation.py --teacher best.pt --prune 0.4 --epochs 30 --finetune-epochs 10
+    python distillation.py --subset 64 --epochs 1 --finetune-epochs 1 --imgsz 320 --device cpu     # quick CPU check
+
+The student is a regular ultralytics checkpoint: YOLO('student.pt') loads it and export_engines.py
+exports it. A pruned student no longer matches its yaml, train it further with this script
+(--student student.pt --epochs 0 --finetune-epochs N) rather than YOLO('student.pt').train(), which
+would rebuild the unpruned architecture.
+"""
+import os
+import json
+import shutil
+import argparse
+from copy import deepcopy
+from functools import partial
+
+import yaml
+import torch
+import torch.nn.functional as F
+from ultralytics import YOLO
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.nn.modules import C2f
+from ultralytics.nn.tasks import DetectionModel, attempt_load_one_weight
+from ultralytics.utils.loss import v8DetectionLoss
+from ultralytics.utils.torch_utils import de_parallel, get_flops, get_num_params
+
+from dataset_utils import dataset_images, load_data_yaml
+from engines import load_engine, warm_up
+from validation import accuracy, load_val_frames, measure_latency
+
+TEACHER = 'best.pt'
+STUDENT_OUTPUT = 'student.pt'
+SUBSET_DIR = 'distill_subset'
+
+
+class DistillationLoss:
+    """
+    v8DetectionLoss on the labels plus the distillation term against the teacher, as a fourth loss item
+    (kd_loss). Per anchor, the student's box distributions (the DFL bins) are pulled towards the
+    teacher's by KL divergence, weighted by the teacher's confidence so background anchors do not
+    dominate, and its class scores towards the teacher's softened scores (Bernoulli KL). Both are
+    softened by `temperature`. Without a teacher the term is 0, the EMA copy of the student validates with that.
+    """
+
+    def __init__(self, model, teacher=None, gain=1.0, temperature=2.0):
+        self.detection_loss = v8DetectionLoss(model)
+        self.teacher = teacher
+        self.gain = gain
+        self.temperature = temperature
+        head = model.model[-1]      # Detect()
+        self.nc, self.reg_max = head.nc, head.reg_max
+
+    def split(self, feats):
+        """Head outputs -> (B, anchors, 4, reg_max) box distributions and (B, anchors, nc) class logits"""
+        dist, cls = torch.cat([x.view(x.shape[0], self.reg_max * 4 + self.nc, -1) for x in feats], 2).split(
+            (self.reg_max * 4, self.nc), 1)
+        dist = dist.permute(0, 2, 1).float()
+        return dist.reshape(dist.shape[0], dist.shape[1], 4, self.reg_max), cls.permute(0, 2, 1).float()
+
+    def distill(self, feats, images):
+        with torch.no_grad():
+            teacher_feats = self.teacher(images)[1]     # in eval mode Detect returns (decoded, raw head outputs)
+        student_dist, student_cls = self.split(feats)
+        teacher_dist, teacher_cls = self.split(teacher_feats)
+        t = self.temperature
+
+        weight = teacher_cls.sigmoid().amax(-1)
+        teacher_prob = (teacher_dist / t).softmax(-1)
+        box = (teacher_prob * (teacher_prob.clamp_min(1e-9).log() - (student_dist / t).log_softmax(-1))).sum(-1).mean(-1)
+        box = (box * weight).sum() / weight.sum().clamp_min(1)
+
+        # BCE against the soft targets minus their own entropy: 0 when the student matches the teacher
+        target = (teacher_cls / t).sigmoid()
+        cls = (F.binary_cross_entropy_with_logits(student_cls / t, target, reduction='none')
+               - F.binary_cross_entropy_with_logits(teacher_cls / t, target, reduction='none'))
+        cls = cls.sum() / weight.sum().clamp_min(1)
+        return (box + cls) * t ** 2 * self.gain
+
+    def __call__(self, preds, batch):
+        loss, loss_items = self.detection_loss(preds, batch)
+        if self.teacher is None:
+            return loss, torch.cat([loss_items, loss_items.new_zeros(1)])
+        feats = preds[1] if isinstance(preds, tuple) else preds
+        kd = self.distill(feats, batch['img'])
+        batch_size = feats[0].shape[0]
+        return loss + kd * batch_size, torch.cat([loss_items, kd.detach().view(1)])
+
+
+class DistillationTrainer(DetectionTrainer):
+    """
+    DetectionTrainer that trains `student` (a DetectionModel, e.g. a pruned one that its yaml can not
+    rebuild) instead of the model it was started from, distilling `teacher` into it when given.
+
+        YOLO('best.pt').train(trainer=partial(DistillationTrainer, teacher=teacher, student=student), ...)
+    """
+
+    def __init__(self, *args, teacher=None, student=None, kd_gain=1.0, temperature=2.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher
+        self.student = student
+        self.kd_gain = kd_gain
+        self.temperature = temperature
+
+    def get_model(self, cfg=None, weights=None, verbose=True):
+        if self.student is None:
+            return super().get_model(cfg, weights, verbose)
+        return self.student
+
+    def get_validator(self):
+        validator = super().get_validator()
+        if self.teacher is not None:
+            self.loss_names = 'box_loss', 'cls_loss', 'dfl_loss', 'kd_loss'
+        return validator
+
+    def _setup_train(self, world_size):
+        super()._setup_train(world_size)
+        if self.teacher is None:
+            return
+        self.teacher = self.teacher.to(self.device).float().eval()
+        for p in self.teacher.parameters():
+            p.requires_grad = False
+        model = de_parallel(self.model)
+        model.criterion = DistillationLoss(model, self.teacher, self.kd_gain, self.temperature)
+        self.ema.ema.criterion = DistillationLoss(self.ema.ema)
+
+    def save_model(self):
+        # The criteria hold the teacher, they must not be pickled into the checkpoints
+        models = [de_parallel(self.model), self.ema.ema]
+        criteria = [model.__dict__.pop('criterion', None) for model in models]
+        try:
+            super().save_model()
+        finally:
+            for model, criterion in zip(models, criteria):
+                if criterion is not None:
+                    model.criterion = criterion
+
+
+def student_yaml(teacher_yaml, width=0.5, depth=1.0):
+    """The teacher's model yaml with `width` of its channels and `depth` of its block repeats"""
+    cfg = deepcopy(teacher_yaml)
+    scales = cfg.get('scales')
+    if scales:
+        scale_depth, scale_width, max_channels = scales[cfg.get('scale') or next(iter(scales))]
+        cfg['scales'] = {'student': [scale_depth * depth, scale_width * width, max_channels]}
+        cfg['scale'] = 'student'
+    else:
+        cfg['depth_multiple'] = cfg.get('depth_multiple', 1.0) * depth
+        cfg['width_multiple'] = cfg.get('width_multiple', 1.0) * width
+    return cfg
+
+
+def build_student(teacher, width=0.5, depth=1.0, weights=None):
+    """A narrower / shallower DetectionModel for the teacher's classes, from `weights` where the shapes match"""
+    student = DetectionModel(student_yaml(teacher.yaml, width, depth), nc=teacher.yaml['nc'], verbose=False)
+    if weights:
+        student.load(attempt_load_one_weight(weights)[0])
+    return student
+
+
+def prune_model(model, ratio, imgsz=640):
+    """
+    Remove `ratio` of the channels of the prunable layers, smallest L2-norm filters first (torch-pruning).
+    The Detect head keeps its outputs (box bins and classes), and so does the first conv of every C2f
+    block, whose output is chunked into two equal halves.
+    """
+    try:
+        import torch_pruning as tp
+    except ImportError:
+        raise SystemExit("❌ --prune needs torch-pruning: pip install torch-pruning")
+
+    model = deepcopy(model).float().eval()
+    for p in model.parameters():
+        p.requires_grad = True      # the dependency graph is traced through autograd
+    example = torch.zeros(1, 3, imgsz, imgsz)
+    ignored = [model.model[-1]] + [m.cv1 for m in model.modules() if isinstance(m, C2f)]
+    importance = tp.importance.MagnitudeImportance(p=2)
+    try:
+        pruner = tp.pruner.MagnitudePruner(model, example, importance, pruning_ratio=ratio, ignored_layers=ignored, round_to=8)
+    except TypeError:
+        # torch-pruning < 1.3 names it ch_sparsity
+        pruner = tp.pruner.MagnitudePruner(model, example, importance, ch_sparsity=ratio, ignored_layers=ignored, round_to=8)
+    params = get_num_params(model)
+    pruner.step()
+    print(f"✂️  Pruned {ratio:.0%} of the channels: {params:,} -> {get_num_params(model):,} parameters")
+    return model
+
+
+def make_subset(data_yaml_path, images, folder=SUBSET_DIR):
+    """Dataset yaml over `images` train and a quarter as many val images, spread over the classes"""
+    data = load_data_yaml(data_yaml_path)
+    os.makedirs(folder, exist_ok=True)
+    for split, count in (('train', images), ('val', max(images // 4, 1))):
+        paths = dataset_images(data_yaml_path, split)
+        step = max(1, len(paths) // count)     # the images are sorted by class
+        with open(os.path.join(folder, f"{split}.txt"), 'w') as f:
+            f.write("\n".join(os.path.abspath(path) for path in paths[::step][:count]) + "\n")
+    subset_yaml = os.path.join(folder, 'data.yaml')
+    with open(subset_yaml, 'w') as f:
+        yaml.safe_dump({'path': os.path.abspath(folder), 'train': 'train.txt', 'val': 'val.txt',
+                        'nc': data['nc'], 'names': data['names']}, f, sort_keys=False)
+    return subset_yaml
+
+
+def train_student(teacher_path, student, data_yaml_path, epochs, name, teacher=None, kd_gain=1.0, temperature=2.0,
+                  **training_args):
+    """Train `student` (distilling `teacher` into it when given), returns the best checkpoint"""
+    model = YOLO(teacher_path)
+    model.train(trainer=partial(DistillationTrainer, teacher=teacher, student=student, kd_gain=kd_gain,
+                                temperature=temperature),
+                data=data_yaml_path, epochs=epochs, name=name, **training_args)
+    return str(model.trainer.best)
+
+
+def distill(teacher_path, data_yaml_path, width=0.5, depth=1.0, student_weights=None, prune=0.0, student_path=None,
+            epochs=60, finetune_epochs=10, kd_gain=1.0, temperature=2.0, output=STUDENT_OUTPUT, **training_args):
+    """Student of the teacher: built, pruned or an earlier one (`student_path`), distilled, fine-tuned, saved to `output`"""
+    if not epochs and not finetune_epochs:
+        raise SystemExit("❌ Nothing to train, set --epochs or --finetune-epochs")
+    teacher, _ = attempt_load_one_weight(teacher_path)
+    if student_path:
+        student, _ = attempt_load_one_weight(student_path)
+    elif prune:
+        student = prune_model(teacher, prune, training_args.get('imgsz', 640))
+    else:
+        student = build_student(teacher, width, depth, student_weights)
+        print(f"🎓 Student at {width}x width, {depth}x depth: {get_num_params(student):,} parameters "
+              f"(teacher {get_num_params(teacher):,})")
+
+    best = None
+    if epochs:
+        print(f"\n🧪 Distilling {teacher_path} into the student for {epochs} epochs...")
+        best = train_student(teacher_path, student, data_yaml_path, epochs, 'distill', teacher, kd_gain, temperature,
+                             **training_args)
+    if finetune_epochs:
+        print(f"\n🔧 Fine-tuning the student for {finetune_epochs} epochs...")
+        if best:
+            student, _ = attempt_load_one_weight(best)
+        best = train_student(teacher_path, student, data_yaml_path, finetune_epochs, 'finetune',
+                             **{**training_args, 'lr0': training_args.get('lr0', 0.01) / 10, 'warmup_epochs': 0})
+    shutil.copy(best, output)
+    print(f"✅ Student saved to {output}")
+    return output
+
+
+def compare(teacher_path, student_path, data_yaml_path, imgsz=640, images=100, skip_map=False):
+    """Parameters, GFLOPs, size, CPU latency and mAP of the teacher and the student"""
+    frames, _ = load_val_frames(data_yaml_path, images)
+    rows = []
+    for role, weights in (('teacher', teacher_path), ('student', student_path)):
+        model, _ = attempt_load_one_weight(weights)
+        row = {'model': role, 'weights': weights, 'params': get_num_params(model),
+               'gflops': round(get_flops(model, imgsz), 2), 'size_mb': round(os.path.getsize(weights) / 2 ** 20, 2)}
+        engine = load_engine('torch', weights, imgsz=imgsz)
+        warm_up(engine, (imgsz,))
+        row.update(measure_latency(engine, frames))
+        if not skip_map:
+            row.update(accuracy(weights, data_yaml_path, imgsz))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill (and prune) best.pt into an edge-sized student")
+    parser.add_argument('--teacher', default=TEACHER)
+    parser.add_argument('--data', default='animals.yaml')
+    parser.add_argument('--width', type=float, default=0.5, help="channels of the student relative to the teacher")
+    parser.add_argument('--depth', type=float, default=1.0, help="block repeats of the student relative to the teacher")
+    parser.add_argument('--student-weights', default=None, help="initial student weights, loaded where the shapes match")
+    parser.add_argument('--prune', type=float, default=0.0, help="prune this share of the teacher's channels instead")
+    parser.add_argument('--student', default=None, help="continue with this student checkpoint instead (e.g. a pruned one)")
+    parser.add_argument('--epochs', type=int, default=60, help="distillation epochs")
+    parser.add_argument('--finetune-epochs', type=int, default=10)
+    parser.add_argument('--kd-gain', type=float, default=1.0, help="weight of the distillation term")
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--lr0', type=float, default=0.01)
+    parser.add_argument('--device', default=None, help="cpu, 0, ... (default: the GPU if there is one)")
+    parser.add_argument('--subset', type=int, default=0, help="train on this many images only (quick CPU check)")
+    parser.add_argument('--images', type=int, default=100, help="val images used for the latency measurement")
+    parser.add_argument('--skip-map', action='store_true', help="only measure latency in the report")
+    parser.add_argument('--project', default='ProjectX')
+    parser.add_argument('--output', default=STUDENT_OUTPUT)
+    parser.add_argument('--report', default='distillation_report.json')
+    args = parser.parse_args()
+
+    data_yaml_path = make_subset(args.data, args.subset) if args.subset else args.data
+    training_args = {'imgsz': args.imgsz, 'batch': args.batch, 'lr0': args.lr0, 'project': args.project,
+                     'exist_ok': True, 'workers': 0, 'amp': False, 'plots': False}
+    if args.device is not None:
+        training_args['device'] = args.device
+
+    student_path = distill(args.teacher, data_yaml_path, args.width, args.depth, args.student_weights, args.prune,
+                           args.student, args.epochs, args.finetune_epochs, args.kd_gain, args.temperature, args.output, **training_args)
+    rows = compare(args.teacher, student_path, data_yaml_path, args.imgsz, args.images, args.skip_map)
+    with open(args.report, 'w') as f:
+        json.dump({'settings': vars(args), 'models': rows}, f, indent=2)
+
+    print(f"\n{'model':<10}{'params':>12}{'GFLOPs':>8}{'MB':>7}{'mean ms':>9}{'p95 ms':>9}{'fps':>7}{'mAP50-95':>10}{'mAP50':>8}")
+    for row in rows:
+        print(f"{row['model']:<10}{row['params']:>12,}{row['gflops']:>8}{row['size_mb']:>7}{row['mean_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['fps']:>7}{row.get('map50_95', '-'):>10}{row.get('map50', '-'):>8}")
+    teacher, student = rows
+    print(f"\n⚡ Student: {teacher['mean_ms'] / max(student['mean_ms'], 1e-6):.2f}x faster per frame"
+          + (f", mAP50-95 {student['map50_95'] - teacher['map50_95']:+.4f}" if not args.skip_map else ""))
+    print(f"📁 Saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Inference engines for the detector.
+
+Every engine takes a list of BGR frames (plus an optional input size and confidence threshold
+overriding its defaults) and returns, per frame, an (N, 6) float32 array of
+x1, y1, x2, y2, conf, cls in frame pixels, which detections.detections_from_array() turns into
+detection records. That way main.py does not care whether the model runs through PyTorch,
+ONNX Runtime or OpenVINO. Only the selected engine's runtime gets imported.
+
+Export the ONNX / OpenVINO / int8 variants of best.pt with export_engines.py.
+"""
+import os
+import numpy as np
+import cv2 as cv
+
+from detections import to_numpy
+
+# Default weights per engine, as written by export_engines.py
+ENGINE_WEIGHTS = {
+    'torch': 'best.pt',
+    'onnx': 'best.onnx',
+    'onnx-int8': 'best-int8.onnx',
+    'openvino': 'best_openvino_model',
+    'openvino-int8': 'best_int8_openvino_model',
+}
+
+
+class UltralyticsEngine:
+    """best.pt through ultralytics/PyTorch, the reference engine"""
+
+    def __init__(self, weights, imgsz=640, conf=0.25, iou=0.45):
+        from ultralytics import YOLO
+        self.model = YOLO(weights, task='detect')
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def predict(self, frames, imgsz=None, conf=None):
+        results = self.model(frames, imgsz=imgsz or self.imgsz, conf=conf or self.conf, iou=self.iou, verbose=False)
+        # boxes.data is x1, y1, x2, y2, (track id,) conf, cls
+        return [to_numpy(result.boxes.data)[:, [0, 1, 2, 3, -2, -1]] for result in results]
+
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to size x size, like ultralytics does"""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = round(width * scale), round(height * scale)
+    top, left = (size - new_height) // 2, (size - new_width) // 2
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_height, left:left + new_width] = cv.resize(frame, (new_width, new_height), interpolation=cv.INTER_LINEAR)
+    return canvas, scale, (left, top)
+
+
+class LetterboxEngine:
+    """
+    Shared pre/post-processing for runtimes that execute the raw exported YOLOv8 graph:
+    letterbox + NCHW blob in, (batch, 4 + classes, anchors) out, then confidence filter,
+    class-aware NMS and mapping back to frame pixels, all in NumPy/OpenCV.
+    """
+
+    def __init__(self, imgsz=640, conf=0.25, iou=0.45, max_batch=None):
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_batch = max_batch      # models exported without a dynamic batch only take one image
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames, imgsz=None, conf=None):
+        imgsz = imgsz or self.imgsz
+        conf = conf or self.conf
+        letterboxed = [letterbox(frame, imgsz) for frame in frames]
+        step = self.max_batch or len(frames)
+
+        outputs = []
+        for start in range(0, len(frames), step):
+            images = [image for image, _, _ in letterboxed[start:start + step]]
+            blob = cv.dnn.blobFromImages(images, scalefactor=1 / 255, swapRB=True)
+            outputs.extend(self._run(blob))
+
+        return [self._postprocess(output, scale, pad, frame.shape, conf)
+                for output, (_, scale, pad), frame in zip(outputs, letterboxed, frames)]
+
+    def _postprocess(self, output, scale, pad, frame_shape, conf):
+        predictions = output.T                      # (anchors, 4 + classes)
+        scores = predictions[:, 4:]
+        class_index = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), class_index]
+        keep = confidence >= conf
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+
+        cx, cy, w, h = predictions[keep, :4].T
+        class_index, confidence = class_index[keep], confidence[keep]
+        indices = cv.dnn.NMSBoxesBatched(np.stack([cx - w / 2, cy - h / 2, w, h], axis=1).tolist(),
+                                         confidence.tolist(), class_index.tolist(), conf, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)[indices]
+        boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+        boxes /= scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+        return np.concatenate([boxes, confidence[indices, None], class_index[indices, None]], axis=1).astype(np.float32)
+
+
+class OnnxEngine(LetterboxEngine):
+    """best.onnx (or its int8 quantized version) through ONNX Runtime, no PyTorch import"""
+
+    def __init__(self, weights, imgsz=640, conf=0.25, iou=0.45, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(weights, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        batch, _, height, _ = self.session.get_inputs()[0].shape
+        fixed_size = height if isinstance(height, int) else None
+        super().__init__(fixed_size or imgsz, conf, iou, max_batch=batch if isinstance(batch, int) else None)
+        self.fixed_size = fixed_size
+
+    def predict(self, frames, imgsz=None, conf=None):
+        # A model exported without dynamic axes only accepts the size it was exported at
+        return super().predict(frames, self.fixed_size or imgsz, conf)
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoEngine(LetterboxEngine):
+    """An OpenVINO IR export (FP32/FP16 or int8) on the CPU plugin"""
+
+    def __init__(self, weights, imgsz=640, conf=0.25, iou=0.45):
+        from openvino.runtime import Core
+        if os.path.isdir(weights):
+            weights = next(os.path.join(weights, name) for name in os.listdir(weights) if name.endswith('.xml'))
+        core = Core()
+        model = core.read_model(weights)
+        input_shape = model.inputs[0].get_partial_shape()
+        static_batch = input_shape[0].is_static
+        self.fixed_size = input_shape[2].get_length() if input_shape[2].is_static else None
+        self.compiled = core.compile_model(model, 'CPU', {'PERFORMANCE_HINT': 'LATENCY'})
+        self.output = self.compiled.output(0)
+        super().__init__(self.fixed_size or imgsz, conf, iou,
+                         max_batch=input_shape[0].get_length() if static_batch else None)
+
+    def predict(self, frames, imgsz=None, conf=None):
+        return super().predict(frames, self.fixed_size or imgsz, conf)
+
+    def _run(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+def load_engine(kind='torch', weights=None, imgsz=640, conf=0.25, iou=0.45):
+    """Build the engine selected in the config, with the default weights of that engine unless given"""
+    if kind not in ENGINE_WEIGHTS:
+        raise ValueError(f"Unknown engine '{kind}', choose from {list(ENGINE_WEIGHTS)}")
+    weights = weights or ENGINE_WEIGHTS[kind]
+
+    if kind == 'torch':
+        return UltralyticsEngine(weights, imgsz, conf, iou)
+    if kind.startswith('onnx'):
+        return OnnxEngine(weights, imgsz, conf, iou)
+    return OpenVinoEngine(weights, imgsz, conf, iou)
+
+
+def warm_up(engine, sizes=(640,), batch=1, runs=2):
+    """
+    Run the engine on blank frames at every input size it will see, so the one-time costs of the first
+    inference (graph building, memory allocation, kernel selection) are paid before the cameras are live.
+    """
+    for size in dict.fromkeys(sizes):
+        frames = [np.zeros((size, size, 3), dtype=np.uint8)] * batch
+        for _ in range(runs):
+            engine.predict(frames, imgsz=size)
@@ -0,0 +1,266 @@
+"""
+Every confirmed detection (camera, time, class, confidence, box, track, clip link) in an SQLite
+database, instead of free-text lines in logs/log.log.
+
+The detection loop only puts a tuple on a queue. A writer thread appends them in batches, one
+transaction each, to a WAL-mode database, so readers (the CLI, a dashboard) never block it.
+Indexes on time, (camera, time) and (class, time) keep queries fast over months of events.
+
+    python event_store.py --class Bear --camera "Camera 3" --since 7d
+    python event_store.py --since 2026-10-01 --until 2026-10-08 --count
+"""
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import queue
+import logging
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+from metrics import STAGE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    cls TEXT NOT NULL,
+    category INTEGER,
+    confidence INTEGER,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    track_id INTEGER,
+    alerted INTEGER NOT NULL DEFAULT 0,
+    clip_link TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_camera_ts ON events (camera, ts);
+CREATE INDEX IF NOT EXISTS events_cls_ts ON events (cls, ts);
+"""
+
+COLUMNS = ('event_id', 'ts', 'camera', 'cls', 'category', 'confidence', 'x1', 'y1', 'x2', 'y2', 'track_id', 'alerted')
+INSERT = f"INSERT OR IGNORE INTO events ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")     # WAL stays consistent, a power cut loses at most the last batch
+    return connection
+
+
+class EventStore:
+    """
+    Batched, non-blocking writer plus a small query API. record() never waits: when the writer
+    falls more than `max_pending` events behind, new events are dropped and counted instead.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_pending=10000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.counters = {'recorded': 0, 'written': 0, 'dropped': 0, 'alerted': 0, 'batches': 0}
+
+        with connect(path) as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._write_loop, name="event-store", daemon=True)
+        self._thread.start()
+
+    def record(self, camera_name, class_name, category, confidence, box, track_id=None, timestamp=None, event_id=None):
+        """Queue one detection, returns its event id (see mark_alerted)"""
+        event_id = event_id or uuid.uuid4().hex
+        x1, y1, x2, y2 = (int(v) for v in box)
+        row = (event_id, timestamp or time.time(), camera_name, class_name, int(category), int(confidence),
+               x1, y1, x2, y2, track_id, 0)
+        if self._stopping:
+            self.counters['dropped'] += 1
+            return event_id
+        try:
+            self._queue.put_nowait(('event', row))
+            self.counters['recorded'] += 1
+        except queue.Full:
+            self.counters['dropped'] += 1
+        return event_id
+
+    def mark_alerted(self, event_ids, clip_link=None):
+        """The events went out in an SMS, with the link of their clip if it is known yet"""
+        if not event_ids:
+            return
+        if self._stopping:
+            logging.warning(f"Event store stopped, alert of {len(event_ids)} event(s) not recorded")
+            return
+        try:
+            self._queue.put_nowait(('alerted', (list(event_ids), clip_link)))
+        except queue.Full:
+            logging.warning(f"Event store queue full, alert of {len(event_ids)} event(s) not recorded")
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        closed = False
+        while not closed:
+            items = []
+            try:
+                items.append(self._queue.get(timeout=self.flush_interval))
+                while len(items) < self.batch_size:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in items:
+                # Anything queued after the stop sentinel (a late record()) is dropped with it
+                items = items[:items.index(None)]
+                closed = True
+            if items:
+                try:
+                    self._write(connection, items)
+                except sqlite3.Error as e:
+                    logging.error(f"Event store write of {len(items)} item(s) failed: {e}")
+        connection.close()
+
+    def _write(self, connection, items):
+        # Updates refer to events queued before them, so inserts of the batch go first
+        rows = [payload for kind, payload in items if kind == 'event']
+        with STAGE_SECONDS.time('event_write'), connection:
+            connection.executemany(INSERT, rows)
+            for kind, payload in items:
+                if kind == 'alerted':
+                    event_ids, link = payload
+                    connection.executemany("UPDATE events SET alerted = 1, clip_link = COALESCE(?, clip_link) "
+                                           "WHERE event_id = ?", [(link, event_id) for event_id in event_ids])
+                    self.counters['alerted'] += len(event_ids)
+        self.counters['written'] += len(rows)
+        self.counters['batches'] += 1
+
+    def query(self, camera=None, class_name=None, since=None, until=None, alerted_only=False, limit=1000):
+        return query_events(self.path, camera, class_name, since, until, alerted_only, limit)
+
+    def count(self, camera=None, class_name=None, since=None, until=None, alerted_only=False):
+        return count_events(self.path, camera, class_name, since, until, alerted_only)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        metrics = dict(self.counters)
+        metrics['pending'] = self.pending
+        return metrics
+
+    def stop(self, timeout=10.0):
+        """Write what is still queued, then stop, later record() / mark_alerted() calls are dropped"""
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def query_events(path, camera=None, class_name=None, since=None, until=None, alerted_only=False, limit=1000):
+    """Events matching the filters, newest first, as dicts"""
+    where, params = _filters(camera, class_name, since, until, alerted_only)
+    sql = f"SELECT * FROM events{where} ORDER BY ts DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in connection.execute(sql, params)]
+    finally:
+        connection.close()
+
+
+def count_events(path, camera=None, class_name=None, since=None, until=None, alerted_only=False):
+    """{(camera, class): number of events} matching the filters"""
+    where, params = _filters(camera, class_name, since, until, alerted_only)
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        rows = connection.execute(f"SELECT camera, cls, COUNT(*) FROM events{where} GROUP BY camera, cls "
+                                  "ORDER BY COUNT(*) DESC", params)
+        return {(camera, cls): count for camera, cls, count in rows}
+    finally:
+        connection.close()
+
+
+def _filters(camera, class_name, since, until, alerted_only):
+    clauses, params = [], []
+    if camera is not None:
+        clauses.append("camera = ?")
+        params.append(camera)
+    if class_name is not None:
+        clauses.append("cls = ?")
+        params.append(class_name)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    if alerted_only:
+        clauses.append("alerted = 1")
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def parse_time(value):
+    """'7d', '12h', '30m' ago, or an ISO date/time, as a unix timestamp"""
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+    if value[-1:] in units and value[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the detection event store")
+    parser.add_argument('--db', default='./events/events.db')
+    parser.add_argument('--camera')
+    parser.add_argument('--class', dest='class_name')
+    parser.add_argument('--since', help="7d, 12h, 30m or an ISO date")
+    parser.add_argument('--until', help="same formats as --since")
+    parser.add_argument('--alerted', action='store_true', help="only detections that raised an alert")
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--count', action='store_true', help="number of events per camera and class")
+    parser.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"[ERROR] No event store at {args.db}")
+        sys.exit(1)
+
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+
+    if args.count:
+        counts = count_events(args.db, args.camera, args.class_name, since, until, args.alerted)
+        for (camera, class_name), count in counts.items():
+            print(f"{count:>8}  {class_name:<16}{camera}")
+        return
+
+    events = query_events(args.db, args.camera, args.class_name, since, until, args.alerted, args.limit)
+    for event in events:
+        event['time'] = datetime.fromtimestamp(event['ts']).isoformat(sep=' ', timespec='seconds')
+    if args.format == 'json':
+        print(json.dumps(events, indent=2))
+    elif args.format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=['time'] + list(COLUMNS[2:]) + ['clip_link', 'event_id'],
+                                extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(events)
+    else:
+        for event in events:
+            box = f"[{event['x1']}, {event['y1']}, {event['x2']}, {event['y2']}]"
+            print(f"{event['time']}  {event['camera']:<14}{event['cls']:<14}{event['confidence']:>3}%  "
+                  f"track #{event['track_id']}  {box}  {event['clip_link'] or ''}")
+        print(f"{len(events)} event(s)")
+
+
+if __name__ == '__main__':
+    main()
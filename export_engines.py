@@ -0,0 +1,124 @@
+import os
+import argparse
+import cv2 as cv
+from ultralytics import YOLO
+
+from dataset_utils import dataset_images
+from engines import ENGINE_WEIGHTS, letterbox
+
+
+def calibration_images(data_yaml_path, imgsz, num_images):
+    """Letterboxed NCHW blobs of the first `num_images` val images, used to calibrate the int8 models"""
+    images = dataset_images(data_yaml_path, split='val')
+    if not images:
+        raise FileNotFoundError(f"No val images found for {data_yaml_path}, int8 calibration needs them")
+
+    # Spread the picks over the whole split, the val images are sorted by class
+    step = max(1, len(images) // num_images)
+    for path in images[::step][:num_images]:
+        frame = cv.imread(path)
+        if frame is None:
+            continue
+        image, _, _ = letterbox(frame, imgsz)
+        yield cv.dnn.blobFromImage(image, scalefactor=1 / 255, swapRB=True)
+
+
+def export_onnx(weights, imgsz):
+    """best.pt -> best.onnx, with a dynamic batch axis so several cameras can share one call"""
+    print("📦 Exporting ONNX...")
+    return YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+
+
+def export_openvino(weights, imgsz):
+    """best.pt -> best_openvino_model/ (FP32 IR)"""
+    print("📦 Exporting OpenVINO...")
+    return YOLO(weights).export(format='openvino', imgsz=imgsz, half=False)
+
+
+def quantize_onnx_int8(onnx_path, data_yaml_path, imgsz, num_images, output_path):
+    """
+    Static int8 quantization of the ONNX model with ONNX Runtime, calibrated on val images.
+    The detection head (the last /model.N/ block: DFL decoding and box/class concat) stays in
+    float, quantizing it costs most of the accuracy for very little speed.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class ValImages(CalibrationDataReader):
+        def __init__(self):
+            self.blobs = iter(calibration_images(data_yaml_path, imgsz, num_images))
+
+        def get_next(self):
+            blob = next(self.blobs, None)
+            return None if blob is None else {'images': blob}
+
+    node_names = [node.name for node in onnx.load(onnx_path).graph.node]
+    blocks = [int(name.split('/')[1].split('.')[1]) for name in node_names if name.startswith('/model.')]
+    head_prefix = f"/model.{max(blocks)}/" if blocks else None
+    nodes_to_exclude = [name for name in node_names if head_prefix and name.startswith(head_prefix)]
+
+    print(f"⚙️  Quantizing {onnx_path} to int8 with {num_images} calibration images...")
+    quantize_static(
+        onnx_path,
+        output_path,
+        ValImages(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        nodes_to_exclude=nodes_to_exclude,
+    )
+    return output_path
+
+
+def quantize_openvino_int8(openvino_dir, data_yaml_path, imgsz, num_images, output_dir):
+    """Post-training int8 quantization of the OpenVINO IR with NNCF, calibrated on val images"""
+    import nncf
+    from openvino.runtime import Core, serialize
+
+    xml_path = next(os.path.join(openvino_dir, name) for name in os.listdir(openvino_dir) if name.endswith('.xml'))
+    model = Core().read_model(xml_path)
+    dataset = nncf.Dataset(list(calibration_images(data_yaml_path, imgsz, num_images)))
+
+    print(f"⚙️  Quantizing {openvino_dir} to int8 with {num_images} calibration images...")
+    # Like the head exclusion of the ONNX variant, keep the box decoding math of the head in float
+    quantized = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED,
+                              ignored_scope=nncf.IgnoredScope(types=['Multiply', 'Subtract', 'Sigmoid']))
+    os.makedirs(output_dir, exist_ok=True)
+    serialize(quantized, os.path.join(output_dir, os.path.basename(xml_path)))
+    return output_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export best.pt to the CPU inference engines used by main.py")
+    parser.add_argument('--weights', default='best.pt')
+    parser.add_argument('--data', default='animals.yaml', help="dataset yaml, its val split calibrates the int8 models")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--calibration-images', type=int, default=300)
+    parser.add_argument('--engines', nargs='+', default=['onnx', 'onnx-int8', 'openvino', 'openvino-int8'],
+                        choices=[name for name in ENGINE_WEIGHTS if name != 'torch'])
+    args = parser.parse_args()
+
+    exported = {}
+    if {'onnx', 'onnx-int8'} & set(args.engines):
+        exported['onnx'] = export_onnx(args.weights, args.imgsz)
+    if 'onnx-int8' in args.engines:
+        exported['onnx-int8'] = quantize_onnx_int8(exported['onnx'], args.data, args.imgsz,
+                                                   args.calibration_images, ENGINE_WEIGHTS['onnx-int8'])
+    if {'openvino', 'openvino-int8'} & set(args.engines):
+        exported['openvino'] = export_openvino(args.weights, args.imgsz)
+    if 'openvino-int8' in args.engines:
+        try:
+            exported['openvino-int8'] = quantize_openvino_int8(exported['openvino'], args.data, args.imgsz,
+                                                               args.calibration_images, ENGINE_WEIGHTS['openvino-int8'])
+        except ImportError:
+            print("⚠️  nncf is not installed (pip install nncf), skipping the OpenVINO int8 model")
+
+    print("\n✅ Exported engines:")
+    for name, path in exported.items():
+        print(f"   {name:<14} {path}")
+    print("\n📊 Compare them with: python benchmarks/engine_report.py")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import itertools
+import threading
+from collections import deque
+import cv2 as cv
+
+from clips import BufferedClip, SegmentClip
+from metrics import STAGE_SECONDS
+
+
+class FrameSnapshot:
+    """
+    Frozen view of a frame buffer, handed to the clip writer.
+    It only holds references to the stored frames, JPEG frames are decoded one at a time while iterating.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for frame in self.frames:
+            # JPEG data is a flat byte array, frames not encoded yet are still (h, w, 3) images
+            yield cv.imdecode(frame, cv.IMREAD_COLOR) if frame.ndim == 1 else frame
+
+
+class RawFrameBuffer:
+    """The last `max_frames` frames as plain BGR arrays (fast, but ~6 MB per 1080p frame)"""
+
+    def __init__(self, max_frames, max_bytes=None):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self._frames = deque()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.fps = 30
+        self.frame_size = None
+
+    def set_stream(self, fps, frame_size):
+        """Called by the grabber every time the stream is (re)opened"""
+        self.fps = fps
+        self.frame_size = frame_size
+
+    def append(self, frame, captured_at=None):
+        with self._lock:
+            self._push(frame)
+
+    def _push(self, stored):
+        # Caller holds self._lock
+        self._frames.append(stored)
+        self._nbytes += stored.nbytes
+        # Drop the oldest frames until both the length and the memory cap hold again
+        while len(self._frames) > self.max_frames or (self.max_bytes and self._nbytes > self.max_bytes and len(self._frames) > 1):
+            self._nbytes -= self._frames.popleft().nbytes
+
+    def snapshot(self):
+        """Frames currently in the buffer, oldest first. Copies references only, never pixels."""
+        with self._lock:
+            return FrameSnapshot(tuple(self._frames))
+
+    def clip(self, pre_roll, post_roll=0):
+        """
+        The last `pre_roll` seconds as a BufferedClip, None if the buffer is empty.
+        A memory buffer only holds the past, `post_roll` needs the SegmentRecorder.
+        """
+        frames = self.snapshot().frames[-max(1, int(pre_roll * self.fps)):]
+        if not frames:
+            return None
+        return BufferedClip(FrameSnapshot(frames), self.fps, self.frame_size)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class CompressedFrameBuffer(RawFrameBuffer):
+    """
+    Same ring buffer, but every frame is stored JPEG-compressed (~20-40x smaller than raw BGR).
+    With `max_bytes` set the buffer also never grows past that memory cap, it just holds fewer seconds.
+
+    Encoding happens on a background thread so the capture thread never waits for it. At most
+    `max_pending` raw frames wait to be encoded, if the encoder falls behind the oldest ones are skipped.
+    """
+
+    def __init__(self, max_frames, max_bytes=None, jpeg_quality=80, max_pending=4):
+        super().__init__(max_frames, max_bytes)
+        self.encode_params = [cv.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.encode_skipped = 0
+        self.encode_seconds = 0.0   # total time spent in imencode, for benchmarks
+        self.frames_encoded = 0
+
+        self._pending = deque(maxlen=max_pending)
+        self._closed = False
+        self._pending_ready = threading.Condition(self._lock)
+        self._encoder = threading.Thread(target=self._encode_loop, name="frame-buffer-encoder", daemon=True)
+        self._encoder.start()
+
+    def append(self, frame, captured_at=None):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.encode_skipped += 1
+            self._pending.append(frame)
+            self._pending_ready.notify()
+
+    def _encode_loop(self):
+        while True:
+            with self._lock:
+                self._pending_ready.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                frame = self._pending[0]
+
+            start = time.perf_counter()
+            ok, encoded = cv.imencode('.jpg', frame, self.encode_params)
+            elapsed = time.perf_counter() - start
+            self.encode_seconds += elapsed
+            self.frames_encoded += 1
+            STAGE_SECONDS.observe(elapsed, 'buffer_encode')
+
+            with self._lock:
+                # The frame may have been pushed out of the pending queue while we were encoding it
+                if self._pending and self._pending[0] is frame:
+                    self._pending.popleft()
+                    if ok:
+                        self._push(encoded)
+                self._pending_ready.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every pending frame has been encoded"""
+        with self._lock:
+            return self._pending_ready.wait_for(lambda: not self._pending, timeout)
+
+    def close(self, timeout=1.0):
+        """Encode what is still pending and stop the encoder thread"""
+        with self._lock:
+            self._closed = True
+            self._pending_ready.notify_all()
+        self._encoder.join(timeout)
+
+    def snapshot(self):
+        """Encoded frames plus the few raw frames still waiting for the encoder, oldest first"""
+        with self._lock:
+            return FrameSnapshot(tuple(self._frames) + tuple(self._pending))
+
+
+class SegmentRecorder:
+    """
+    Records the stream continuously into short mp4 segments on a background thread, so the video
+    encoding is spread evenly over time instead of landing all at once when an alert fires.
+
+    Finished segments cover at least the last `max_frames` frames (older ones are deleted unless a
+    pending clip still needs them). clip() returns a SegmentClip around the current moment, including
+    `post_roll` seconds that are still to be recorded. It is cut out of the segments with ffmpeg,
+    without re-encoding.
+    """
+
+    def __init__(self, max_frames, directory="./segments", segment_seconds=2.0, max_pending=8, fourcc='mp4v',
+                 pin_seconds=300.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix='camera-', dir=directory)
+        self.max_frames = max_frames
+        self.segment_seconds = segment_seconds
+        self.fourcc = fourcc
+        self.pin_seconds = pin_seconds      # a clip that was never exported stops holding segments after this
+        self.fps = 30
+        self.frame_size = None
+
+        self.segments = deque()     # finished segments: (path, start, end, frames)
+        self.encode_skipped = 0
+        self.encode_seconds = 0.0
+        self.frames_encoded = 0
+
+        self._pending = deque(maxlen=max_pending)
+        self._pins = {}             # pin id -> (start, end, expires), windows that pending clips still need
+        self._pin_ids = itertools.count()
+        self._writer = None
+        self._current = None        # [path, start, last frame time, frames, (width, height)]
+        self._segment_numbers = itertools.count(1)
+        self._closed = False
+        self._finished = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._encoder = threading.Thread(target=self._encode_loop, name="segment-recorder", daemon=True)
+        self._encoder.start()
+
+    def now(self):
+        return time.time()
+
+    def set_stream(self, fps, frame_size):
+        self.fps = fps
+        self.frame_size = frame_size
+
+    def append(self, frame, captured_at=None):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.encode_skipped += 1
+            self._pending.append((frame, captured_at or time.time()))
+            self._changed.notify_all()
+
+    def _encode_loop(self):
+        while True:
+            with self._lock:
+                self._changed.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    break
+                frame, captured_at = self._pending.popleft()
+
+            start = time.perf_counter()
+            self._write(frame, captured_at)
+            elapsed = time.perf_counter() - start
+            self.encode_seconds += elapsed
+            self.frames_encoded += 1
+            STAGE_SECONDS.observe(elapsed, 'segment_encode')
+
+        self._finish_segment()
+        with self._lock:
+            self._finished = True
+            self._changed.notify_all()
+
+    def _write(self, frame, captured_at):
+        size = (frame.shape[1], frame.shape[0])
+        if self._current is not None and (self._current[3] >= round(self.segment_seconds * self.fps) or self._current[4] != size):
+            self._finish_segment()
+        if self._writer is None:
+            path = os.path.join(self.directory, f"segment_{next(self._segment_numbers):06d}.mp4")
+            self._writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*self.fourcc), self.fps, size)
+            self._current = [path, captured_at, captured_at, 0, size]
+        self._writer.write(frame)
+        self._current[2] = captured_at
+        self._current[3] += 1
+
+    def _finish_segment(self):
+        if self._writer is None:
+            return
+        self._writer.release()
+        path, start, last, frames, _ = self._current
+        self._writer = None
+        self._current = None
+        with self._lock:
+            self.segments.append((path, start, last + 1 / self.fps, frames))
+            self._prune()
+            self._changed.notify_all()
+
+    def _prune(self):
+        # Caller holds self._lock
+        now = time.time()
+        self._pins = {pin: window for pin, window in self._pins.items() if window[2] > now}
+        kept_frames = sum(segment[3] for segment in self.segments)
+        while self.segments and kept_frames - self.segments[0][3] >= self.max_frames:
+            path, start, end, frames = self.segments[0]
+            if any(pin_start < end and start < pin_end for pin_start, pin_end, _ in self._pins.values()):
+                break   # a clip waiting for delivery still needs it
+            self.segments.popleft()
+            kept_frames -= frames
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Could not remove segment {path}: {e}")
+
+    def clip(self, pre_roll, post_roll=0):
+        """SegmentClip from `pre_roll` seconds ago to `post_roll` seconds from now"""
+        now = time.time()
+        with self._lock:
+            pin_id = next(self._pin_ids)
+            self._pins[pin_id] = (now - pre_roll, now + post_roll, now + post_roll + self.pin_seconds)
+        return SegmentClip(self, pin_id, now - pre_roll, now + post_roll)
+
+    def wait_until(self, moment, timeout=None):
+        """Block until the finished segments reach `moment` (or the recorder has stopped)"""
+        with self._lock:
+            return self._changed.wait_for(
+                lambda: self._finished or (self.segments and self.segments[-1][2] >= moment), timeout)
+
+    def segments_between(self, start, end):
+        with self._lock:
+            return [(path, segment_start, segment_end) for path, segment_start, segment_end, _ in self.segments
+                    if segment_start < end and start < segment_end]
+
+    def unpin(self, pin_id):
+        with self._lock:
+            self._pins.pop(pin_id, None)
+            remove = self._finished and not self._pins
+        if remove:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return FrameSnapshot(())    # frames only exist on disk, as segments
+
+    @property
+    def nbytes(self):
+        return sum(frame.nbytes for frame, _ in tuple(self._pending))
+
+    def close(self, timeout=5.0):
+        """Finish the current segment and stop. The folder is removed once no clip needs it anymore."""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        self._encoder.join(timeout)
+        with self._lock:
+            remove = self._finished and not self._pins
+        if remove:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __len__(self):
+        return sum(segment[3] for segment in tuple(self.segments))
+
+
+def make_frame_buffer(mode, max_frames, max_bytes=None, jpeg_quality=80, segment_dir="./segments", segment_seconds=2.0):
+    """Build the pre-event buffer for one camera, mode is 'segments', 'jpeg' or 'raw'"""
+    if mode == 'segments':
+        return SegmentRecorder(max_frames, segment_dir, segment_seconds)
+    if mode == 'jpeg':
+        return CompressedFrameBuffer(max_frames, max_bytes, jpeg_quality)
+    if mode == 'raw':
+        return RawFrameBuffer(max_frames, max_bytes)
+    raise ValueError(f"Unknown frame buffer mode: {mode}")
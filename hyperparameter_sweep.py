@@ -0,0 +1,351 @@
+"""
+Hyperparameter sweep of train_yolo_model(): trials with sampled training arguments run concurrently
+(one process per trial, spread over --devices), each on a --fraction of the training images, and
+trials that fall behind are stopped early.
+
+  search space:  SEARCH_SPACE below (or --space space.json), over the hand-tuned DEFAULT_TRAINING_ARGS
+                 of model_training.py, or with --base fine-tuning over FINE_TUNING_ARGS from best.pt.
+                 Trial 0 is the hand-tuned settings themselves, the baseline to beat
+  sampling:      random, seeded per trial number, so a resumed or extended sweep samples the same trials
+  pruning:       after --warmup-epochs, a trial whose best fitness (0.1 mAP50 + 0.9 mAP50-95) so far is
+                 below the median of the other trials at the same epoch is stopped (median rule,
+                 once --min-trials others got that far)
+  results:       SQLite (--db): the settings, every trial's arguments, status, metrics and per-epoch
+                 fitness. Rerunning the same command resumes: finished trials are kept, interrupted
+                 ones start over, --trials can be raised to extend the sweep
+
+    python hyperparameter_sweep.py --trials 24 --parallel 2 --devices 0 1 --fraction 0.25 --epochs 30
+    python hyperparameter_sweep.py --trials 12 --parallel 4 --devices cpu --fraction 0.1 --epochs 10 --imgsz 416
+    python hyperparameter_sweep.py --base fine-tuning --trials 16 --epochs 15 --db finetune_sweep.db
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import subprocess
+
+SEARCH_SPACE = {
+    # name: ('log' | 'uniform', low, high), ('int', low, high) or ('choice', [values])
+    'lr0': ('log', 1e-4, 2e-2),
+    'lrf': ('log', 1e-3, 0.2),
+    'weight_decay': ('log', 1e-5, 1e-3),
+    'optimizer': ('choice', ['SGD', 'AdamW']),
+    'box': ('uniform', 3.0, 9.0),
+    'cls': ('uniform', 0.3, 1.5),
+    'label_smoothing': ('uniform', 0.0, 0.15),
+    'hsv_s': ('uniform', 0.3, 0.8),
+    'hsv_v': ('uniform', 0.2, 0.5),
+    'degrees': ('uniform', 0.0, 10.0),
+    'translate': ('uniform', 0.05, 0.2),
+    'scale': ('uniform', 0.3, 0.7),
+    'shear': ('uniform', 0.0, 2.0),
+    'fliplr': ('uniform', 0.3, 0.6),
+    'mosaic': ('uniform', 0.5, 1.0),
+    'mixup': ('uniform', 0.0, 0.2),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY, config TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', device TEXT,
+    fitness REAL, best_epoch INTEGER, epochs_run INTEGER, metrics TEXT, started REAL, finished REAL, error TEXT);
+CREATE TABLE IF NOT EXISTS epochs (
+    trial INTEGER NOT NULL, epoch INTEGER NOT NULL, fitness REAL NOT NULL, metrics TEXT,
+    PRIMARY KEY (trial, epoch));
+"""
+STATUS_ICONS = {'complete': '✅', 'pruned': '✂️ ', 'failed': '❌'}
+
+
+def sample_config(space, seed, trial):
+    """Training arguments of one trial, the same for the same (seed, trial) every time"""
+    rng = random.Random(f"{seed}:{trial}")
+    config = {}
+    for name, (kind, *spec) in space.items():
+        if kind == 'choice':
+            value = rng.choice(spec[0])
+        elif kind == 'log':
+            value = math.exp(rng.uniform(math.log(spec[0]), math.log(spec[1])))
+        elif kind == 'int':
+            value = rng.randint(spec[0], spec[1])
+        else:
+            value = rng.uniform(spec[0], spec[1])
+        config[name] = float(f"{value:.4g}") if isinstance(value, float) else value
+    return config
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+class SweepStore:
+    """The SQLite results file of a sweep, shared by the runner and its trial processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")      # trial processes write while others read
+        self.db.executescript(SCHEMA)
+
+    def settings(self):
+        row = self.db.execute("SELECT value FROM settings WHERE key = 'sweep'").fetchone()
+        return json.loads(row['value']) if row else None
+
+    def init_settings(self, settings):
+        """Store the settings of a new sweep, or check that a resumed one was made with the same"""
+        settings = json.loads(json.dumps(settings))     # tuples -> lists, as they come back
+        stored = self.settings()
+        if stored is None:
+            self.db.execute("INSERT INTO settings VALUES ('sweep', ?)", (json.dumps(settings),))
+        elif stored != settings:
+            changed = sorted(key for key in set(stored) | set(settings) if stored.get(key) != settings.get(key))
+            raise SystemExit(f"❌ {self.path} holds a sweep with other settings ({', '.join(changed)}), "
+                             f"use another --db for a new sweep")
+
+    def add_trials(self, count, space, seed):
+        """Trials up to `count`, trial 0 being the base arguments unchanged"""
+        existing = self.db.execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+        for trial in range(existing, count):
+            config = {} if trial == 0 else sample_config(space, seed, trial)
+            self.db.execute("INSERT INTO trials (id, config) VALUES (?, ?)", (trial, json.dumps(config)))
+
+    def reset_interrupted(self):
+        """Trials left 'running' by a killed sweep start over, returns how many"""
+        trials = [row['id'] for row in self.db.execute("SELECT id FROM trials WHERE status = 'running'")]
+        for trial in trials:
+            self.db.execute("DELETE FROM epochs WHERE trial = ?", (trial,))
+            self.db.execute("UPDATE trials SET status = 'pending', device = NULL, started = NULL WHERE id = ?", (trial,))
+        return len(trials)
+
+    def claim(self, device):
+        """Mark the next pending trial running on `device` and return its id, None when there is none"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("SELECT id FROM trials WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row:
+                self.db.execute("UPDATE trials SET status = 'running', device = ?, started = ? WHERE id = ?",
+                                (device, time.time(), row['id']))
+        finally:
+            self.db.execute("COMMIT")
+        return row['id'] if row else None
+
+    def trial(self, trial):
+        row = self.db.execute("SELECT * FROM trials WHERE id = ?", (trial,)).fetchone()
+        return dict(row, config=json.loads(row['config']), metrics=json.loads(row['metrics'] or '{}'))
+
+    def trials(self):
+        return [self.trial(row['id']) for row in self.db.execute("SELECT id FROM trials ORDER BY id")]
+
+    def report(self, trial, epoch, fitness, metrics=None):
+        self.db.execute("INSERT OR REPLACE INTO epochs VALUES (?, ?, ?, ?)", (trial, epoch, fitness, json.dumps(metrics or {})))
+
+    def should_prune(self, trial, epoch, warmup_epochs, min_trials):
+        """Median rule: best fitness up to `epoch` below the median of the other trials that got that far"""
+        if epoch < warmup_epochs:
+            return False
+        others = [row[0] for row in self.db.execute(
+            "SELECT MAX(fitness) FROM epochs WHERE trial != ? AND epoch <= ? GROUP BY trial HAVING MAX(epoch) >= ?",
+            (trial, epoch, epoch))]
+        if len(others) < min_trials:
+            return False
+        best = self.db.execute("SELECT MAX(fitness) FROM epochs WHERE trial = ? AND epoch <= ?", (trial, epoch)).fetchone()[0]
+        return best is not None and best < median(others)
+
+    def finish(self, trial, status, error=None):
+        """Close a trial with the metrics of its best epoch"""
+        best = self.db.execute("SELECT epoch, fitness, metrics FROM epochs WHERE trial = ? ORDER BY fitness DESC, epoch "
+                               "LIMIT 1", (trial,)).fetchone()
+        epochs_run = self.db.execute("SELECT MAX(epoch) FROM epochs WHERE trial = ?", (trial,)).fetchone()[0]
+        self.db.execute("UPDATE trials SET status = ?, fitness = ?, best_epoch = ?, epochs_run = ?, metrics = ?, "
+                        "finished = ?, error = ? WHERE id = ?",
+                        (status, best['fitness'] if best else None, best['epoch'] if best else None, epochs_run or 0,
+                         best['metrics'] if best else None, time.time(), error, trial))
+
+
+def run_trial(db_path, trial, device, threads):
+    """One trial, in its own process: train_yolo_model() with the trial's arguments, reporting every epoch"""
+    import torch
+    from model_training import train_yolo_model
+
+    torch.set_num_threads(threads)
+    store = SweepStore(db_path)
+    settings = store.settings()
+    base_args = None
+    if settings['base'] == 'fine-tuning':
+        # Only the fine-tuning arguments, not DEFAULT_TRAINING_ARGS (AdamW, cos_lr, dropout...) under them
+        from fine_tuning_model import FINE_TUNING_ARGS
+        base_args = FINE_TUNING_ARGS
+    overrides = dict(store.trial(trial)['config'])
+    overrides.update({'fraction': settings['fraction'], 'resume': False, 'exist_ok': True, 'plots': False,
+                      'save_period': -1, 'verbose': False})
+    print(f"🧪 Trial {trial} on {device}: {json.dumps(store.trial(trial)['config'])}")
+
+    pruned = []
+
+    def on_fit_epoch_end(trainer):
+        epoch = trainer.epoch + 1
+        metrics = {key: round(float(value), 5) for key, value in trainer.metrics.items()}
+        store.report(trial, epoch, float(trainer.fitness or 0), metrics)
+        if settings['prune'] and store.should_prune(trial, epoch, settings['warmup_epochs'], settings['min_trials']):
+            print(f"✂️  Trial {trial} pruned after epoch {epoch}, below the median of the other trials")
+            pruned.append(epoch)
+            trainer.stop = True
+
+    results = train_yolo_model(settings['data'], settings['epochs'], settings['batch'], settings['imgsz'],
+                               patience=settings['epochs'], project_name=settings['project'],
+                               experiment_name=f"trial_{trial:03d}", device=device, use_shards=settings['use_shards'],
+                               model_path=settings['model'], overrides=overrides, base_args=base_args,
+                               callbacks={'on_fit_epoch_end': on_fit_epoch_end})
+    if results is None:
+        store.finish(trial, 'failed', error="training failed, see the trial log")
+        return 1
+    store.finish(trial, 'pruned' if pruned else 'complete')
+    return 0
+
+
+def run_sweep(store, db_path, parallel, devices, threads, log_dir, trial_cmd=None, poll_interval=1.0):
+    """Run the pending trials, `parallel` at a time, slot i on devices[i % len(devices)]"""
+    trial_cmd = trial_cmd or [sys.executable, os.path.abspath(__file__), '--run-trial']
+    env = {**os.environ, 'OMP_NUM_THREADS': str(threads), 'MKL_NUM_THREADS': str(threads)}
+    os.makedirs(log_dir, exist_ok=True)
+    running = {}        # slot -> (process, trial, log file)
+    try:
+        while True:
+            for slot in range(parallel):
+                if slot in running:
+                    continue
+                device = devices[slot % len(devices)]
+                trial = store.claim(device)
+                if trial is None:
+                    break
+                log = open(os.path.join(log_dir, f"trial_{trial:03d}.log"), 'w')
+                process = subprocess.Popen(trial_cmd + [str(trial), '--db', db_path, '--device', device,
+                                                        '--threads', str(threads)],
+                                           stdout=log, stderr=subprocess.STDOUT, env=env)
+                running[slot] = (process, trial, log)
+                print(f"▶️  Trial {trial} started on {device}")
+            if not running:
+                break
+
+            time.sleep(poll_interval)
+            for slot, (process, trial, log) in list(running.items()):
+                if process.poll() is None:
+                    continue
+                log.close()
+                del running[slot]
+                if store.trial(trial)['status'] == 'running':
+                    store.finish(trial, 'failed', error=f"exit code {process.returncode}, see {log.name}")
+                row = store.trial(trial)
+                fitness = '-' if row['fitness'] is None else f"{row['fitness']:.4f}"
+                print(f"{STATUS_ICONS.get(row['status'], '')} Trial {trial} {row['status']} after {row['epochs_run']} "
+                      f"epochs, fitness {fitness}")
+    except KeyboardInterrupt:
+        for process, trial, log in running.values():
+            process.terminate()
+        for process, trial, log in running.values():
+            process.wait()
+            log.close()
+        raise SystemExit("\n⏹️  Sweep interrupted, run the same command again to resume it")
+
+
+def leaderboard(trials, top=10):
+    """Completed trials by fitness, then the pruned ones (their fitness is from fewer epochs)"""
+    ranked = sorted((trial for trial in trials if trial['fitness'] is not None),
+                    key=lambda trial: (trial['status'] != 'complete', -trial['fitness']))
+    return ranked[:top]
+
+
+def main():
+    if sys.argv[1:2] == ['--run-trial']:
+        parser = argparse.ArgumentParser()
+        parser.add_argument('trial', type=int)
+        parser.add_argument('--db', required=True)
+        parser.add_argument('--device', default='cpu')
+        parser.add_argument('--threads', type=int, default=1)
+        args = parser.parse_args(sys.argv[2:])
+        sys.exit(run_trial(args.db, args.trial, args.device, args.threads))
+
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep of train_yolo_model with early pruning")
+    parser.add_argument('--data', default='animals.yaml')
+    parser.add_argument('--base', default='training', choices=('training', 'fine-tuning'),
+                        help="arguments the trials start from: DEFAULT_TRAINING_ARGS or FINE_TUNING_ARGS")
+    parser.add_argument('--model', default=None, help="starting weights (default: yolov8n.pt, best.pt for fine-tuning)")
+    parser.add_argument('--space', default=None, help="JSON file with a search space like SEARCH_SPACE")
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--epochs', type=int, default=30, help="epochs per trial")
+    parser.add_argument('--fraction', type=float, default=0.25, help="share of the training images each trial uses")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--devices', nargs='+', default=['cpu'], help="'cpu' or GPU ids, trials are spread over them")
+    parser.add_argument('--parallel', type=int, default=None, help="trials at a time (default: one per device, "
+                                                                   "or cores / 4 on CPU)")
+    parser.add_argument('--threads', type=int, default=None, help="torch threads per trial (default: cores / parallel)")
+    parser.add_argument('--no-prune', dest='prune', action='store_false', help="run every trial to the end")
+    parser.add_argument('--warmup-epochs', type=int, default=3, help="epochs before a trial can be pruned")
+    parser.add_argument('--min-trials', type=int, default=3, help="other trials needed at an epoch to prune there")
+    parser.add_argument('--no-shards', dest='use_shards', action='store_false', help="read JPEGs, not the shard cache")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--project', default='sweeps')
+    parser.add_argument('--db', default='sweep.db')
+    parser.add_argument('--output', default='sweep_best.json', help="arguments and metrics of the best trial")
+    args = parser.parse_args()
+
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    cpus = os.cpu_count() or 1
+    parallel = args.parallel or (max(1, cpus // 4) if args.devices == ['cpu'] else len(args.devices))
+    threads = args.threads or max(1, cpus // parallel)
+
+    store = SweepStore(args.db)
+    store.init_settings({
+        'data': args.data, 'base': args.base, 'model': args.model or ('best.pt' if args.base == 'fine-tuning' else 'yolov8n.pt'),
+        'space': space, 'seed': args.seed, 'epochs': args.epochs, 'fraction': args.fraction, 'imgsz': args.imgsz,
+        'batch': args.batch, 'prune': args.prune, 'warmup_epochs': args.warmup_epochs, 'min_trials': args.min_trials,
+        'use_shards': args.use_shards, 'project': os.path.abspath(args.project),
+    })
+    store.add_trials(args.trials, space, args.seed)
+    interrupted = store.reset_interrupted()
+    done = sum(trial['status'] != 'pending' for trial in store.trials())
+    print(f"🔎 Sweep {args.db}: {args.trials} trials, {done} done{f', {interrupted} interrupted ones restart' if interrupted else ''}"
+          f" - {parallel} at a time on {', '.join(args.devices)}, {threads} threads each")
+
+    if args.use_shards and done < args.trials:
+        # Packed once here, the trials then find the cache up to date instead of packing it concurrently
+        from dataset_cache import pack_dataset
+        pack_dataset(args.data, args.imgsz)
+
+    started = time.time()
+    run_sweep(store, args.db, parallel, args.devices, threads, os.path.join(args.project, 'logs'))
+    trials = store.trials()
+    best = leaderboard(trials, top=1)
+
+    counts = {}
+    for trial in trials:
+        counts[trial['status']] = counts.get(trial['status'], 0) + 1
+    print(f"\n🏁 {', '.join(f'{count} {status}' for status, count in sorted(counts.items()))} "
+          f"in {(time.time() - started) / 60:.1f} min")
+    print(f"{'trial':>5}  {'status':<9}{'epochs':>7}{'fitness':>9}{'mAP50':>8}{'mAP50-95':>9}   arguments")
+    for trial in leaderboard(trials):
+        metrics = trial['metrics']
+        print(f"{trial['id']:>5}  {trial['status']:<9}{trial['epochs_run']:>7}{trial['fitness']:>9.4f}"
+              f"{metrics.get('metrics/mAP50(B)', 0):>8.4f}{metrics.get('metrics/mAP50-95(B)', 0):>9.4f}   "
+              f"{json.dumps(trial['config']) if trial['config'] else '(base arguments)'}")
+
+    if best and best[0]['status'] == 'complete':
+        with open(args.output, 'w') as f:
+            json.dump({'trial': best[0]['id'], 'fitness': best[0]['fitness'], 'base': args.base,
+                       'overrides': best[0]['config'], 'metrics': best[0]['metrics']}, f, indent=2)
+        print(f"\n✅ Best: trial {best[0]['id']}, put its arguments into "
+              f"{'FINE_TUNING_ARGS' if args.base == 'fine-tuning' else 'DEFAULT_TRAINING_ARGS'}. Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,26 @@
+from startup import StartupTimer, BackgroundTask     # first, so the startup breakdown includes the imports below
 import os
-import time
 import logging
 import cv2 as cv
-from collections import deque
-from PIL import Image
-from twilio.rest import Client  # Twilio API
-from ultralytics import YOLO
-import math
-import cloudinary
-import cloudinary.uploader
-
-cloudinary.config(
-    cloud_name="get from cloudinary dashboard",
-    api_key="get from cloudinary dashboard",
-    api_secret="get from cloudinary dashboard"
-)
+from functools import partial
+from cameras import load_cameras
+from frame_buffer import make_frame_buffer
+from detections import class_categories, CATEGORY_HUMANS, CATEGORY_FARMS
+from engines import load_engine, warm_up
+from cascade import Cascade
+from pipeline import DetectionPipeline
+from notifier import Notifier
+import metrics
+from alerts import AlertDispatcher, TwilioSms, HttpSms, ConsoleSms, CloudinaryStorage, LocalStorage, HttpStorage
+from spool import UploadSpool
+from event_store import EventStore
+
+# Applied when the first clip is uploaded (see alerts.CloudinaryStorage), not at import
+CLOUDINARY_CONFIG = {
+    'cloud_name': "get from cloudinary dashboard",
+    'api_key': "get from cloudinary dashboard",
+    'api_secret': "get from cloudinary dashboard",
+}
 
 MODEL_DIR = 'best.pt'
 
@@ -34,13 +40,112 @@ TWILIO_AUTH_TOKEN = 'get from twilio dashboard'
 TWILIO_PHONE_NUMBER = 'twilio number'    # Twilio account trail phone number
 RECIPIENT_PHONE_NUMBER = 'receipent number'  # Phone number in which the alert should be sent
 
+# Local metrics endpoint (Prometheus text format): stage timings, queue depth, buffer memory, model fps
+METRICS_PORT = 9100             # http://127.0.0.1:9100/metrics, None to turn it off
+METRICS_HOST = '127.0.0.1'      # only reachable from the box itself
+
+# Alert delivery (runs on background workers so detection never waits for it)
+ALERT_BACKEND = 'twilio'        # 'twilio' (Twilio + Cloudinary), 'http' (SMS_GATEWAY_URL + UPLOAD_URL or Cloudinary) or 'local' (console SMS + ./clips folder, no network)
+ALERT_WORKERS = 2               # Number of delivery workers
+ALERT_QUEUE_SIZE = 8            # Alerts waiting for delivery before the overflow policy kicks in
+ALERT_OVERFLOW = 'drop_oldest'  # 'drop_oldest', 'drop_newest' or 'block'
+SMS_GATEWAY_URL = 'http://127.0.0.1:8080/messages'   # for ALERT_BACKEND = 'http', see alerts.HttpSms
+UPLOAD_URL = None               # for ALERT_BACKEND = 'http': own upload server (see alerts.HttpStorage), None for Cloudinary
+
+# Clips wait in an on-disk spool until they are uploaded, so a dropped link or a power cut does not lose them
+SPOOL_DIR = './spool'           # None to upload straight from the delivery workers
+SPOOL_MAX_MB = 2048             # the lowest-priority, oldest clips are given up past this
+UPLOAD_BANDWIDTH_KBPS = None    # cap on the upload rate (kbit/s), leaves room for the SMS on a shared link
+DOWNSCALE_BELOW_KBPS = 1000     # re-encode clips to 360p when the measured upload speed is below this, None to never
+LINK_WAIT_SECONDS = 20          # the alert SMS waits this long for the clip link, after that the link follows in a second SMS
+
+# Every detection (camera, time, class, confidence, box, track, clip link) goes to an SQLite event store,
+# query it with: python event_store.py --class Bear --camera "Camera 3" --since 7d
+EVENT_DB = './events/events.db'     # None to turn it off
+
+# Fewer, better SMS: the same class only alerts again after its cooldown, and sightings close together go out as one
+ALERT_COOLDOWN_KEY = 'class'    # 'class' (a deer does not silence a tiger) or 'category'
+ALERT_COOLDOWNS = {CATEGORY_HUMANS: 60, CATEGORY_FARMS: 300}    # seconds, per category of animal
+ALERT_COALESCE_SECONDS = 2      # sightings within this window share one SMS (and one clip link)
+ALERT_DIGEST_MINUTES = 30       # summary of the sightings held back by a cooldown, None to turn it off
+
+# Multi-process mode for multi-camera servers (see multiproc.py): every camera is decoded in its own process,
+# detection and clip encoding run on worker processes, frames go through shared memory. No display window.
+USE_MULTIPROC = False
+MULTIPROC = {
+    'inference_workers': None,          # None: half the cores, every worker loads its own copy of the model
+    'encoding_workers': None,           # None: a quarter of the cores
+    'ring_slots': 4,                    # frames per camera in shared memory
+    'max_frame_size': (1920, 1080),     # larger frames are scaled down to fit
+}
+
 # GPS coordinates for the camera location 
 LATITUDE = '30.392160'
 LONGITUDE = ' 79.318633'
-location_on_map = f"https://www.google.com/maps?q={LATITUDE.strip()},{LONGITUDE.strip()}"
 
-# Load the YOLO model
-model = YOLO('best.pt')
+# Cameras watched by this process. Add one entry per camera, each one keeps its own clip buffer,
+# alert cooldown and GPS location. All of them share the single loaded model below.
+CAMERAS = [
+    {
+        'name': 'mobile',
+        'source': "http://192.168.31.142:8080/video",    # Mobile camera URL, replace with your camera stream URL
+        'latitude': LATITUDE,
+        'longitude': LONGITUDE,
+        # Optional: only watch these polygons, in pixels or as fractions of the frame (sky, road and buildings are ignored)
+        # 'roi': [[(0.0, 0.45), (1.0, 0.45), (1.0, 1.0), (0.0, 1.0)]],
+        # 'roi_imgsz': 416,
+    },
+]
+
+MAX_BATCH_SIZE = 16     # Most frames sent through the model in one call (one frame per camera)
+
+# Alert clips. 'segments' records every camera continuously into short mp4 files and joins them with
+# ffmpeg when an alert fires (no re-encode, and the clip shows what happened after the detection).
+# 'jpeg' / 'raw' keep the last seconds in memory and encode the clip at alert time, without post-roll.
+CLIP_BUFFER_MODE = 'segments'   # 'segments', 'jpeg' or 'raw'
+CLIP_PRE_ROLL = 5               # seconds before the detection
+CLIP_POST_ROLL = 5              # seconds after it, 'segments' only
+SEGMENT_SECONDS = 2             # length of the recorded segments, also the precision of the clip start/end
+SEGMENT_DIR = './segments'
+CLIP_BUFFER_MAX_MB = 64         # Memory cap per camera of the 'jpeg' / 'raw' buffers, older frames are dropped first
+CLIP_JPEG_QUALITY = 80
+
+# Motion gate: YOLO only runs on frames where enough of the picture changed (set to None to run it on every frame).
+# A camera entry can override any of these with its own 'motion' dict.
+MOTION_GATE = {
+    'width': 160,               # frames are compared at this width
+    'pixel_threshold': 25,      # grey-level change that counts a pixel as changed
+    'min_changed_area': 0.005,  # fraction of changed pixels that wakes the detector
+    'force_every': 5.0,         # seconds, run the detector anyway so slow animals are not missed
+    'hold_seconds': 3.0,        # keep the detector running this long after a detection
+}
+
+# Tracking: every animal gets a track ID and alerts fire once per new track instead of once per 30 s window.
+# While animals are being tracked YOLO only runs every DETECT_EVERY_N frames, the tracker moves the boxes in between.
+DETECT_EVERY_N = 3
+TRACKER = {
+    'iou_threshold': 0.3,       # overlap needed to match a detection to a track
+    'max_misses': 5,            # detector runs without a match before a track is dropped
+    'min_hits': 2,              # detections needed before a track raises an alert
+}
+
+# Inference engine: 'torch' (best.pt through ultralytics), 'onnx', 'onnx-int8', 'openvino' or 'openvino-int8'.
+# Export the non-torch ones with export_engines.py, compare them with benchmarks/engine_report.py.
+ENGINE = 'torch'
+IMGSZ = 640
+ROI_IMGSZ = 416         # Model input size for the crops of cameras with a 'roi'
+
+# Cascade mode: a fast low-resolution pass over the whole frame finds candidates, only those regions are
+# confirmed at full resolution before the confidence check and alerts. Off means a single pass at IMGSZ.
+# Compare both on the val split with benchmarks/cascade_eval.py before switching it on.
+USE_CASCADE = False
+CASCADE = {
+    'screen_imgsz': 320,        # input size of the screening pass
+    'screen_conf': 0.25,        # screening confidence, low so small/distant animals become candidates
+    'confirm_imgsz': 640,       # input size of the confirmation pass on the candidate crops
+    'margin': 0.5,              # context added around a candidate, as a fraction of its box
+    'max_candidates': 8,        # per frame
+}
 
 animals_map = {
     'Tiger' : 0,
@@ -60,122 +165,271 @@ class_names = ['Tiger','Leopard','Cheetah','Elephant','Monkey','Deer','Lion','Be
 harmful_to_farms = ['Monkey','Deer','Pig','Bull']
 harmful_to_humans = ['Tiger','Leopard','Cheetah','Elephant','Lion','Bear']
 
-# Function to send SMS using Twilio
-def send_sms(message):
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    message = client.messages.create(
-        body=message,
-        from_=TWILIO_PHONE_NUMBER,
-        to=RECIPIENT_PHONE_NUMBER
+class_categories_table = class_categories(class_names, harmful_to_humans, harmful_to_farms)   # class index -> alert category
+
+MIN_CONFIDENCE = 85  # Adjust this accordingly. ( Here I want to be it atleast 85% sure so I do it 85. )
+
+def build_event_store(path=None):
+    path = path or EVENT_DB
+    return EventStore(path) if path else None
+
+
+def build_alert_dispatcher(backend=None, event_store=None):
+    """Alert delivery runs on background workers, 'local' swaps Twilio/Cloudinary for offline stand-ins"""
+    backend = backend or ALERT_BACKEND
+    if backend == 'twilio':
+        sms_backend = TwilioSms(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, RECIPIENT_PHONE_NUMBER)
+        storage_backend = CloudinaryStorage(CLOUDINARY_CONFIG)
+    elif backend == 'http':
+        sms_backend = HttpSms(SMS_GATEWAY_URL, RECIPIENT_PHONE_NUMBER, TWILIO_PHONE_NUMBER)
+        storage_backend = HttpStorage(UPLOAD_URL) if UPLOAD_URL else CloudinaryStorage(CLOUDINARY_CONFIG)
+    elif backend == 'local':
+        sms_backend = ConsoleSms()
+        storage_backend = LocalStorage("./clips")
+    else:
+        raise ValueError(f"Unknown alert backend: {backend}")
+
+    spool = None
+    if SPOOL_DIR:
+        spool = UploadSpool(
+            SPOOL_DIR,
+            storage_backend,
+            bandwidth_kbps=UPLOAD_BANDWIDTH_KBPS,
+            max_mb=SPOOL_MAX_MB,
+            downscale_below_kbps=DOWNSCALE_BELOW_KBPS,
+        )
+
+    return AlertDispatcher(
+        sms_backend,
+        storage_backend,
+        workers=ALERT_WORKERS,
+        max_queue=ALERT_QUEUE_SIZE,
+        overflow=ALERT_OVERFLOW,
+        spool=spool,
+        link_wait=LINK_WAIT_SECONDS,
+        event_store=event_store,
     )
-    print(f"SMS Sent: {message.sid}")
 
-# Function to save clip on cloud storage
-def upload_clip_and_get_link(buffer, fps, frame_size, timestamp):
-    filename = f"detection_{timestamp}.mp4"
-    out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
-    for frame in buffer:
-        out.write(frame)
-    out.release()
 
+def build_notifier(dispatcher):
+    """Per-class cooldowns, coalescing and digests in front of the alert dispatcher"""
+    return Notifier(
+        dispatcher,
+        cooldowns=ALERT_COOLDOWNS,
+        cooldown_key=ALERT_COOLDOWN_KEY,
+        coalesce_seconds=ALERT_COALESCE_SECONDS,
+        digest_seconds=ALERT_DIGEST_MINUTES * 60 if ALERT_DIGEST_MINUTES else None,
+    )
+
+
+def load_model(engine=None, weights=None, camera_configs=None, startup=None):
+    """Load the engine and run it once at every input size it will see, so the first real frame is not slowed down"""
+    # The engine already drops boxes that can never reach MIN_CONFIDENCE
+    engine = engine or ENGINE
+    weights = weights or (MODEL_DIR if engine == 'torch' else None)
+    startup = startup or StartupTimer()
+    with startup.stage('model_load'):
+        model = load_engine(engine, weights, imgsz=IMGSZ, conf=(MIN_CONFIDENCE - 1) / 100)
+
+    camera_configs = camera_configs or CAMERAS
+    with startup.stage('warm_up'):
+        warm_up(model, warm_up_sizes(camera_configs), batch=min(len(camera_configs), MAX_BATCH_SIZE))
+    return model
+
+
+def warm_up_sizes(camera_configs):
+    """Every model input size the detection loop will use with these cameras"""
+    sizes = [IMGSZ]
+    if USE_CASCADE:
+        sizes += [CASCADE['screen_imgsz'], CASCADE['confirm_imgsz']]
+    return sizes + [config.get('roi_imgsz', ROI_IMGSZ) for config in camera_configs if config.get('roi')]
+
+
+def build_pipeline(cameras, frame_event, notifier, engine=None, weights=None, display=True, event_store=None,
+                   model=None, startup=None):
+    """Wire up the detection loop with the settings above, loading the model unless it is given"""
+    if model is None:
+        configs = [{'roi': True, 'roi_imgsz': camera.roi.imgsz} if camera.roi else {} for camera in cameras]
+        model = load_model(engine, weights, configs, startup)
+    return DetectionPipeline(
+        cameras, frame_event, model, notifier,
+        class_names=class_names,
+        categories=class_categories_table,
+        min_confidence=MIN_CONFIDENCE,
+        imgsz=IMGSZ,
+        max_batch=MAX_BATCH_SIZE,
+        cascade=Cascade(**CASCADE) if USE_CASCADE else None,
+        display=display,
+        pre_roll=CLIP_PRE_ROLL,
+        post_roll=CLIP_POST_ROLL if CLIP_BUFFER_MODE == 'segments' else 0,
+        event_store=event_store,
+        startup=startup,
+    )
+
+
+def register_metrics(cameras, dispatcher):
+    """Gauges and counters read from the cameras and the dispatcher whenever /metrics is scraped"""
+    for camera in cameras:
+        grabber = camera.grabber
+        metrics.FRAMES_READ.set_function(lambda grabber=grabber: grabber.frames_read, camera.name)
+        metrics.FRAMES_DROPPED.set_function(lambda grabber=grabber: grabber.frames_dropped, camera.name)
+        metrics.BUFFER_BYTES.set_function(
+            lambda grabber=grabber: grabber.frame_buffer.nbytes if grabber.frame_buffer is not None else 0, camera.name)
+        if camera.motion_gate is not None:
+            metrics.FRAMES_INFERRED.set_function(lambda gate=camera.motion_gate: gate.inferred, camera.name)
+            metrics.FRAMES_SKIPPED.set_function(lambda gate=camera.motion_gate: gate.skipped, camera.name)
+
+    metrics.ALERT_QUEUE_DEPTH.set_function(dispatcher.queue.qsize)
+    for outcome in ('submitted', 'delivered', 'failed', 'dropped', 'retries'):
+        metrics.ALERTS.set_function(lambda outcome=outcome: dispatcher.metrics()[outcome], outcome)
+    if dispatcher.spool is not None:
+        spool = dispatcher.spool
+        metrics.SPOOL_PENDING.set_function(lambda: len(spool.entries))
+        metrics.SPOOL_BYTES.set_function(lambda: spool.nbytes)
+        metrics.UPLOAD_KBPS.set_function(lambda: spool.link_kbps or 0)
+    if dispatcher.event_store is not None:
+        store = dispatcher.event_store
+        metrics.EVENTS_PENDING.set_function(lambda: store.pending)
+        metrics.EVENTS_DROPPED.set_function(lambda: store.counters['dropped'])
+
+
+def clip_buffer_factory(segment_dir=None):
+    return partial(make_frame_buffer, CLIP_BUFFER_MODE,
+                   max_bytes=CLIP_BUFFER_MAX_MB * 1024 * 1024, jpeg_quality=CLIP_JPEG_QUALITY,
+                   segment_dir=segment_dir or SEGMENT_DIR, segment_seconds=SEGMENT_SECONDS)
+
+
+def create_cameras(camera_configs=None, grabber_options=None, segment_dir=None):
+    """Cameras with the clip buffer, motion gate, tracker and ROI settings above"""
+    buffer_factory = clip_buffer_factory(segment_dir)
+    return load_cameras(camera_configs or CAMERAS, buffer_seconds=CLIP_PRE_ROLL, buffer_factory=buffer_factory,   # buffer to store the actual clip of the animal detected.
+                        motion_settings=MOTION_GATE, tracker_settings=TRACKER,
+                        detect_every=DETECT_EVERY_N, roi_imgsz=ROI_IMGSZ, grabber_options=grabber_options)
+
+
+def start_up(startup, camera_configs=None, grabber_options=None, engine=None, weights=None, display=True):
+    """
+    Everything before the detection loop. The model loads and warms up on its own thread while the
+    cameras connect and the alerting is set up, only then does the loop start.
+    Returns (cameras, pipeline, notifier, dispatcher, event_store).
+    """
+    camera_configs = camera_configs or CAMERAS
+    model_task = BackgroundTask(load_model, engine, weights, camera_configs, startup, name="model-load")
+
+    # Start decoding every camera stream on its own thread, the loop always gets the newest frames
+    with startup.stage('cameras'):
+        cameras, frame_event = create_cameras(camera_configs, grabber_options)
+        for camera in cameras:
+            camera.start()
+
+    with startup.stage('alerting'):
+        event_store = build_event_store()
+        dispatcher = build_alert_dispatcher(event_store=event_store)
+        notifier = build_notifier(dispatcher)
+        register_metrics(cameras, dispatcher)
+        if METRICS_PORT:
+            metrics.serve(METRICS_PORT, METRICS_HOST)
+
+    with startup.stage('wait_for_model'):
+        model = model_task.result()
+    pipeline = build_pipeline(cameras, frame_event, notifier, display=display, event_store=event_store,
+                              model=model, startup=startup)
+
+    with startup.stage('wait_for_cameras'):
+        for camera in cameras:
+            if not camera.grabber.wait_until_ready(timeout=10):
+                print(f"Error: Could not access camera {camera.name}. Retrying in the background...")
+
+    startup.report('ready')
+    return cameras, pipeline, notifier, dispatcher, event_store
+
+
+def multiproc_settings(engine=None, weights=None, camera_configs=None):
+    """The detection settings above, for the inference workers of multiproc.py"""
+    engine = engine or ENGINE
+    return {
+        'engine': engine,
+        'weights': weights or (MODEL_DIR if engine == 'torch' else None),
+        'imgsz': IMGSZ,
+        'conf': (MIN_CONFIDENCE - 1) / 100,
+        'min_confidence': MIN_CONFIDENCE,
+        'class_names': class_names,
+        'categories': class_categories_table,
+        'max_batch': MAX_BATCH_SIZE,
+        'cascade': CASCADE if USE_CASCADE else None,
+        'motion': MOTION_GATE,
+        'tracker': TRACKER,
+        'detect_every': DETECT_EVERY_N,
+        'roi_imgsz': ROI_IMGSZ,
+        'pre_roll': CLIP_PRE_ROLL,
+        'post_roll': CLIP_POST_ROLL if CLIP_BUFFER_MODE == 'segments' else 0,
+        'warm_up_sizes': warm_up_sizes(camera_configs or CAMERAS),
+    }
+
+
+def build_worker_pool(notifier, event_store=None, camera_configs=None, grabber_options=None, segment_dir=None,
+                      engine=None, weights=None):
+    """Capture, inference and encoding processes for the cameras, see MULTIPROC above"""
+    from multiproc import WorkerPool    # only this mode needs it
+    camera_configs = camera_configs or CAMERAS
+    return WorkerPool(camera_configs, multiproc_settings(engine, weights, camera_configs), notifier, event_store,
+                      buffer_factory=clip_buffer_factory(segment_dir), buffer_seconds=CLIP_PRE_ROLL,
+                      grabber_options=grabber_options, **MULTIPROC)
+
+
+def run_multiproc(startup):
+    with startup.stage('alerting'):
+        event_store = build_event_store()
+        dispatcher = build_alert_dispatcher(event_store=event_store)
+        notifier = build_notifier(dispatcher)
+        register_metrics([], dispatcher)
+        if METRICS_PORT:
+            metrics.serve(METRICS_PORT, METRICS_HOST)
+
+    with startup.stage('workers'):
+        pool = build_worker_pool(notifier, event_store)
+        pool.start()
+        pool.wait_until_ready()
+    for camera_name in pool.names:
+        metrics.FRAMES_READ.set_function(lambda name=camera_name: pool.metrics()['frames_read'][name], camera_name)
+        metrics.FRAMES_DROPPED.set_function(lambda name=camera_name: pool.metrics()['frames_dropped'].get(name, 0), camera_name)
+    startup.report('ready')
+
+    print(f"Starting live detection on {len(pool.names)} camera(s) with {len(pool.workers)} worker processes...")
     try:
-        result = cloudinary.uploader.upload(filename, resource_type="video")
-        link = result.get('secure_url')
-        print(f"[INFO] Uploaded to Cloudinary: {link}")
-    except Exception as e:
-        print(f"[ERROR] Cloudinary upload failed: {e}")
-        link = None
+        pool.run()
+    except KeyboardInterrupt:
+        pass
 
-    os.remove(filename)
-    return link
+    # Sightings still in flight reach the notifier before it stops, the encoders export the last clips
+    pool.stop_intake()
+    notifier.stop()
+    dispatcher.stop()
+    if event_store is not None:
+        event_store.stop()
+    pool.stop()
 
 
 def main():
+    startup = StartupTimer()
+    startup.add('imports', startup.mark('imports'))
     print("AnimalDetection")
-   
-    # Mobile camera URL, replace with your camera stream URL for real time detection
-    mobile_camera_url = "http://192.168.31.142:8080/video"  # It contains the stream URL of the camera that has been used.
-
-    # Open the camera stream
-    cap = cv.VideoCapture(mobile_camera_url)
-
-    if not cap.isOpened():
-        print("Error: Could not access mobile camera.")
+    if USE_MULTIPROC:
+        run_multiproc(startup)
         return
-
-    print("Starting live detection...")
-
-    last_alert_time = 0  # To track last SMS sent time
-    alert_interval = 30  # Interval in seconds
-
-    fps = int(cap.get(cv.CAP_PROP_FPS))     # It grabs the frame per seconds from the video capture device
-    frame_size = (int(cap.get(cv.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)))    # Gets the height and widht of each frame, that used late to display
-    buffer_size = fps * 5  # 5-sec buffer size to store the actual clip of the animal detected.
-    frame_buffer = deque(maxlen=buffer_size)  # Actual data structure where the 5-sec video will be stored.( deque because it stores the recent video and will be easy to delete older videos in constant time.)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to retrieve frame. Check the IP camera feed URL.")
-            break
-
-        frame_buffer.append(frame)  # Add current frame to buffer
-
-        # Perform inference with YOLO model
-        results = model(frame, stream=True)
-
-        # Process bounding boxes and display results 
-        for info in results:
-            boxes = info.boxes
-            for box in boxes:
-                confidence = box.conf[0]
-                confidence = math.ceil(confidence * 100)
-                class_index = int(box.cls[0])
-
-                if confidence >= 85:  # Adjust this accordingly. ( Here I want to be it atleast 85% sure so I do it 85. )
-                    x1, y1, x2, y2 = box.xyxy[0]
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-
-                    # Display bounding box and class label
-                    label = f'{class_names[class_index]} {confidence}%'
-                    cv.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    cv.putText(frame, label, (x1, y1 - 10), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-
-                    # Send SMS alert and save video clip if a specified animal is detected
-                    current_time = time.time()
-                    clip_saved_flag = 0
-                    if class_names[class_index] in harmful_to_humans and (current_time - last_alert_time >= alert_interval or last_alert_time == 0):
-                        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-                        message = f"Warning......WILD ANIMAL DETECTED.....!!!!!!\n {class_names[class_index]} is detected at {timestamp} nearby, with {confidence}% confidence.\nLocation: {location_on_map}"
-                        send_sms(message)
-                        logging.info(f"Sent SMS: {message}")
-                        clip_saved_flag = 1
-                        last_alert_time = current_time
-
-                    elif class_names[class_index] in harmful_to_farms and (current_time - last_alert_time >= alert_interval or last_alert_time == 0):
-                        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-                        message = f"Warning...........!!!!!!\n {class_names[class_index]} is detected at {timestamp} near your farm, with {confidence}% confidence.\nLocation: {location_on_map}"
-                        send_sms(message)
-                        logging.info(f"Sent SMS: {message}")
-                        clip_saved_flag = 1
-                        last_alert_time = current_time
-
-                    if clip_saved_flag:
-                        video_link = upload_clip_and_get_link(list(frame_buffer), fps, frame_size, timestamp)     # send the link of the video saved.
-                        if video_link:
-                            send_sms(f"Watch video clip here: {video_link}")
-                        else:
-                            logging.warning("Video upload failed. No link to send.")
-
-        # Display the frame with detected objects
-        cv.imshow('Animal Detection', frame)
-
-        # Press 'q' to quit the loop
-        if cv.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    # Release the video capture object and close all OpenCV windows
-    cap.release()
+    cameras, pipeline, notifier, dispatcher, event_store = start_up(startup)
+
+    print(f"Starting live detection on {len(cameras)} camera(s)...")
+    pipeline.run()
+
+    # Stop the capture threads and close all OpenCV windows
+    # Alerts still waiting for their post-roll need the cameras, so the notifier and dispatcher stop first
+    notifier.stop()
+    dispatcher.stop()
+    if event_store is not None:
+        event_store.stop()
+    for camera in cameras:
+        camera.stop()
     cv.destroyAllWindows()
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+"""
+Counters, gauges and timing histograms for the detection loop, served as Prometheus text.
+
+Recording a value is a perf_counter() call, a bisect and a short lock, cheap enough to stay on
+in production. Gauges that mirror existing state (queue depth, buffer memory...) take a function
+that is only called when the endpoint is scraped.
+
+    with STAGE_SECONDS.time('inference'):
+        results = model.predict(frames)
+
+main.py serves them on http://127.0.0.1:METRICS_PORT/metrics
+"""
+import time
+import bisect
+import logging
+import threading
+
+# Seconds, from a JPEG encode of one frame up to a slow clip upload
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _format_labels(label_name, label):
+    return f'{{{label_name}="{label}"}}' if label_name and label is not None else ''
+
+
+class Metric:
+    """One metric family, optionally split by a single label (stage, camera...)"""
+    kind = 'untyped'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._functions = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def set_function(self, function, label=None):
+        """Read the value from `function()` at scrape time instead of recording it"""
+        self._functions[label] = function
+
+    def samples(self):
+        with self._lock:
+            samples = dict(self._values)
+        for label, function in list(self._functions.items()):
+            try:
+                samples[label] = function()
+            except Exception as e:
+                logging.warning(f"Metric {self.name} could not be read: {e}")
+        return samples
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label, value in self.samples().items():
+            lines.append(f"{self.name}{_format_labels(self.label, label)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, label=None):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, label=None):
+        self._values[label] = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label', 'start')
+
+    def __init__(self, histogram, label):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.label)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, label=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, label=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label)
+            if series is None:
+                series = self._values[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, label=None):
+        """Context manager that observes the seconds spent inside it"""
+        return _Timer(self, label)
+
+    def summary(self):
+        """{label: {'count', 'mean_ms'}}, for reports that do not scrape the endpoint"""
+        with self._lock:
+            return {label: {'count': count, 'mean_ms': round(total / count * 1000, 3) if count else None}
+                    for label, (_, total, count) in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = {label: (list(counts), total, count) for label, (counts, total, count) in self._values.items()}
+        for label, (counts, total, count) in series.items():
+            prefix = f'{self.label}="{label}",' if self.label and label is not None else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{_format_labels(self.label, label)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label, label)} {count}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def serve(port=9100, host='127.0.0.1'):
+    """Serve /metrics on a background thread, localhost only unless `host` says otherwise"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer    # only imported when served
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass    # keep scrapes out of the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrics served on http://{host}:{port}/metrics")
+    return server
+
+
+# Metrics of the detection loop. The stage timings and model fps are recorded by capture.py, pipeline.py,
+# frame_buffer.py and alerts.py, the others read existing counters (see register_metrics() in main.py)
+STAGE_SECONDS = Histogram('keepaneye_stage_seconds', 'Seconds spent in each stage of the detection loop', label='stage')
+FRAMES_READ = Counter('keepaneye_frames_read_total', 'Frames decoded per camera', label='camera')
+FRAMES_DROPPED = Counter('keepaneye_frames_dropped_total', 'Frames replaced before the detector saw them', label='camera')
+MODEL_FPS = Gauge('keepaneye_model_fps', 'Frames per second of the last inference batch')
+ALERT_QUEUE_DEPTH = Gauge('keepaneye_alert_queue_depth', 'Alerts waiting for a delivery worker')
+ALERTS = Counter('keepaneye_alerts_total', 'Alert deliveries by outcome', label='outcome')
+FRAMES_INFERRED = Counter('keepaneye_frames_inferred_total', 'Frames the motion gate sent to the model', label='camera')
+FRAMES_SKIPPED = Counter('keepaneye_frames_skipped_total', 'Frames the motion gate found static', label='camera')
+BUFFER_BYTES = Gauge('keepaneye_clip_buffer_bytes', 'Memory held by the pre-event clip buffer', label='camera')
+SPOOL_PENDING = Gauge('keepaneye_spool_pending', 'Clips in the upload spool, waiting or retrying')
+SPOOL_BYTES = Gauge('keepaneye_spool_bytes', 'Disk used by the upload spool')
+UPLOAD_KBPS = Gauge('keepaneye_upload_kbps', 'Moving average of the measured clip upload speed')
+EVENTS_PENDING = Gauge('keepaneye_events_pending', 'Detections waiting for the event store writer')
+EVENTS_DROPPED = Counter('keepaneye_events_dropped_total', 'Detections not recorded because the event store fell behind')
@@ -1,9 +1,54 @@
 import os
 from ultralytics import YOLO
 import torch
-from pathlib import Path
 import json
-import shutil
+from dataset_cache import pack_dataset
+from sharded_dataset import ShardedDetectionTrainer
+from validation import validate_model
+
+# Training hyperparameters, the tuned part of training_args (hyperparameter_sweep.py searches over them)
+DEFAULT_TRAINING_ARGS = {
+    # Learning
+    'lr0': 0.008,           # initial
+    'lrf': 0.001,            # final
+    'weight_decay': 0.0004,
+    'optimizer': 'AdamW',
+    'cos_lr': True,
+
+    # Loss function tuning
+    'box': 5.0,
+    'cls': 0.8,
+    'dfl': 1.0,
+
+    # Regularization  
+    'label_smoothing': 0.10,
+    'erasing': 0.08,
+    'fraction': 0.85,
+    'dropout': 0.15,
+
+    # Augmentations
+    'hsv_h': 0.015,
+    'hsv_s': 0.6,
+    'hsv_v': 0.3,
+    'degrees': 5.0,
+    'translate': 0.08,
+    'scale': 0.5,
+    'shear': 1.0,
+    'flipud': 0.0,
+    'fliplr': 0.4,
+    'mixup': 0.0,
+    'copy_paste': 0.0,
+    'mosaic': 0.7,
+
+    'amp': False,
+    'single_cls': False,
+
+    # Validation settings
+    'val': True,
+    'plots': True,      # Generate training plots
+    'verbose': True,    # Verbose output
+}
+
 
 def setup_training_environment():
     """Setup training environment and check GPU availability"""
@@ -19,12 +64,24 @@ def setup_training_environment():
     
     return cpu_or_gpu
 
-def train_yolo_model(data_yaml_path, epochs, batch_size, img_size, patience, project_name, experiment_name, device):
+def train_yolo_model(data_yaml_path, epochs, batch_size, img_size, patience, project_name, experiment_name, device,
+                     use_shards=False, model_path='last.pt', overrides=None, callbacks=None, base_args=None):
+    """
+    Train with DEFAULT_TRAINING_ARGS (or `base_args` in their place, e.g. FINE_TUNING_ARGS), `overrides`
+    replace any training argument (a sweep trial's settings)
+    and `callbacks` maps ultralytics events ('on_fit_epoch_end', ...) to functions of the trainer
+    """
 
     print("🚀 Starting YOLOv8 Training...")
+
+    if use_shards:
+        # Decoded and resized once into memory-mapped shards (dataset_cache.py), repacked when the dataset changes
+        pack_dataset(data_yaml_path, img_size)
     
     # Load model
-    model = YOLO('last.pt')
+    model = YOLO(model_path)
+    for event, callback in (callbacks or {}).items():
+        model.add_callback(event, callback)
     
     # Training parameters
     training_args = {
@@ -42,46 +99,8 @@ def train_yolo_model(data_yaml_path, epochs, batch_size, img_size, patience, pro
         'cache': False,      # Cache images for faster training
         'device': device,   # cpu or gpu will be used for training the model
         'resume': True,
-        
-        # Learning
-        'lr0': 0.008,           # initial
-        'lrf': 0.001,            # final
-        'weight_decay': 0.0004,
-        'optimizer': 'AdamW',
-        'cos_lr': True,
-
-        # Loss function tuning
-        'box': 5.0,
-        'cls': 0.8,
-        'dfl': 1.0,
-
-        # Regularization  
-        'label_smoothing': 0.10,
-        'erasing': 0.08,
-        'fraction': 0.85,
-        'dropout': 0.15,
-
-        # Augmentations
-        'hsv_h': 0.015,
-        'hsv_s': 0.6,
-        'hsv_v': 0.3,
-        'degrees': 5.0,
-        'translate': 0.08,
-        'scale': 0.5,
-        'shear': 1.0,
-        'flipud': 0.0,
-        'fliplr': 0.4,
-        'mixup': 0.0,
-        'copy_paste': 0.0,
-        'mosaic': 0.7,
-        
-        'amp': False,
-        'single_cls': False,
-        
-        # Validation settings
-        'val': True,
-        'plots': True,      # Generate training plots
-        'verbose': True,    # Verbose output
+        **(DEFAULT_TRAINING_ARGS if base_args is None else base_args),
+        **(overrides or {}),
     }
     
     # Start training
@@ -90,16 +109,18 @@ def train_yolo_model(data_yaml_path, epochs, batch_size, img_size, patience, pro
     print(f"   Epochs: {epochs} (with early stopping patience: {patience})")
     print(f"   Batch Size: {batch_size}")
     print(f"   Image Size: {img_size}")
-    print(f"   Data: {data_yaml_path}")
+    print(f"   Data: {data_yaml_path}{' (shard cache)' if use_shards else ''}")
     
     try:
-        results = model.train(**training_args)
+        model.train(trainer=ShardedDetectionTrainer if use_shards else None, **training_args)
+        # ultralytics 8.0.x train() returns None, the trainer holds save_dir and the metrics of best.pt
+        results = model.trainer
         print("✅ Training completed successfully!")
         
         # Print best results
         print(f"\n📈 Best Results:")
-        print(f"   Best mAP50: {results.results_dict.get('metrics/mAP50(B)', 'N/A')}")
-        print(f"   Best mAP50-95: {results.results_dict.get('metrics/mAP50-95(B)', 'N/A')}")
+        print(f"   Best mAP50: {results.metrics.get('metrics/mAP50(B)', 'N/A')}")
+        print(f"   Best mAP50-95: {results.metrics.get('metrics/mAP50-95(B)', 'N/A')}")
         
         return results
         
@@ -107,48 +128,6 @@ def train_yolo_model(data_yaml_path, epochs, batch_size, img_size, patience, pro
         print(f"❌ Training failed: {str(e)}")
         return None
 
-def validate_model(model_path, data_yaml_path):
-    """Validate the trained model"""
-    print("🔍 Validating trained model...")
-    
-    model_path = Path(model_path)
-    model = YOLO(model_path)
-    results = model.val(
-        data=data_yaml_path,
-        split='val',
-        conf=0.25,
-        iou=0.6,
-        plots=True,
-        save_json=False,
-        )
-    
-    # Extract validation metrics directly
-    metrics = results.metrics
-    val_map = metrics.map50to95
-    map50 = metrics.map50
-    precision = metrics.precision
-    recall = metrics.recall
-
-    # Print comprehensive report
-    print("\n📊 Validation Report:")
-    print(f"mAP50-95: {val_map:.4f}")
-    print(f"mAP50: {map50:.4f}")
-    print(f"Precision: {precision:.4f}")
-    print(f"Recall: {recall:.4f}")
-
-    # Generate visual report
-    print("\n📈 Generating visual report...")
-    report_dir = model_path.parent / "validation_report"
-    os.makedirs(report_dir, exist_ok=True)
-
-    # Copy visualizations
-    for viz_file in ['confusion_matrix.png', 'results.png', 'labels.jpg']:
-        src = model_path.parent / viz_file
-        if src.exists():
-            shutil.copy(src, report_dir / viz_file)
-
-    print(f"✅ Validation completed! Report saved to {report_dir}")
-    return results
 
 def main():
     """Main training pipeline using existing animals.yaml"""
@@ -161,6 +140,7 @@ def main():
     BATCH_SIZE = 24       # Adjust based on your GPU memory
     PATIENCE = 25        # Early stopping patience
     IMG_SIZE = 640
+    USE_SHARDS = True     # read the images from the memory-mapped shard cache (dataset_cache.py)
     
     print("🎯 YOLOv8 Custom Training Pipeline")
     print("📂 Using animals.yaml configuration")
@@ -187,7 +167,8 @@ def main():
         patience=PATIENCE,
         project_name='ProjectX',
         experiment_name='yolov8n_animals',
-        device=cpu_or_gpu
+        device=cpu_or_gpu,
+        use_shards=USE_SHARDS
     )
     
     if results:
@@ -199,7 +180,7 @@ def main():
         
         # Optional: Validate the best model
         print("\n" + "="*70)
-        validate_model(str(best_model_path), ANIMALS_YAML_PATH)
+        validate_model(str(best_model_path), ANIMALS_YAML_PATH, use_shards=USE_SHARDS)
         
         print(f"\n🚀 Ready for inference! Use: YOLO('{best_model_path}')")
     
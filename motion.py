@@ -0,0 +1,66 @@
+import time
+import cv2 as cv
+
+
+class MotionGate:
+    """
+    Cheap pre-filter in front of the detector.
+
+    Every frame is shrunk to `width` pixels wide, blurred and compared against a slowly updated
+    background. The detector only runs when at least `min_changed_area` (fraction of the frame) of
+    the pixels changed by more than `pixel_threshold`. To not miss animals that barely move, a
+    frame is forced through every `force_every` seconds, and after a detection the gate stays open
+    for `hold_seconds`.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_changed_area=0.005, force_every=5.0,
+                 hold_seconds=3.0, learning_rate=0.05):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_area = min_changed_area
+        self.force_every = force_every
+        self.hold_seconds = hold_seconds
+        self.learning_rate = learning_rate
+
+        self.background = None
+        self.last_inference = 0
+        self.open_until = 0
+        self.changed_area = 0.0     # changed fraction of the last frame, handy when tuning the knobs
+
+        # Counters, reported with the camera stats
+        self.inferred = 0
+        self.skipped = 0
+
+    def _changed_area(self, frame):
+        height, width = frame.shape[:2]
+        small = cv.resize(frame, (self.width, max(1, height * self.width // width)), interpolation=cv.INTER_AREA)
+        gray = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+        gray = cv.GaussianBlur(gray, (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype('float32')
+            return 1.0      # first frame, nothing to compare with yet
+
+        diff = cv.absdiff(gray, cv.convertScaleAbs(self.background))
+        changed = cv.countNonZero(cv.threshold(diff, self.pixel_threshold, 255, cv.THRESH_BINARY)[1])
+        cv.accumulateWeighted(gray, self.background, self.learning_rate)
+        return changed / diff.size
+
+    def should_infer(self, frame, now=None):
+        """True if this frame should go through the detector"""
+        now = now or time.time()
+        self.changed_area = self._changed_area(frame)
+
+        infer = (self.changed_area >= self.min_changed_area
+                 or now < self.open_until
+                 or now - self.last_inference >= self.force_every)
+        if infer:
+            self.inferred += 1
+            self.last_inference = now
+        else:
+            self.skipped += 1
+        return infer
+
+    def hold_open(self, now=None):
+        """Call when the detector found something, keeps inferring while the animal may be standing still"""
+        self.open_until = (now or time.time()) + self.hold_seconds
@@ -0,0 +1,733 @@
+"""
+Multi-process mode of main.py, for multi-camera boxes where one process is bound by the GIL.
+
+    capture process (one per camera)   decodes the stream into a FrameRing in shared memory
+    inference workers (N)              run the motion gate, model, tracker and post-processing
+                                       (pipeline.DetectionPipeline) for their share of the cameras
+    encoding workers (M)               record the clip buffer (frame_buffer.py) of their cameras and
+                                       export alert clips on request
+    main process                       notifier, alert dispatcher, event store, metrics and the
+                                       supervisor that restarts crashed workers
+
+Frames never go through a pipe: the capture process copies each one into the next slot of its ring
+and the workers copy it out again, only small messages (sightings, clip requests, stats) are pickled.
+No lock is shared between the processes (workers poll the ring heads, the stop flag is a raw value),
+so the supervisor can kill or lose any worker without wedging the others.
+"""
+import os
+import time
+import signal
+import uuid
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from metrics import Counter
+
+WORKER_RESTARTS = Counter('keepaneye_worker_restarts_total', 'Worker processes restarted after a crash', label='worker')
+
+# Ring header: int64 values shared by the capture process and its readers
+HEAD, FPS, WIDTH, HEIGHT, FINISHED, FRAMES_READ, RECONNECTS = range(7)
+RING_HEADER = 8
+SLOT_HEADER = 4     # per slot: seq, frame id, height, width (int64), the capture times follow as float64
+
+
+class FrameRing:
+    """
+    `slots` frames of up to `max_size` (width, height) in one shared_memory block, one writer and any
+    number of readers. Every slot carries the sequence number of the frame in it, written before and
+    after the pixels, so a reader can tell when the writer lapped it mid-copy and retry.
+    """
+
+    def __init__(self, name=None, slots=4, max_size=(1920, 1080)):
+        width, height = max_size
+        self.slots = slots
+        self.slot_bytes = width * height * 3
+        size = (RING_HEADER + slots * (SLOT_HEADER + 1)) * 8 + slots * self.slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(name=f"keepaneye-{uuid.uuid4().hex[:12]}", create=True, size=size)
+        else:
+            # Spawned workers share the resource tracker of the pool, attaching registers the block a
+            # second time (a no-op), the pool's unlink is the one that releases it
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.max_size = max_size
+
+        buffer = self.shm.buf
+        self.header = np.ndarray((RING_HEADER,), dtype=np.int64, buffer=buffer)
+        offset = RING_HEADER * 8
+        self.slot_headers = np.ndarray((slots, SLOT_HEADER), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += slots * SLOT_HEADER * 8
+        self.slot_times = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += slots * 8
+        self.data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=buffer, offset=offset)
+        if self.owner:
+            self.header[:] = 0
+            self.slot_headers[:] = -1
+
+    def write(self, frame, frame_id, captured_at):
+        height, width = frame.shape[:2]
+        if height * width * 3 > self.slot_bytes:
+            raise ValueError(f"Frame of {width}x{height} does not fit the ring ({self.max_size[0]}x{self.max_size[1]})")
+        seq = int(self.header[HEAD]) + 1
+        slot = seq % self.slots
+        self.slot_headers[slot, 0] = -1         # being written
+        self.data[slot, :frame.nbytes] = frame.reshape(-1)
+        self.slot_headers[slot, 1:] = (frame_id, height, width)
+        self.slot_times[slot] = captured_at
+        self.slot_headers[slot, 0] = seq
+        self.header[HEAD] = seq
+        self.header[FRAMES_READ] = frame_id
+
+    def _copy(self, seq):
+        slot = seq % self.slots
+        if self.slot_headers[slot, 0] != seq:
+            return None
+        frame_id, height, width = (int(v) for v in self.slot_headers[slot, 1:])
+        captured_at = float(self.slot_times[slot])
+        frame = self.data[slot, :height * width * 3].reshape(height, width, 3).copy()
+        if self.slot_headers[slot, 0] != seq:
+            return None     # overwritten while we were copying
+        return seq, frame_id, frame, captured_at
+
+    def read_latest(self, after=0):
+        """(seq, frame_id, frame, captured_at) of the newest frame if it is newer than `after`, else None"""
+        for _ in range(3):
+            seq = int(self.header[HEAD])
+            if seq <= after:
+                return None
+            copied = self._copy(seq)
+            if copied is not None:
+                return copied
+        return None
+
+    def read_next(self, after=0):
+        """The oldest frame after `after` still in the ring (for readers that want every frame), else None"""
+        while True:
+            head = int(self.header[HEAD])
+            if head <= after:
+                return None
+            seq = max(after + 1, head - self.slots + 2)     # the slot after head may be mid-write
+            copied = self._copy(seq)
+            if copied is not None:
+                return copied
+            after = seq     # lapped while copying, move on
+
+    @property
+    def finished(self):
+        return bool(self.header[FINISHED])
+
+    def close(self):
+        # Views into the buffer must go before the block can be closed
+        self.header = self.slot_headers = self.slot_times = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingEvent:
+    """
+    The frame_event of the detection loop for frames arriving in rings: set while any ring has a frame
+    (or an end of source) not seen at the last clear(). It polls the ring heads instead of sharing a
+    multiprocessing.Event with the capture processes, a worker killed in the middle of Event.wait() would
+    leave the capture process hanging in its next Event.set().
+    """
+
+    def __init__(self, rings, poll_interval=0.002):
+        self.rings = rings
+        self.poll_interval = poll_interval
+        self._seen = [(0, 0)] * len(rings)
+        self._flag = False
+
+    def _state(self):
+        return [(int(ring.header[HEAD]), int(ring.header[FINISHED])) for ring in self.rings]
+
+    def is_set(self):
+        return self._flag or self._state() != self._seen
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.is_set():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def set(self):
+        self._flag = True
+
+    def clear(self):
+        self._flag = False
+        self._seen = self._state()
+
+
+def _ignore_interrupts():
+    # Ctrl+C reaches every process of the group, the main process shuts the workers down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# ---------------------------------------------------------------------------
+# Capture processes
+# ---------------------------------------------------------------------------
+
+def capture_worker(source, ring_name, max_size, stop_flag, grabber_options):
+    """Decode `source` into the ring until the source ends or `stop_flag` is raised"""
+    import cv2 as cv
+    from capture import FrameGrabber
+
+    _ignore_interrupts()
+    ring = FrameRing(ring_name, max_size=max_size)
+    frames_before = int(ring.header[FRAMES_READ])   # a restarted capture process keeps counting
+    # The clip buffer lives in the encoding worker, this process only keeps the newest frame
+    grabber = FrameGrabber(source, buffer_seconds=0, buffer_factory=lambda max_frames: _NoBuffer(),
+                           **grabber_options)
+    grabber.start()
+    width, height = max_size
+    while not stop_flag.value:
+        latest = grabber.read_latest(timeout=0.5)
+        if latest is None:
+            if grabber.finished.is_set():
+                break
+            continue
+        frame_id, frame, captured_at = latest
+        if frame.shape[1] > width or frame.shape[0] > height:
+            scale = min(width / frame.shape[1], height / frame.shape[0])
+            frame = cv.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)), interpolation=cv.INTER_AREA)
+        ring.header[FPS], ring.header[WIDTH], ring.header[HEIGHT] = grabber.fps, frame.shape[1], frame.shape[0]
+        ring.header[RECONNECTS] = grabber.reconnects
+        ring.write(frame, frames_before + frame_id, captured_at)
+
+    grabber.stop()
+    grabber.join(timeout=5)
+    # A stop request is not the end of the source, a restarted capture process would carry on
+    if grabber.finished.is_set() and not stop_flag.value:
+        ring.header[FINISHED] = 1
+    ring.close()
+
+
+class _NoBuffer:
+    def set_stream(self, fps, frame_size):
+        pass
+
+    def append(self, frame, captured_at=None):
+        pass
+
+    def clip(self, pre_roll, post_roll=0):
+        return None
+
+    def close(self):
+        pass
+
+    nbytes = 0
+
+
+# ---------------------------------------------------------------------------
+# Inference workers
+# ---------------------------------------------------------------------------
+
+class ClipRequest:
+    """Stands in for the clip of a sighting until the main process asks the encoding worker for it"""
+
+    def __init__(self, camera_name, pre_roll, post_roll):
+        self.camera_name = camera_name
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+
+    def release(self):
+        pass
+
+
+class _RingFlag:
+    def __init__(self, ring):
+        self.ring = ring
+
+    def is_set(self):
+        return self.ring.finished
+
+
+class RingGrabber:
+    """
+    The FrameGrabber interface of cameras.Camera, on frames decoded by a capture process.
+    `source` is the camera name the WorkerPool keys its rings by.
+    """
+
+    def __init__(self, rings, source, buffer_seconds=5, frame_event=None, buffer_factory=None):
+        self.ring = FrameRing(rings[source][0], max_size=rings[source][1])
+        self.source = source
+        self.finished = _RingFlag(self.ring)
+        self.frame_buffer = None
+        self.frames_dropped = 0
+        self._last_seq = 0
+
+    @property
+    def fps(self):
+        return int(self.ring.header[FPS])
+
+    @property
+    def frame_size(self):
+        return int(self.ring.header[WIDTH]), int(self.ring.header[HEIGHT])
+
+    @property
+    def frames_read(self):
+        return int(self.ring.header[FRAMES_READ])
+
+    @property
+    def reconnects(self):
+        return int(self.ring.header[RECONNECTS])
+
+    def read_latest(self, timeout=0):
+        latest = self.ring.read_latest(self._last_seq)
+        if latest is None:
+            return None
+        seq, frame_id, frame, captured_at = latest
+        if self._last_seq:
+            self.frames_dropped += seq - self._last_seq - 1
+        self._last_seq = seq
+        return frame_id, frame, captured_at
+
+    def clip(self, pre_roll, post_roll=0):
+        return ClipRequest(self.source, pre_roll, post_roll)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+
+class _Forwarder:
+    """Notifier and event store of the pipeline inside an inference worker, both forward to the main process"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.dispatcher = self      # the pipeline reports the dispatcher stats, the main process does that
+
+    def notify(self, sighting):
+        self.messages.put(('sighting', sighting))
+        return True
+
+    def record(self, *args):
+        event_id = uuid.uuid4().hex
+        self.messages.put(('event', event_id, args))
+        return event_id
+
+    def report_if_due(self, interval=10):
+        pass
+
+
+def inference_worker(index, camera_configs, rings, settings, messages, stop_flag):
+    """Detection loop of one share of the cameras, sightings and events go back to the main process"""
+    from functools import partial
+    from cameras import load_cameras
+    from cascade import Cascade
+    from engines import load_engine, warm_up
+    from pipeline import DetectionPipeline
+
+    _ignore_interrupts()
+    cameras, _ = load_cameras(camera_configs, buffer_seconds=0, motion_settings=settings['motion'],
+                              tracker_settings=settings['tracker'], detect_every=settings['detect_every'],
+                              roi_imgsz=settings['roi_imgsz'], grabber_factory=partial(RingGrabber, rings))
+    model = load_engine(settings['engine'], settings['weights'], imgsz=settings['imgsz'], conf=settings['conf'])
+    warm_up(model, settings['warm_up_sizes'], batch=min(len(cameras), settings['max_batch']))
+
+    frame_event = RingEvent([camera.grabber.ring for camera in cameras])
+    forwarder = _Forwarder(messages)
+    pipeline = DetectionPipeline(
+        cameras, frame_event, model, forwarder,
+        class_names=settings['class_names'],
+        categories=settings['categories'],
+        min_confidence=settings['min_confidence'],
+        imgsz=settings['imgsz'],
+        max_batch=settings['max_batch'],
+        cascade=Cascade(**settings['cascade']) if settings['cascade'] else None,
+        display=False,
+        pre_roll=settings['pre_roll'],
+        post_roll=settings['post_roll'],
+        event_store=forwarder,
+    )
+    messages.put(('ready', f"inference-{index}"))
+
+    last_stats = time.time()
+    while not stop_flag.value:
+        pipeline.step(timeout=0.5)
+        if all(camera.grabber.finished.is_set() for camera in cameras) and not frame_event.is_set():
+            break
+        if time.time() - last_stats >= 1.0:
+            messages.put(('stats', f"inference-{index}", _worker_stats(pipeline, cameras)))
+            last_stats = time.time()
+    messages.put(('stats', f"inference-{index}", _worker_stats(pipeline, cameras)))
+    for camera in cameras:
+        camera.grabber.ring.close()
+
+
+def _worker_stats(pipeline, cameras):
+    return {
+        'frames_processed': pipeline.frames_processed,
+        'frames_dropped': {camera.name: camera.grabber.frames_dropped for camera in cameras},
+        'frames_inferred': {camera.name: camera.motion_gate.inferred for camera in cameras if camera.motion_gate},
+        'frames_skipped': {camera.name: camera.motion_gate.skipped for camera in cameras if camera.motion_gate},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Encoding workers
+# ---------------------------------------------------------------------------
+
+def encoding_worker(index, camera_names, rings, buffer_factory, buffer_seconds, commands, replies, stop_flag):
+    """
+    Feeds every frame of its cameras into their clip buffer (segments, JPEG or raw, see frame_buffer.py)
+    and serves the clip requests of the main process: ('clip', id, camera name, pre_roll, post_roll),
+    ('export', id, filename) and ('release', id).
+    """
+    _ignore_interrupts()
+    readers = {name: FrameRing(rings[name][0], max_size=rings[name][1]) for name in camera_names}
+    buffers = {}
+    last_seq = {name: 0 for name in camera_names}
+    clips = {}
+    closed = set()
+    frame_event = RingEvent(list(readers.values()))
+
+    threading.Thread(target=_serve_clip_commands, args=(commands, replies, buffers, clips),
+                     name="clip-commands", daemon=True).start()
+
+    while not stop_flag.value and len(closed) < len(camera_names):
+        frame_event.wait(0.5)
+        frame_event.clear()
+        for source, ring in readers.items():
+            if source in closed:
+                continue
+            while True:
+                frame = ring.read_next(last_seq[source])
+                if frame is None:
+                    break
+                seq, _, image, captured_at = frame
+                last_seq[source] = seq
+                buffer = buffers.get(source)
+                if buffer is None:
+                    fps = int(ring.header[FPS]) or 30
+                    buffer = buffers[source] = buffer_factory(fps * buffer_seconds)
+                    buffer.set_stream(fps, (image.shape[1], image.shape[0]))
+                buffer.append(image, captured_at)
+            if ring.finished and int(ring.header[HEAD]) <= last_seq[source]:
+                closed.add(source)
+                if source in buffers:
+                    buffers[source].close()
+
+    # Clips still being exported need the buffers, give them a moment before closing
+    deadline = time.time() + 30
+    while clips and time.time() < deadline and not stop_flag.value:
+        time.sleep(0.1)
+    for source, buffer in buffers.items():
+        if source not in closed:
+            buffer.close()
+    for ring in readers.values():
+        ring.close()
+
+
+def _serve_clip_commands(commands, replies, buffers, clips):
+    while True:
+        command = commands.get()
+        if command is None:
+            return
+        kind, clip_id = command[0], command[1]
+        try:
+            if kind == 'clip':
+                _, _, source, pre_roll, post_roll = command
+                buffer = buffers.get(source)
+                clips[clip_id] = buffer.clip(pre_roll, post_roll) if buffer is not None else None
+            elif kind == 'export':
+                clip = clips.pop(clip_id, None)
+                if clip is None:
+                    raise RuntimeError("no clip recorded for this alert")
+                clip.wait()
+                clip.export(command[2])
+                replies.put((clip_id, None))
+            elif kind == 'release':
+                clip = clips.pop(clip_id, None)
+                if clip is not None:
+                    clip.release()
+        except Exception as e:
+            logging.error(f"Clip command {kind} failed: {e}")
+            if kind == 'export':
+                replies.put((clip_id, str(e)))
+
+
+class RemoteClip:
+    """The clip of a sighting, recorded and exported by an encoding worker (same interface as clips.py)"""
+
+    def __init__(self, pool, worker, clip_id, timeout):
+        self.pool = pool
+        self.worker = worker
+        self.clip_id = clip_id
+        self.timeout = timeout
+
+    def wait(self, timeout=None):
+        return True     # export() waits for the post-roll in the encoding worker
+
+    def export(self, filename):
+        error = self.pool.request_export(self.worker, self.clip_id, filename, self.timeout)
+        if error:
+            raise RuntimeError(f"Encoding worker could not export the clip: {error}")
+        return filename
+
+    def release(self):
+        self.pool.send_command(self.worker, ('release', self.clip_id))
+
+
+# ---------------------------------------------------------------------------
+# Supervisor
+# ---------------------------------------------------------------------------
+
+class _Worker:
+    """One supervised process, rebuilt from `target` and `args` when it dies"""
+
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.restarts = 0
+        self.restart_at = 0.0
+        self.done = False       # exited on its own (source ended), not restarted
+
+
+class WorkerPool:
+    """
+    Runs the cameras of `camera_configs` on capture, inference and encoding processes and feeds the
+    sightings they produce to `notifier` (and the event store), like DetectionPipeline does in one process.
+
+    `settings` are the detection settings of the inference workers (see main.multiproc_settings()),
+    `buffer_factory` builds the clip buffer of a camera in the encoding workers. Workers that crash are
+    restarted after `restart_delay` seconds, doubling up to `max_restart_delay` if they keep crashing.
+    """
+
+    def __init__(self, camera_configs, settings, notifier, event_store=None, buffer_factory=None, buffer_seconds=5,
+                 inference_workers=None, encoding_workers=None, ring_slots=4, max_frame_size=(1920, 1080),
+                 grabber_options=None, restart_delay=1.0, max_restart_delay=30.0):
+        self.camera_configs = camera_configs
+        self.settings = settings
+        self.notifier = notifier
+        self.event_store = event_store
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+
+        cores = os.cpu_count() or 1
+        cameras = len(camera_configs)
+        inference_workers = min(cameras, inference_workers or max(1, cores // 2))
+        encoding_workers = min(cameras, encoding_workers or max(1, cores // 4))
+
+        self.context = mp.get_context('spawn')     # no fork with the threads of this process
+        self.stop_flag = self.context.RawValue('b', 0)    # lock free, a killed worker cannot hold it
+        # Capture and inference stop first, the encoders keep serving clip exports until stop()
+        self.intake_flag = self.context.RawValue('b', 0)
+        self.messages = self.context.Queue()
+        self.replies = self.context.Queue()
+        # Rings, clip requests and stats go by camera name, the workers never see the real sources
+        self.names = [config.get('name', f"camera_{index}") for index, config in enumerate(camera_configs)]
+        self.rings = {name: FrameRing(slots=ring_slots, max_size=max_frame_size) for name in self.names}
+        ring_names = {name: (ring.name, max_frame_size) for name, ring in self.rings.items()}
+
+        self.commands = [self.context.Queue() for _ in range(encoding_workers)]
+        self.encoder_of = {name: index % encoding_workers for index, name in enumerate(self.names)}
+
+        self.workers = []
+        for name, config in zip(self.names, camera_configs):
+            self.workers.append(_Worker(f"capture-{name}", capture_worker,
+                                        (config['source'], ring_names[name][0], max_frame_size,
+                                         self.intake_flag, grabber_options or {})))
+        ring_configs = [{**config, 'source': name} for name, config in zip(self.names, camera_configs)]
+        for worker in range(inference_workers):
+            self.workers.append(_Worker(f"inference-{worker}", inference_worker,
+                                        (worker, ring_configs[worker::inference_workers], ring_names, settings,
+                                         self.messages, self.intake_flag)))
+        for worker in range(encoding_workers):
+            self.workers.append(_Worker(f"encoding-{worker}", encoding_worker,
+                                        (worker, self.names[worker::encoding_workers], ring_names, buffer_factory,
+                                         buffer_seconds, self.commands[worker], self.replies, self.stop_flag)))
+
+        self.stats = {}                     # worker name -> latest stats of the worker
+        self._processed_before_restart = 0
+        self.alerts_fired = 0
+        self._ready = set()
+        self._clip_ids = itertools.count(1)
+        self._exports = {}          # clip id -> [threading.Event, error]
+        self._lock = threading.Lock()
+        self._intake_closed = threading.Event()
+        self._closed = threading.Event()
+        self._collector = threading.Thread(target=self._collect, name="pool-collector", daemon=True)
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        self._collector.start()
+        for target, name in ((self._route_replies, "pool-replies"), (self._supervise, "pool-supervisor")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    def _spawn(self, worker):
+        worker.process = self.context.Process(target=worker.target, args=worker.args, name=worker.name, daemon=True)
+        worker.process.start()
+
+    def _supervise(self):
+        while not self._closed.wait(0.5):
+            if self.stop_flag.value:
+                return
+            for worker in self.workers:
+                process = worker.process
+                if worker.done or process.is_alive():
+                    continue
+                if self.intake_flag.value and worker not in self._encoders:
+                    continue        # stopped on purpose by stop_intake()
+                if process.exitcode == 0:
+                    worker.done = True      # the source ended, or all of the worker's cameras did
+                    continue
+                now = time.time()
+                if not worker.restart_at:
+                    delay = min(self.restart_delay * 2 ** worker.restarts, self.max_restart_delay)
+                    worker.restart_at = now + delay
+                    print(f"[ERROR] Worker {worker.name} died (exit code {process.exitcode}), restarting in {delay:.0f}s")
+                    logging.error(f"Worker {worker.name} died with exit code {process.exitcode}, restarting in {delay:.0f}s")
+                elif now >= worker.restart_at:
+                    worker.restarts += 1
+                    worker.restart_at = 0.0
+                    WORKER_RESTARTS.inc(label=worker.name)
+                    self._spawn(worker)
+
+    def _collect(self):
+        # After stop_intake() the workers that send messages are gone, return once the queue is drained
+        while True:
+            try:
+                message = self.messages.get(timeout=0.5)
+            except queue.Empty:
+                if self._intake_closed.is_set() or self._closed.is_set():
+                    return
+                continue
+            kind = message[0]
+            if kind == 'sighting':
+                sighting = message[1]
+                if isinstance(sighting.clip, ClipRequest):
+                    sighting.clip = self._request_clip(sighting.clip)
+                if self.notifier.notify(sighting):
+                    self.alerts_fired += 1
+            elif kind == 'event' and self.event_store is not None:
+                _, event_id, args = message
+                self.event_store.record(*args, event_id=event_id)
+            elif kind == 'stats':
+                previous = self.stats.get(message[1])
+                if previous and message[2]['frames_processed'] < previous['frames_processed']:
+                    self._processed_before_restart += previous['frames_processed']     # a restarted worker counts from 0
+                self.stats[message[1]] = message[2]
+            elif kind == 'ready':
+                self._ready.add(message[1])
+
+    def _request_clip(self, request):
+        worker = self.encoder_of[request.camera_name]
+        clip_id = next(self._clip_ids)
+        self.send_command(worker, ('clip', clip_id, request.camera_name, request.pre_roll, request.post_roll))
+        return RemoteClip(self, worker, clip_id, timeout=request.pre_roll + request.post_roll + 60)
+
+    def send_command(self, worker, command):
+        self.commands[worker].put(command)
+
+    def request_export(self, worker, clip_id, filename, timeout):
+        done = threading.Event()
+        with self._lock:
+            self._exports[clip_id] = [done, None]
+        self.send_command(worker, ('export', clip_id, os.path.abspath(filename)))
+        if not done.wait(timeout):
+            error = f"no answer after {timeout:.0f}s"
+        else:
+            error = self._exports[clip_id][1]
+        with self._lock:
+            self._exports.pop(clip_id, None)
+        return error
+
+    def _route_replies(self):
+        while not self._closed.is_set():
+            try:
+                clip_id, error = self.replies.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                export = self._exports.get(clip_id)
+            if export is not None:
+                export[1] = error
+                export[0].set()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until every inference worker has loaded and warmed up its model"""
+        inference = {worker.name for worker in self.workers if worker.name.startswith('inference-')}
+        deadline = None if timeout is None else time.time() + timeout
+        while not inference <= self._ready:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def run(self, stop_event=None):
+        """Until `stop_event` is set or every source has ended and the inference workers are done"""
+        while stop_event is None or not stop_event.is_set():
+            inference = [worker for worker in self.workers if worker.name.startswith('inference-')]
+            if all(worker.done for worker in inference):
+                break
+            time.sleep(0.2)
+
+    @property
+    def frames_processed(self):
+        return self._processed_before_restart + sum(stats['frames_processed'] for stats in list(self.stats.values()))
+
+    def metrics(self):
+        frames_dropped = {}
+        for stats in list(self.stats.values()):
+            frames_dropped.update(stats['frames_dropped'])
+        return {
+            'frames_read': {name: int(ring.header[FRAMES_READ]) for name, ring in self.rings.items()},
+            'frames_processed': self.frames_processed,
+            'frames_dropped': frames_dropped,
+            'restarts': {worker.name: worker.restarts for worker in self.workers if worker.restarts},
+            'alerts_fired': self.alerts_fired,
+        }
+
+    @property
+    def _encoders(self):
+        return [worker for worker in self.workers if worker.name.startswith('encoding-')]
+
+    def _join(self, workers, timeout):
+        deadline = time.time() + timeout
+        for worker in workers:
+            worker.process.join(max(0.1, deadline - time.time()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1.0)
+
+    def stop_intake(self, timeout=10.0):
+        """
+        Stop the capture and inference workers and pass on every sighting and event they sent, then
+        stop the collector. Stop the notifier and the event store after this and before stop().
+        """
+        if self._intake_closed.is_set():
+            return
+        self.intake_flag.value = 1
+        self._join([worker for worker in self.workers if worker not in self._encoders], timeout)
+        self._intake_closed.set()
+        if self._collector.is_alive():
+            self._collector.join(timeout)
+
+    def stop(self, timeout=10.0):
+        """Stop every worker (the encoders last, they export the clips of the last alerts), then free the shared memory"""
+        self.stop_intake(timeout)
+        self.stop_flag.value = 1
+        for commands in self.commands:
+            commands.put(None)
+        self._join(self._encoders, timeout)
+        self._closed.set()
+        for ring in self.rings.values():
+            ring.close()
@@ -0,0 +1,176 @@
+import time
+import logging
+import threading
+from collections import Counter
+
+from alerts import Alert
+from detections import CATEGORY_HUMANS, CATEGORY_FARMS
+
+# Seconds before the same class (or category) may alert again
+DEFAULT_COOLDOWNS = {CATEGORY_HUMANS: 60, CATEGORY_FARMS: 300}
+
+
+class Sighting:
+    """One new animal from the detection loop, before it becomes (part of) an SMS"""
+
+    def __init__(self, camera_name, class_name, category, confidence, location, clip=None, timestamp=None, event_ids=None):
+        self.camera_name = camera_name
+        self.class_name = class_name
+        self.category = category
+        self.confidence = confidence
+        self.location = location
+        self.clip = clip
+        self.timestamp = timestamp or time.time()
+        self.event_ids = event_ids or []    # rows of the event store, the whole herd
+
+
+def compose_message(sightings):
+    """SMS text for one or more sightings, the most dangerous first"""
+    first = sightings[0]
+    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(first.timestamp))
+    if len(sightings) == 1:
+        if first.category == CATEGORY_HUMANS:
+            return f"Warning......WILD ANIMAL DETECTED.....!!!!!!\n {first.class_name} is detected at {timestamp} nearby ({first.camera_name}), with {first.confidence}% confidence.\nLocation: {first.location}"
+        return f"Warning...........!!!!!!\n {first.class_name} is detected at {timestamp} near your farm ({first.camera_name}), with {first.confidence}% confidence.\nLocation: {first.location}"
+
+    header = "Warning......WILD ANIMALS DETECTED.....!!!!!!" if first.category == CATEGORY_HUMANS else "Warning...........!!!!!!"
+    lines = [header, f" {len(sightings)} animals detected at {timestamp}:"]
+    locations = {}
+    for sighting in sightings:
+        where = "nearby" if sighting.category == CATEGORY_HUMANS else "near your farm"
+        lines.append(f" - {sighting.class_name} {where} ({sighting.camera_name}), {sighting.confidence}% confidence")
+        locations.setdefault(sighting.camera_name, sighting.location)
+    for camera_name, location in locations.items():
+        lines.append(f"Location {camera_name}: {location}" if len(locations) > 1 else f"Location: {location}")
+    return "\n".join(lines)
+
+
+def compose_digest(sightings, since):
+    counts = Counter((sighting.class_name, sighting.camera_name) for sighting in sightings)
+    minutes = max(1, round((time.time() - since) / 60))
+    lines = [f"Digest of the last {minutes} min (already alerted, no clip):"]
+    lines += [f" - {count}x {class_name} ({camera_name})" for (class_name, camera_name), count in counts.most_common()]
+    return "\n".join(lines)
+
+
+class Notifier:
+    """
+    Turns the sightings of the detection loop into as few SMS as possible, on top of the AlertDispatcher.
+
+    - Cooldowns are kept per class (or per category with `cooldown_key='category'`), so a deer
+      does not silence a tiger that shows up right after it.
+    - The first sighting after a quiet period goes out right away. Everything arriving within the next
+      `coalesce_seconds` is held and goes out as a single message, with the clip of the most dangerous
+      one. The dispatcher adds the clip link to the same SMS.
+    - Sightings held back by a cooldown are summed up in a digest every `digest_seconds` (None: never).
+    """
+
+    def __init__(self, dispatcher, cooldowns=None, cooldown_key='class', coalesce_seconds=2.0, digest_seconds=None):
+        if cooldown_key not in ('class', 'category'):
+            raise ValueError("cooldown_key must be 'class' or 'category'")
+        self.dispatcher = dispatcher
+        self.cooldowns = DEFAULT_COOLDOWNS if cooldowns is None else cooldowns
+        self.cooldown_key = cooldown_key
+        self.coalesce_seconds = coalesce_seconds
+        self.digest_seconds = digest_seconds
+
+        self.counters = {'sightings': 0, 'alerts': 0, 'coalesced': 0, 'suppressed': 0, 'digests': 0}
+        self._last_alert = {}       # class name or category -> time of its last alert
+        self._batch = []
+        self._batch_deadline = None
+        self._last_flush = 0.0
+        self._suppressed = []
+        self._digest_since = time.time()
+        self._closed = False
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, sighting):
+        """Queue a sighting. Returns False if a cooldown held it back for the digest."""
+        key = sighting.class_name if self.cooldown_key == 'class' else sighting.category
+        with self._changed:
+            self.counters['sightings'] += 1
+            last = self._last_alert.get(key)
+            if last is not None and sighting.timestamp - last < self.cooldowns.get(sighting.category, 0):
+                self.counters['suppressed'] += 1
+                if self.digest_seconds:
+                    self._suppressed.append(sighting)
+                suppressed = True
+            else:
+                self._last_alert[key] = sighting.timestamp
+                if not self._batch:
+                    self._batch_deadline = max(time.time(), self._last_flush + self.coalesce_seconds)
+                self._batch.append(sighting)
+                self._changed.notify()
+                suppressed = False
+
+        if suppressed and sighting.clip is not None:
+            sighting.clip.release()
+        return not suppressed
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._due():
+                    self._changed.wait(self._wait_time())     # a new sighting may bring the deadline closer
+                batch = []
+                if self._batch and (self._closed or time.time() >= self._batch_deadline):
+                    batch, self._batch = self._batch, []
+                    self._last_flush = time.time()
+                digest = None
+                if self._suppressed and (self._closed or time.time() - self._digest_since >= self.digest_seconds):
+                    digest = compose_digest(self._suppressed, self._digest_since)
+                    self._suppressed = []
+                if self.digest_seconds and time.time() - self._digest_since >= self.digest_seconds:
+                    self._digest_since = time.time()
+                closed = self._closed and not self._batch
+
+            if batch:
+                self._send_batch(batch)
+            if digest:
+                self.counters['digests'] += 1
+                self.dispatcher.submit(Alert("digest", digest, None, time.strftime("%Y-%m-%d_%H-%M-%S")))
+            if closed:
+                return
+
+    def _due(self):
+        now = time.time()
+        return (self._closed
+                or (self._batch and now >= self._batch_deadline)
+                or (self.digest_seconds and now - self._digest_since >= self.digest_seconds))
+
+    def _wait_time(self):
+        deadlines = []
+        if self._batch:
+            deadlines.append(self._batch_deadline)
+        if self.digest_seconds:
+            deadlines.append(self._digest_since + self.digest_seconds)
+        return max(0.0, min(deadlines) - time.time()) if deadlines else None
+
+    def _send_batch(self, batch):
+        # Most dangerous first: animals harmful to humans, then by confidence
+        batch.sort(key=lambda sighting: (sighting.category != CATEGORY_HUMANS, -sighting.confidence))
+        lead = batch[0]
+        for sighting in batch[1:]:
+            if sighting.clip is not None:
+                sighting.clip.release()     # one clip per SMS, the others are not uploaded
+
+        self.counters['alerts'] += 1
+        self.counters['coalesced'] += len(batch) - 1
+        logging.info(f"Alert for {len(batch)} sighting(s): {', '.join(s.class_name for s in batch)}")
+        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(lead.timestamp))
+        event_ids = [event_id for sighting in batch for event_id in sighting.event_ids]
+        self.dispatcher.submit(Alert(lead.camera_name, compose_message(batch), lead.clip, timestamp,
+                                     priority=lead.category, event_ids=event_ids))
+
+    def metrics(self):
+        with self._changed:
+            return dict(self.counters)
+
+    def stop(self, timeout=10.0):
+        """Send what is still waiting to be coalesced (and the digest), then stop"""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,158 @@
+import time
+import logging
+import cv2 as cv
+
+from detections import detections_from_array
+from notifier import Sighting
+from roi import detect_frames
+from metrics import STAGE_SECONDS, MODEL_FPS
+
+
+class DetectionPipeline:
+    """
+    The capture -> inference -> post-processing -> alert loop of main.py.
+
+    It works on whatever cameras, engine and notifier it is given, so the live entry point
+    (main.py) and the offline replay benchmark (benchmarks/pipeline_replay.py) run exactly the same code path.
+    With `display=False` nothing is drawn on screen.
+    """
+
+    def __init__(self, cameras, frame_event, model, notifier, class_names, categories, min_confidence,
+                 imgsz=640, max_batch=16, cascade=None, display=True, pre_roll=5, post_roll=0,
+                 event_store=None, startup=None):
+        self.cameras = cameras
+        self.frame_event = frame_event
+        self.model = model
+        self.notifier = notifier
+        self.class_names = class_names
+        self.categories = categories
+        self.min_confidence = min_confidence
+        self.imgsz = imgsz
+        self.max_batch = max_batch
+        self.cascade = cascade
+        self.display = display
+        self.pre_roll = pre_roll        # seconds of video before the detection in the alert clip
+        self.post_roll = post_roll      # and after it (needs the 'segments' clip buffer)
+        self.event_store = event_store  # every new track is recorded there (event_store.EventStore)
+        self.startup = startup          # startup.StartupTimer, reports the time to the first inference
+
+        self.frames_processed = 0
+        self.alerts_fired = 0
+        self.latencies = None   # set to a list to keep every end-to-end latency (used by the benchmark)
+
+    def step(self, timeout=1.0):
+        """One round: collect the newest frame of every camera, detect, track, alert and display"""
+        # Sleep until any camera has decoded a new frame, then collect the newest frame of every camera
+        self.frame_event.wait(timeout=timeout)
+        self.frame_event.clear()
+        batch = []
+        for camera in self.cameras:
+            latest = camera.grabber.read_latest(timeout=0)
+            if latest is None:
+                continue
+
+            # Static scene or in between detector runs, let the tracker move the boxes and just show the frame
+            if not camera.wants_detection(latest[1]):
+                camera.tracker.predict()
+                self.show_frame(camera, latest)
+                continue
+            batch.append((camera, latest))
+
+        # Perform inference with YOLO model, all cameras (or their ROI crops) go through the model together
+        if batch:
+            frames = [latest[1] for _, latest in batch]
+            rois = [camera.roi for camera, _ in batch]
+            start = time.perf_counter()
+            if self.cascade is not None:
+                results = self.cascade.detect(self.model, frames, rois, self.imgsz, self.max_batch)
+            else:
+                results = detect_frames(self.model, frames, rois, self.imgsz, self.max_batch)
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, 'inference')
+            MODEL_FPS.set(round(len(frames) / elapsed, 2) if elapsed else 0)
+            if self.startup is not None:
+                self.startup.add('first_inference', elapsed)
+                self.startup.report('first inference')
+                self.startup = None
+
+            # Process bounding boxes and display results
+            for (camera, latest), result in zip(batch, results):
+                detected = self.process_detections(camera, result, latest[2])
+                if detected and camera.motion_gate is not None:
+                    camera.motion_gate.hold_open()
+
+                # Display the frame with detected objects
+                self.show_frame(camera, latest)
+
+        self.notifier.dispatcher.report_if_due(interval=10)
+
+        # Press 'q' to quit the loop
+        return not (self.display and cv.waitKey(1) & 0xFF == ord('q'))
+
+    def run(self, stop_event=None):
+        """Loop until 'q' is pressed, `stop_event` is set or every camera's source has ended"""
+        while stop_event is None or not stop_event.is_set():
+            if not self.step():
+                break
+            if all(camera.grabber.finished.is_set() for camera in self.cameras) and not self.frame_event.is_set():
+                break
+
+    def process_detections(self, camera, result, captured_at=None):
+        """
+        Feed one camera's result to its tracker, record every new animal in the event store and
+        queue an SMS/clip alert for it. Returns the number of confident detections.
+        """
+        # All boxes of the frame at once, filtered by confidence and alert category with array masks
+        with STAGE_SECONDS.time('postprocess'):
+            detections = detections_from_array(result, self.min_confidence, self.categories)
+            new_tracks = camera.tracker.update(detections)
+
+        # Send SMS alert and save video clip once per new animal, a herd of the same class shares one alert
+        herds = {}
+        for track in new_tracks:
+            track.alerted = True
+            herds.setdefault(self.class_names[track.class_index], []).append(track)
+
+        for class_name, tracks in herds.items():
+            track = tracks[0]
+            category = self.categories[track.class_index]
+            logging.info(f"Sighting on {camera.name}: {class_name} track #{track.track_id}, "
+                         f"box {[int(v) for v in track.box]}, {track.confidence}% confidence")
+            event_ids = []
+            if self.event_store is not None:
+                event_ids = [self.event_store.record(camera.name, class_name, category, member.confidence, member.box,
+                                                     member.track_id, captured_at) for member in tracks]
+
+            # Cooldowns, coalescing, the SMS, clip and upload happen on the notifier/dispatcher threads, not here
+            sighting = Sighting(camera.name, class_name, category, track.confidence, camera.location_on_map,
+                                camera.grabber.clip(self.pre_roll, self.post_roll), event_ids=event_ids)
+            if self.notifier.notify(sighting):
+                self.alerts_fired += 1
+
+        return len(detections)
+
+    def draw_tracks(self, frame, tracker):
+        """Display bounding box, class label and track ID of every live track"""
+        with STAGE_SECONDS.time('annotation'):
+            for track in tracker.tracks:
+                x1, y1, x2, y2 = (int(v) for v in track.box)
+                label = f'{self.class_names[track.class_index]} #{track.track_id} {track.confidence}%'
+                cv.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                cv.putText(frame, label, (x1, y1 - 10), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+    def show_frame(self, camera, latest):
+        """Display a processed frame with its tracks and record its end-to-end latency, from decode to display"""
+        frame_id, frame, captured_at = latest
+        if self.display:
+            # The clip buffer holds this same array and encodes it in the background, draw on a copy
+            frame = frame.copy()
+            self.draw_tracks(frame, camera.tracker)
+            with STAGE_SECONDS.time('display'):
+                cv.imshow(f'Animal Detection - {camera.name}', frame)
+
+        latency = time.time() - captured_at
+        self.frames_processed += 1
+        if self.latencies is not None:
+            self.latencies.append(latency)
+        camera.stats.record(latency)
+        camera.stats.report_if_due(camera.grabber, camera.motion_gate)
@@ -0,0 +1,119 @@
+import numpy as np
+import cv2 as cv
+
+
+class RegionOfInterest:
+    """
+    Polygon regions of one camera where detections matter (fields, fences, paths...).
+
+    Polygons are lists of (x, y) points, either in frame pixels or as fractions of the frame
+    width/height (all values <= 1). Only the bounding crops of the polygons are sent to the model,
+    and detections whose centre falls outside every polygon are thrown away.
+    """
+
+    def __init__(self, polygons, imgsz=416, margin=16):
+        self.polygons = [np.asarray(polygon, dtype=np.float32) for polygon in polygons]
+        self.imgsz = imgsz          # crops are smaller than the frame, so a smaller model input keeps the detail
+        self.margin = margin        # pixels added around each crop, so animals at the edge are not cut off
+        self._shape = None
+        self._mask = None
+        self._crops = None
+
+    def _prepare(self, frame_shape):
+        """Polygon mask and crop rectangles for this frame size (recomputed only if the size changes)"""
+        height, width = frame_shape[:2]
+        if self._shape == (height, width):
+            return
+        self._shape = (height, width)
+
+        pixel_polygons = []
+        for polygon in self.polygons:
+            if polygon.max() <= 1.0:
+                polygon = polygon * np.array([width, height], dtype=np.float32)
+            pixel_polygons.append(np.round(polygon).astype(np.int32))
+
+        self._mask = np.zeros((height, width), dtype=np.uint8)
+        cv.fillPoly(self._mask, pixel_polygons, 1)
+
+        rects = []
+        for polygon in pixel_polygons:
+            x, y, w, h = cv.boundingRect(polygon)
+            rects.append([max(0, x - self.margin), max(0, y - self.margin),
+                          min(width, x + w + self.margin), min(height, y + h + self.margin)])
+        self._crops = merge_overlapping(rects)
+
+    def crops(self, frame_shape):
+        """(x1, y1, x2, y2) rectangles to run the detector on"""
+        self._prepare(frame_shape)
+        return self._crops
+
+    def filter(self, boxes, frame_shape):
+        """Keep the rows of an (N, 6) box array whose centre lies inside a polygon"""
+        self._prepare(frame_shape)
+        if not len(boxes):
+            return boxes
+        height, width = self._shape
+        cx = ((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32).clip(0, width - 1)
+        cy = ((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.int32).clip(0, height - 1)
+        return boxes[self._mask[cy, cx] > 0]
+
+    def pixel_fraction(self, frame_shape):
+        """Share of the frame's pixels that still go to the model"""
+        self._prepare(frame_shape)
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in self._crops)
+        return area / (self._shape[0] * self._shape[1])
+
+
+def merge_overlapping(rects):
+    """Merge overlapping rectangles, so no part of the frame is sent to the model twice"""
+    rects = [list(rect) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(rect) for rect in rects]
+
+
+def detect_frames(model, frames, rois, imgsz, max_batch, conf=None):
+    """
+    Run the detector on a batch of frames, one RegionOfInterest (or None for the full frame) per frame.
+    Frames with ROIs contribute one crop per region at the ROI's smaller `imgsz` (never above `imgsz`,
+    e.g. a cascade's screening size), the boxes are shifted back to frame coordinates and filtered to
+    the polygons. Returns one (N, 6) array per frame.
+    """
+    jobs = {}   # imgsz -> list of (frame index, image, (x offset, y offset))
+    for index, (frame, roi) in enumerate(zip(frames, rois)):
+        if roi is None:
+            jobs.setdefault(imgsz, []).append((index, frame, (0, 0)))
+            continue
+        for x1, y1, x2, y2 in roi.crops(frame.shape):
+            # never upscale a small crop past its own size (rounded up to the model stride of 32)
+            size = min(imgsz, roi.imgsz, -(-max(x2 - x1, y2 - y1) // 32) * 32)
+            jobs.setdefault(size, []).append((index, frame[y1:y2, x1:x2], (x1, y1)))
+
+    per_frame = [[] for _ in frames]
+    for size, items in jobs.items():
+        for start in range(0, len(items), max_batch):
+            chunk = items[start:start + max_batch]
+            results = model.predict([image for _, image, _ in chunk], imgsz=size, conf=conf)
+            for (index, _, (dx, dy)), result in zip(chunk, results):
+                if dx or dy:
+                    result = result.copy()
+                    result[:, [0, 2]] += dx
+                    result[:, [1, 3]] += dy
+                per_frame[index].append(result)
+
+    outputs = []
+    for frame, roi, results in zip(frames, rois, per_frame):
+        boxes = np.concatenate(results) if results else np.zeros((0, 6), dtype=np.float32)
+        outputs.append(roi.filter(boxes, frame.shape) if roi is not None else boxes)
+    return outputs
@@ -0,0 +1,107 @@
+"""
+ultralytics side of dataset_cache.py: a YOLODataset that reads its images and labels from the shard
+cache of its split, and the detection trainer / validator that build it.
+
+    model.train(data='animals.yaml', trainer=ShardedDetectionTrainer, ...)
+    model.val(data='animals.yaml', validator=ShardedDetectionValidator, ...)
+
+Augmentation, mosaic, rect batches and the metrics are the stock ultralytics ones, only loading changes:
+a slice of a memory-mapped shard instead of a JPEG decode and resize, labels from one array instead of
+the label .txt files and their .cache. The cache of a split is (re)packed when its dataset changed.
+"""
+import os
+from copy import copy
+
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+from dataset_cache import ensure_shards
+
+
+class ShardedYOLODataset(YOLODataset):
+    """YOLODataset on the shard cache of `img_path` (a split folder like Animals/images/train)"""
+
+    def __init__(self, *args, img_path=None, imgsz=640, augment=True, **kwargs):
+        # The shards are the cache, RAM / disk caching of ultralytics would only copy them again
+        kwargs['cache'] = False
+        self.shards = ensure_shards(img_path, imgsz, augment)
+        self.shard_index = {}
+        super().__init__(*args, img_path=img_path, imgsz=imgsz, augment=augment, **kwargs)
+
+    def get_img_files(self, img_path):
+        files = [os.path.join(os.path.abspath(img_path), name) for name in self.shards.files]
+        self.shard_index = {path: index for index, path in enumerate(files)}
+        if self.fraction < 1:
+            files = files[:round(len(files) * self.fraction)]
+        return files
+
+    def get_labels(self):
+        self.label_files = []
+        labels = []
+        for im_file in self.im_files:
+            index = self.shard_index[im_file]
+            h0, w0 = (int(v) for v in self.shards.sizes[index][:2])
+            boxes = self.shards.labels(index)
+            labels.append(dict(
+                im_file=im_file,
+                shape=(h0, w0),
+                cls=boxes[:, 0:1].copy(),
+                bboxes=boxes[:, 1:].copy(),
+                segments=[],
+                keypoints=None,
+                normalized=True,
+                bbox_format='xywh'))
+        if not sum(len(label['cls']) for label in labels):
+            raise ValueError(f"All labels empty in {self.shards.directory}, can not start training without labels")
+        return labels
+
+    def load_image(self, i):
+        im, hw0, hw = self.shards.image(self.shard_index[self.im_files[i]])
+        if self.augment:
+            # Mosaic picks from the images loaded last, same bookkeeping as BaseDataset.load_image()
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, hw0, hw
+
+
+def build_sharded_dataset(cfg, img_path, batch, data, mode='train', rect=False, stride=32):
+    """ultralytics.data.build_yolo_dataset() with a ShardedYOLODataset"""
+    return ShardedYOLODataset(
+        img_path=img_path,
+        imgsz=cfg.imgsz,
+        batch_size=batch,
+        augment=mode == 'train',
+        hyp=cfg,
+        rect=cfg.rect or rect,
+        single_cls=cfg.single_cls or False,
+        stride=int(stride),
+        pad=0.0 if mode == 'train' else 0.5,
+        prefix=colorstr(f'{mode}: '),
+        use_segments=False,
+        use_keypoints=False,
+        classes=cfg.classes,
+        data=data,
+        fraction=cfg.fraction if mode == 'train' else 1.0)
+
+
+class ShardedDetectionValidator(DetectionValidator):
+
+    def build_dataset(self, img_path, mode='val', batch=None):
+        gs = max(int(de_parallel(self.model).stride if self.model else 0), 32)
+        return build_sharded_dataset(self.args, img_path, batch, self.data, mode=mode, stride=gs)
+
+
+class ShardedDetectionTrainer(DetectionTrainer):
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return build_sharded_dataset(self.args, img_path, batch, self.data, mode=mode, rect=mode == 'val', stride=gs)
+
+    def get_validator(self):
+        self.loss_names = 'box_loss', 'cls_loss', 'dfl_loss'
+        return ShardedDetectionValidator(self.test_loader, save_dir=self.save_dir, args=copy(self.args))
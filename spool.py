@@ -0,0 +1,374 @@
+"""
+On-disk upload spool for alert clips.
+
+A clip is moved into the spool folder next to a JSON sidecar (camera, priority, SMS follow-up...)
+before the first upload attempt, both written atomically, so neither a failed upload nor a crash
+or power cut loses the footage: the next start picks the folder up again. A background thread
+drains it, most dangerous animals first, retrying with a backoff, under an optional bandwidth cap,
+and optionally downscales clips first when the measured link is slow.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+import subprocess
+
+from metrics import STAGE_SECONDS
+
+CLIP_SUFFIX = '.mp4'
+SIDECAR_SUFFIX = '.json'
+
+
+def write_json_atomic(path, data):
+    """Write `data` to `path` so that a crash leaves either the old or the new file, never half of one"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class TokenBucket:
+    """Average rate limit of `rate` bytes per second, with bursts up to `burst` bytes"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """Take `amount` bytes, sleeping as long as it takes for the bucket to pay them back"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def downscale_clip(filename, height=360, bitrate='300k', ffmpeg='ffmpeg'):
+    """Re-encode a clip to a lower resolution and bitrate with ffmpeg, in place. Returns False if it failed."""
+    if shutil.which(ffmpeg) is None:
+        return False
+    tmp_path = filename + '.part'     # thrown away by the next start if we crash half-way
+    result = subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-i', filename, '-vf', f'scale=-2:{height}',
+                             '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', bitrate, '-an',
+                             '-movflags', '+faststart', '-f', 'mp4', tmp_path], capture_output=True)
+    if result.returncode != 0 or not os.path.exists(tmp_path):
+        logging.warning(f"Could not downscale {filename}: {result.stderr.decode(errors='replace').strip()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, filename)
+    return True
+
+
+class UploadSpool:
+    """
+    Persistent queue of clips waiting for upload. `storage_backend` is anything with an
+    upload(filename) -> link method (CloudinaryStorage, LocalStorage, HttpStorage...).
+
+    Entries are uploaded by priority (lower first, see Alert.priority), then oldest first.
+    `bandwidth_kbps` caps the average upload rate, `downscale_below_kbps` re-encodes clips to
+    `downscale_height` when the measured upload speed is below it. When the spool grows past
+    `max_mb`, the lowest-priority, oldest clips are given up first.
+    `on_uploaded(entry, link)` is called for entries that asked for a follow-up SMS.
+    """
+
+    def __init__(self, directory, storage_backend, bandwidth_kbps=None, max_mb=2048, retry_delay=5.0,
+                 max_retry_delay=600.0, downscale_below_kbps=None, downscale_height=360, downscale_bitrate='300k'):
+        self.directory = directory
+        self.storage_backend = storage_backend
+        self.bandwidth = TokenBucket(bandwidth_kbps * 125) if bandwidth_kbps else None    # kbit/s -> bytes/s
+        self.max_bytes = max_mb * 1024 * 1024 if max_mb else None
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.downscale_below_kbps = downscale_below_kbps
+        self.downscale_height = downscale_height
+        self.downscale_bitrate = downscale_bitrate
+        self.on_uploaded = None
+
+        # Backends that stream the file themselves can pace every chunk, the others are paced per file
+        if self.bandwidth is not None and hasattr(storage_backend, 'throttle'):
+            storage_backend.throttle = self.bandwidth
+
+        self.link_kbps = None       # moving average of the measured upload speed
+        self.counters = {'spooled': 0, 'uploaded': 0, 'failed_attempts': 0, 'downscaled': 0, 'evicted': 0, 'resumed': 0}
+        self.entries = {}           # id -> sidecar dict
+        self.links = {}             # id -> link, for uploads the dispatcher is still waiting for
+        self._awaited = set()       # ids added by a running dispatcher, until it has the link or gave up
+        self._uploading = None
+        self._closed = False
+        self._changed = threading.Condition()
+
+        os.makedirs(directory, exist_ok=True)
+        self._resume()
+        self._thread = threading.Thread(target=self._drain, name="upload-spool", daemon=True)
+        self._thread.start()
+
+    def _paths(self, entry_id):
+        base = os.path.join(self.directory, entry_id)
+        return base + CLIP_SUFFIX, base + SIDECAR_SUFFIX
+
+    def _resume(self):
+        """Pick up the entries left by a previous run, throw away half-written files"""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp') or name.endswith('.part'):
+                os.remove(path)
+                continue
+            if not name.endswith(SIDECAR_SUFFIX):
+                continue
+            entry_id = name[:-len(SIDECAR_SUFFIX)]
+            clip_path, _ = self._paths(entry_id)
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+            except ValueError:
+                logging.warning(f"Unreadable spool sidecar {path}, skipping it")
+                continue
+            if not os.path.exists(clip_path):
+                os.remove(path)
+                continue
+            entry['next_attempt'] = 0     # try again right away
+            self.entries[entry_id] = entry
+            self.counters['resumed'] += 1
+
+        # Clips whose sidecar never made it to disk still get uploaded, with default settings
+        for name in os.listdir(self.directory):
+            entry_id = name[:-len(CLIP_SUFFIX)]
+            if name.endswith(CLIP_SUFFIX) and entry_id not in self.entries:
+                self.entries[entry_id] = self._new_entry(entry_id, 'unknown', 99, None)
+                write_json_atomic(self._paths(entry_id)[1], self.entries[entry_id])
+                self.counters['resumed'] += 1
+        if self.entries:
+            logging.info(f"Upload spool resumed {len(self.entries)} clip(s) from {self.directory}")
+
+    def _new_entry(self, entry_id, camera_name, priority, timestamp):
+        return {
+            'id': entry_id,
+            'camera': camera_name,
+            'priority': priority,
+            'timestamp': timestamp,
+            'created_at': time.time(),
+            'attempts': 0,
+            'next_attempt': 0,
+            'downscaled': False,
+            'follow_up': None,      # SMS text prefix for a link sent after the alert SMS
+            'event_ids': [],        # detections of the event store the clip belongs to
+        }
+
+    def incoming_path(self):
+        """Where to export a new clip before add() moves it into the spool"""
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}{CLIP_SUFFIX}.part")
+
+    def add(self, filename, camera_name, priority, timestamp=None, event_ids=None):
+        """Move an exported clip into the spool, returns its entry id"""
+        entry_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{camera_name}_{uuid.uuid4().hex[:8]}"
+        clip_path, sidecar_path = self._paths(entry_id)
+        try:
+            os.replace(filename, clip_path)
+        except OSError:
+            shutil.copy(filename, clip_path + '.part')     # different file system, copy then rename
+            os.replace(clip_path + '.part', clip_path)
+            os.remove(filename)
+
+        entry = self._new_entry(entry_id, camera_name, int(priority), timestamp)
+        entry['event_ids'] = list(event_ids or [])
+        write_json_atomic(sidecar_path, entry)
+        with self._changed:
+            self.entries[entry_id] = entry
+            self._awaited.add(entry_id)
+            self.counters['spooled'] += 1
+            self._evict_if_full()
+            self._changed.notify_all()
+        return entry_id
+
+    def _evict_if_full(self):
+        # Caller holds self._changed
+        if not self.max_bytes:
+            return
+        total = self.nbytes
+        for entry_id in sorted(self.entries, key=lambda i: (-self.entries[i]['priority'], self.entries[i]['created_at'])):
+            if total <= self.max_bytes or len(self.entries) <= 1:
+                break
+            if entry_id == self._uploading:
+                continue
+            clip_path, sidecar_path = self._paths(entry_id)
+            total -= os.path.getsize(clip_path) if os.path.exists(clip_path) else 0
+            logging.warning(f"Upload spool over {self.max_bytes // (1024 * 1024)} MB, giving up clip {entry_id}")
+            self._remove(entry_id)
+            self.counters['evicted'] += 1
+
+    def _remove(self, entry_id):
+        for path in self._paths(entry_id):
+            if os.path.exists(path):
+                os.remove(path)
+        self.entries.pop(entry_id, None)
+
+    def wait(self, entry_id, timeout):
+        """The link of an entry once it is uploaded, None if that takes longer than `timeout` seconds"""
+        with self._changed:
+            self._changed.wait_for(lambda: entry_id in self.links or entry_id not in self.entries or self._closed, timeout)
+            return self.links.get(entry_id)
+
+    def request_follow_up(self, entry_id, text):
+        """
+        Ask for an SMS of `text` + link once the entry is uploaded, kept in the sidecar across restarts.
+        Returns the link right away if the upload finished in the meantime.
+        """
+        with self._changed:
+            self._awaited.discard(entry_id)
+            link = self.links.pop(entry_id, None)
+            if link:
+                return link
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                return None
+            entry['follow_up'] = text
+            write_json_atomic(self._paths(entry_id)[1], entry)
+            return None
+
+    def forget(self, entry_id):
+        """The dispatcher got the link (or gave up waiting), it no longer needs to be kept"""
+        with self._changed:
+            self._awaited.discard(entry_id)
+            self.links.pop(entry_id, None)
+
+    def _next_entry(self):
+        # Caller holds self._changed. Returns (entry id or None, seconds until the next retry is due)
+        now = time.time()
+        ready = [entry for entry in self.entries.values() if entry['next_attempt'] <= now]
+        if ready:
+            return min(ready, key=lambda entry: (entry['priority'], entry['created_at']))['id'], None
+        waiting = [entry['next_attempt'] - now for entry in self.entries.values()]
+        return None, min(waiting) if waiting else None
+
+    def _drain(self):
+        while True:
+            with self._changed:
+                entry_id, wait = self._next_entry()
+                while entry_id is None and not self._closed:
+                    self._changed.wait(wait)
+                    entry_id, wait = self._next_entry()
+                if self._closed:
+                    return
+                entry = dict(self.entries[entry_id])
+                self._uploading = entry_id
+            try:
+                self._upload(entry)
+            except Exception as e:
+                logging.error(f"Upload spool error on {entry_id}: {e}")
+                with self._changed:
+                    if entry_id in self.entries:
+                        self.entries[entry_id]['next_attempt'] = time.time() + self.max_retry_delay
+            finally:
+                self._uploading = None
+
+    def _upload(self, entry):
+        entry_id = entry['id']
+        clip_path, sidecar_path = self._paths(entry_id)
+        link = entry.get('link')    # set when the clip is uploaded and only its follow-up SMS is left
+
+        if not link:
+            slow_link = self.link_kbps is not None and self.downscale_below_kbps and self.link_kbps < self.downscale_below_kbps
+            if slow_link and not entry['downscaled']:
+                with STAGE_SECONDS.time('downscale'):
+                    if downscale_clip(clip_path, self.downscale_height, self.downscale_bitrate):
+                        self.counters['downscaled'] += 1
+                entry['downscaled'] = True
+
+            size = os.path.getsize(clip_path)
+            if self.bandwidth is not None and not hasattr(self.storage_backend, 'throttle'):
+                self.bandwidth.consume(size)
+            start = time.perf_counter()
+            try:
+                with STAGE_SECONDS.time('upload'):
+                    link = self.storage_backend.upload(clip_path)
+                if not link:
+                    raise ConnectionError("storage returned no link")
+            except Exception as e:
+                self._retry_later(entry, "Upload", e)
+                return
+
+            elapsed = time.perf_counter() - start
+            if elapsed > 0:
+                kbps = size * 8 / 1000 / elapsed
+                self.link_kbps = kbps if self.link_kbps is None else 0.7 * self.link_kbps + 0.3 * kbps
+            logging.info(f"Uploaded {entry_id} ({size / 1024:.0f} KB): {link}")
+
+            with self._changed:
+                follow_up = self.entries.get(entry_id, {}).get('follow_up')
+                entry['follow_up'] = follow_up
+                entry['link'] = link
+                entry['attempts'] = 0      # follow-up retries back off from the start
+                self.entries[entry_id] = entry
+                if follow_up is not None:
+                    write_json_atomic(sidecar_path, entry)     # a restart sends the SMS without uploading again
+                if entry_id in self._awaited:
+                    self.links[entry_id] = link
+                self.counters['uploaded'] += 1
+                if follow_up is None:
+                    self._changed.notify_all()
+        else:
+            with self._changed:
+                follow_up = self.entries.get(entry_id, {}).get('follow_up')
+
+        if follow_up is not None and self.on_uploaded is not None:
+            try:
+                self.on_uploaded(entry, f"{follow_up}{link}")
+            except Exception as e:
+                # Keep the clip, its sidecar and the link, only the SMS is tried again
+                self._retry_later(entry, "Follow-up SMS", e)
+                return
+
+        with self._changed:
+            for path in self._paths(entry_id):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.entries.pop(entry_id, None)
+            self._changed.notify_all()
+
+    def _retry_later(self, entry, step, error):
+        entry_id = entry['id']
+        entry['attempts'] += 1
+        delay = min(self.retry_delay * 2 ** (entry['attempts'] - 1), self.max_retry_delay)
+        entry['next_attempt'] = time.time() + delay
+        logging.warning(f"{step} of {entry_id} failed ({error}), attempt {entry['attempts']}, retrying in {delay:.0f}s")
+        with self._changed:
+            if entry_id in self.entries:
+                entry['follow_up'] = self.entries[entry_id].get('follow_up')
+                self.entries[entry_id] = entry
+                write_json_atomic(self._paths(entry_id)[1], entry)
+            self.counters['failed_attempts'] += 1
+
+    @property
+    def nbytes(self):
+        total = 0
+        for entry_id in list(self.entries):
+            clip_path = self._paths(entry_id)[0]
+            if os.path.exists(clip_path):
+                total += os.path.getsize(clip_path)
+        return total
+
+    def metrics(self):
+        with self._changed:
+            metrics = dict(self.counters)
+            metrics['pending'] = len(self.entries)
+        metrics['link_kbps'] = round(self.link_kbps, 1) if self.link_kbps is not None else None
+        return metrics
+
+    def stop(self, timeout=10.0):
+        """Stop after the current upload, whatever is left is picked up on the next start"""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join(timeout)
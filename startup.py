@@ -0,0 +1,83 @@
+"""
+Startup timing of main.py, and a small helper to run slow setup steps (model load, warm-up) on a
+background thread while the cameras connect.
+
+main.py imports this module first, so the breakdown starts before the heavy imports (cv2, numpy).
+"""
+import time
+import logging
+import threading
+
+PROCESS_STARTED = time.perf_counter()
+
+
+class StartupTimer:
+    """Seconds spent in each startup stage, and when the milestones (ready, first inference) were reached"""
+
+    def __init__(self, started=PROCESS_STARTED):
+        self.started = started
+        self.stages = {}        # name -> seconds, stages on other threads overlap with the main ones
+        self.milestones = {}    # name -> seconds since start
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        """Record that a milestone has been reached, returns the seconds since start"""
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self.milestones.setdefault(name, elapsed)
+        return elapsed
+
+    def report(self, milestone):
+        """Mark `milestone` and print / log the breakdown up to it"""
+        elapsed = self.mark(milestone)
+        with self._lock:
+            stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+        print(f"[INFO] {milestone} after {elapsed:.2f}s ({stages})")
+        logging.info(f"Startup: {milestone} after {elapsed:.2f}s ({stages})")
+        return elapsed
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class BackgroundTask:
+    """Runs `function(*args)` on a daemon thread, result() waits for it and re-raises its error"""
+
+    def __init__(self, function, *args, name="background-task"):
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(function, args), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, function, args):
+        try:
+            self._result = function(*args)
+        except BaseException as e:
+            self._error = e
+
+    def result(self, timeout=None):
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError(f"{self._thread.name} still running after {timeout}s")
+        if self._error is not None:
+            raise self._error
+        return self._result
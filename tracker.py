@@ -0,0 +1,109 @@
+import itertools
+import numpy as np
+from detections import detection_boxes
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU of every box in (A, 4) against every box in (B, 4), boxes as x1, y1, x2, y2"""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class Track:
+    """One animal followed across frames, with a constant-velocity motion model"""
+
+    def __init__(self, track_id, box, class_index, confidence):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # box change per processed frame
+        self.class_index = class_index
+        self.confidence = confidence
+        self.hits = 1               # detections matched to this track
+        self.misses = 0             # detection rounds in a row without a match
+        self.frames_since_update = 0
+        self.alerted = False
+
+    def predict(self):
+        self.box = self.box + self.velocity
+        self.frames_since_update += 1
+
+    def correct(self, box, confidence, smoothing=0.5):
+        """Blend in a matched detection (alpha-beta filter, the cheap cousin of a Kalman filter)"""
+        box = np.asarray(box, dtype=np.float32)
+        measured_velocity = (box - (self.box - self.velocity * self.frames_since_update)) / max(self.frames_since_update, 1)
+        self.velocity = smoothing * self.velocity + (1 - smoothing) * measured_velocity
+        self.box = box
+        self.confidence = confidence
+        self.hits += 1
+        self.misses = 0
+        self.frames_since_update = 0
+
+
+class IouTracker:
+    """
+    Assigns stable IDs to detections by greedy IoU matching (same class only).
+
+    Between detector runs, predict() moves every track along its estimated velocity, so boxes can be
+    drawn without running the model. A track is dropped after `max_misses` detector runs without a match.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=5, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def predict(self):
+        """Advance every track by one frame (used on frames the detector skipped)"""
+        for track in self.tracks:
+            track.predict()
+
+    def update(self, detections):
+        """
+        Match one frame of detection records (see detections.py) to the tracks.
+        Returns the confirmed tracks that have not been alerted on yet.
+        """
+        self.predict()
+
+        boxes = detection_boxes(detections)
+        matched_tracks = set()
+        matched_detections = set()
+        if self.tracks and len(detections):
+            track_boxes = np.stack([track.box for track in self.tracks])
+            track_classes = np.array([track.class_index for track in self.tracks])
+            iou = iou_matrix(track_boxes, boxes)
+            iou[track_classes[:, None] != detections['class_index'][None, :]] = 0
+
+            # Greedy matching, best overlap first
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                self.tracks[t].correct(boxes[d], int(detections[d]['confidence']))
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                self.tracks.append(Track(next(self._ids), boxes[d], int(detection['class_index']), int(detection['confidence'])))
+
+        return [track for track in self.tracks
+                if not track.alerted and track.hits >= self.min_hits and track.misses == 0]
+
+    def __len__(self):
+        return len(self.tracks)
@@ -1,18 +1,49 @@
+"""
+Evaluation of the detector: validate_model() reports mAP, precision, recall and the plots of a
+checkpoint. sweep() measures speed against accuracy over checkpoints, engines, imgsz, batch size
+and confidence cutoff on the val split. Its Pareto front is how the deployment settings of main.py
+(ENGINE, IMGSZ, MAX_BATCH_SIZE, MIN_CONFIDENCE) get picked.
+
+Accuracy of a sweep point is scored the way main.py alerts: a ground-truth box counts as found when
+a detection of its class with at least MIN_CONFIDENCE percent overlaps it with IoU >= 0.5. The
+engine runs once per (model, imgsz) at a low threshold, then every cutoff is scored from those
+detections. mAP comes from the ultralytics validator. Latency is measured through engines.py
+exactly as main.py calls it, with `batch` frames per call like `batch` cameras.
+
+    python validation.py                                    # validate best.pt
+    python validation.py --sweep --checkpoints best.pt last.pt --engines torch onnx openvino-int8 \\
+        --imgsz 416 640 --batch 1 4 --conf 50 70 85 90 --output eval_sweep.json
+"""
 # 📦 Required Libraries->
 import os
+import csv
+import json
+import time
 import shutil
+import argparse
 from pathlib import Path
-from ultralytics import YOLO
+
+import numpy as np
+import cv2 as cv
+
+from dataset_utils import dataset_images, read_labels
+from engines import ENGINE_WEIGHTS, load_engine, warm_up
+from tracker import iou_matrix
+
+SWEEP_COLUMNS = ['engine', 'weights', 'imgsz', 'batch', 'min_confidence', 'precision', 'recall', 'f1',
+                 'map50_95', 'map50', 'ms_per_frame', 'batch_p50_ms', 'batch_p95_ms', 'fps']
 
 
 # 🧪 Validation Function
-def validate_model(model_path, data_yaml_path):
-    """Validate the trained model"""
+def validate_model(model_path, data_yaml_path, use_shards=False):
+    """Validate the trained model, `use_shards` reads the val images from the shard cache (dataset_cache.py)"""
+    from ultralytics import YOLO
     print("🔍 Validating trained model...")
 
     model_path = Path(model_path)
     model = YOLO(model_path)
     results = model.val(
+        validator=_sharded_validator() if use_shards else None,
         data=data_yaml_path,
         split='val',
         conf=0.25,
@@ -49,9 +80,281 @@ def validate_model(model_path, data_yaml_path):
     return results
 
 
-# 🚀 Main Function Entry Point 
-if __name__ == "__main__":
-    model_path = "best.pt"
-    data_yaml_path = "animals.yaml"
+def _sharded_validator():
+    from sharded_dataset import ShardedDetectionValidator      # imports ultralytics
+    return ShardedDetectionValidator
+
+
+def accuracy(weights, data_yaml_path, imgsz=640, batch=1, use_shards=False):
+    """mAP of any weights ultralytics can load (.pt, .onnx, OpenVINO folders), at its default low conf"""
+    from ultralytics import YOLO
+    results = YOLO(weights, task='detect').val(data=data_yaml_path, imgsz=imgsz, batch=batch, plots=False,
+                                               verbose=False, validator=_sharded_validator() if use_shards else None)
+    return {
+        'map50_95': round(float(results.box.map), 4),
+        'map50': round(float(results.box.map50), 4),
+        'precision': round(float(results.box.mp), 4),
+        'recall': round(float(results.box.mr), 4),
+    }
+
+
+def ground_truth(image_path, frame_shape):
+    """Labels of one image as (N, 5) class, x1, y1, x2, y2 in pixels"""
+    height, width = frame_shape[:2]
+    labels = read_labels(image_path)
+    cls, cx, cy, w, h = labels.T
+    return np.stack([cls, (cx - w / 2) * width, (cy - h / 2) * height,
+                     (cx + w / 2) * width, (cy + h / 2) * height], axis=1)
+
+
+def score(truth, boxes, min_confidence):
+    """(true positives, ground-truth boxes, detections) for one image"""
+    boxes = boxes[np.ceil(boxes[:, 4] * 100) >= min_confidence]
+    if not len(truth) or not len(boxes):
+        return 0, len(truth), len(boxes)
+    iou = iou_matrix(truth[:, 1:5], boxes[:, :4])
+    iou[truth[:, 0][:, None] != boxes[:, 5][None, :]] = 0
+    matched = set()
+    found = 0
+    for t in range(len(truth)):
+        for d in np.argsort(-iou[t]):
+            if iou[t, d] < 0.5:
+                break
+            if d not in matched:
+                matched.add(d)
+                found += 1
+                break
+    return found, len(truth), len(boxes)
+
+
+def alert_scores(truths, predictions, confidences):
+    """Precision, recall and F1 of the alert rule at every MIN_CONFIDENCE in `confidences`"""
+    scores = {}
+    for min_confidence in confidences:
+        found = total = predicted = 0
+        for truth, boxes in zip(truths, predictions):
+            tp, gt, det = score(truth, boxes, min_confidence)
+            found, total, predicted = found + tp, total + gt, predicted + det
+        precision, recall = found / max(predicted, 1), found / max(total, 1)
+        scores[min_confidence] = {
+            'precision': round(precision, 4),
+            'recall': round(recall, 4),
+            'f1': round(2 * precision * recall / max(precision + recall, 1e-9), 4),
+        }
+    return scores
+
+
+def measure_latency(engine, frames, warmup=5, batch=1):
+    """Milliseconds per engine call of `batch` frames (like `batch` cameras) and frames per second"""
+    batches = [frames[start:start + batch] for start in range(0, len(frames) - batch + 1, batch)] or [frames]
+    for frames_ in batches[:warmup]:
+        engine.predict(frames_)
+    timings = []
+    for frames_ in batches:
+        start = time.perf_counter()
+        engine.predict(frames_)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'mean_ms': round(float(np.mean(timings)), 2),
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'fps': round(1000 * len(batches[0]) / float(np.mean(timings)), 1),
+    }
+
+
+def load_val_frames(data_yaml_path, images):
+    """Up to `images` val images with their ground truth in pixels"""
+    frames, truths = [], []
+    for path in dataset_images(data_yaml_path, 'val')[:images]:
+        frame = cv.imread(path)
+        if frame is not None:
+            frames.append(frame)
+            truths.append(ground_truth(path, frame.shape))
+    if not frames:
+        raise SystemExit(f"No val images found for {data_yaml_path}")
+    return frames, truths
+
+
+def sweep_models(checkpoints, engines):
+    """
+    (engine, weights) pairs of a sweep: every checkpoint through 'torch', the other engines with their
+    exported weights (ENGINE_WEIGHTS, or 'onnx=path/model.onnx')
+    """
+    models = []
+    for spec in engines:
+        kind, _, weights = spec.partition('=')
+        if kind not in ENGINE_WEIGHTS:
+            raise SystemExit(f"Unknown engine '{kind}', choose from {list(ENGINE_WEIGHTS)}")
+        if kind == 'torch' and not weights:
+            models += [(kind, checkpoint) for checkpoint in checkpoints]
+        else:
+            models.append((kind, weights or ENGINE_WEIGHTS[kind]))
+    return models
 
-    validate_model(model_path, data_yaml_path)
\ No newline at end of file
+
+def sweep(data_yaml_path, models, frames, truths, imgsizes=(640,), batches=(1,), confidences=(85,),
+          latency_images=100, skip_map=False, use_shards=False):
+    """One row per (engine, weights, imgsz, batch, confidence cutoff) on the val frames, see SWEEP_COLUMNS"""
+    low_conf = max(0.01, (min(confidences) - 1) / 100)
+    rows = []
+    for kind, weights in models:
+        if not os.path.exists(weights):
+            print(f"⚠️  {kind}: {weights} not found, skipping (run export_engines.py first)")
+            continue
+        for imgsz in imgsizes:
+            print(f"⏱️  {kind} {weights} @ {imgsz}...")
+            try:
+                engine = load_engine(kind, weights, imgsz=imgsz, conf=low_conf)
+                warm_up(engine, (imgsz,), batch=max(batches))
+                predictions = [engine.predict([frame])[0] for frame in frames]
+            except Exception as e:
+                # e.g. an export with a fixed input size or batch
+                print(f"⚠️  {kind} {weights} @ {imgsz} failed: {e}")
+                continue
+            scores = alert_scores(truths, predictions, confidences)
+            maps = {}
+            if not skip_map:
+                try:
+                    maps = accuracy(weights, data_yaml_path, imgsz, use_shards=use_shards)
+                except Exception as e:
+                    print(f"⚠️  mAP of {weights} @ {imgsz} failed: {e}")
+
+            for batch in batches:
+                try:
+                    timing = measure_latency(engine, frames[:latency_images], batch=batch)
+                except Exception as e:
+                    print(f"⚠️  {kind} {weights} @ {imgsz} batch {batch} failed: {e}")
+                    continue
+                for min_confidence in confidences:
+                    rows.append({
+                        'engine': kind, 'weights': weights, 'imgsz': imgsz, 'batch': batch,
+                        'min_confidence': min_confidence, **scores[min_confidence],
+                        'map50_95': maps.get('map50_95'), 'map50': maps.get('map50'),
+                        'ms_per_frame': round(timing['mean_ms'] / batch, 2),
+                        'batch_p50_ms': timing['p50_ms'], 'batch_p95_ms': timing['p95_ms'], 'fps': timing['fps'],
+                    })
+    return rows
+
+
+def pareto_front(rows, objective='f1', cost='ms_per_frame'):
+    """Rows no other row beats on both `objective` (higher is better) and `cost` (lower is better), cheapest first"""
+    rows = [row for row in rows if row.get(objective) is not None]
+    front = []
+    best = -1.0
+    for row in sorted(rows, key=lambda row: (row[cost], -row[objective])):
+        if row[objective] > best:
+            front.append(row)
+            best = row[objective]
+    return front
+
+
+def pick(front, objective='f1', cost='ms_per_frame', max_cost=None, min_precision=None):
+    """Most accurate front row within the budget (and precision floor), None if nothing fits"""
+    fitting = [row for row in front if (max_cost is None or row[cost] <= max_cost)
+               and (min_precision is None or row['precision'] >= min_precision)]
+    return max(fitting, key=lambda row: row[objective]) if fitting else None
+
+
+def _table(rows, columns):
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join('-' if row.get(column) is None else str(row[column]) for column in columns) + " |")
+    return "\n".join(lines)
+
+
+def write_sweep(rows, front, choice, settings, output):
+    """`output` (.json) with everything, the table as .csv and the Pareto report as .md beside it"""
+    base = os.path.splitext(output)[0]
+    with open(output, 'w') as f:
+        json.dump({'settings': settings, 'cpu_count': os.cpu_count(), 'rows': rows, 'pareto_front': front,
+                   'choice': choice}, f, indent=2)
+    with open(base + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SWEEP_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    objective, cost = settings['objective'], settings['cost']
+    lines = [
+        "# Speed vs accuracy sweep",
+        "",
+        f"{settings['data']}, {settings['images']} val images, {os.cpu_count()} CPU cores. "
+        f"Objective `{objective}` (alert rule, IoU >= 0.5), cost `{cost}`.",
+        "",
+        f"## Pareto front ({len(front)} of {len(rows)} points)",
+        "",
+        _table(front, SWEEP_COLUMNS),
+        "",
+        "## Suggested main.py settings",
+        "",
+    ]
+    if choice:
+        floor = f" and precision >= {settings['min_precision']}" if settings['min_precision'] else ""
+        lines += [
+            f"Best `{objective}` within {settings['max_ms'] or 'any'} ms ({cost}){floor}:",
+            "",
+            "```python",
+            f"ENGINE = '{choice['engine']}'      # {choice['weights']}",
+            f"IMGSZ = {choice['imgsz']}",
+            f"MAX_BATCH_SIZE = {choice['batch']}",
+            f"MIN_CONFIDENCE = {choice['min_confidence']}",
+            "```",
+            "",
+            f"precision {choice['precision']}, recall {choice['recall']}, f1 {choice['f1']}, "
+            f"{choice['ms_per_frame']} ms per frame, {choice['fps']} fps",
+        ]
+    else:
+        lines.append("No point fits the budget.")
+    with open(base + '.md', 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return base + '.csv', base + '.md'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a checkpoint, or sweep speed vs accuracy settings")
+    parser.add_argument('--model', default='best.pt', help="checkpoint to validate (without --sweep)")
+    parser.add_argument('--data', default='animals.yaml')
+    parser.add_argument('--use-shards', action='store_true', help="val images from the shard cache (dataset_cache.py)")
+    parser.add_argument('--sweep', action='store_true', help="speed vs accuracy sweep instead of one validation")
+    parser.add_argument('--checkpoints', nargs='+', default=['best.pt'], help="weights swept through the torch engine")
+    parser.add_argument('--engines', nargs='+', default=['torch'], help="engine names, or engine=weights")
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640])
+    parser.add_argument('--batch', type=int, nargs='+', default=[1])
+    parser.add_argument('--conf', type=int, nargs='+', default=[50, 60, 70, 75, 80, 85, 90],
+                        help="MIN_CONFIDENCE cutoffs in percent")
+    parser.add_argument('--images', type=int, default=300, help="val images scored")
+    parser.add_argument('--latency-images', type=int, default=100, help="val images timed per batch size")
+    parser.add_argument('--skip-map', action='store_true', help="no ultralytics validation, e.g. on a box without torch")
+    parser.add_argument('--objective', default='f1', choices=('f1', 'recall', 'precision', 'map50_95', 'map50'))
+    parser.add_argument('--cost', default='ms_per_frame', choices=('ms_per_frame', 'batch_p50_ms', 'batch_p95_ms'))
+    parser.add_argument('--max-ms', type=float, default=None, help="cost budget of the suggested settings")
+    parser.add_argument('--min-precision', type=float, default=None, help="precision floor of the suggested settings")
+    parser.add_argument('--output', default='eval_sweep.json')
+    args = parser.parse_args()
+
+    if not args.sweep:
+        validate_model(args.model, args.data, args.use_shards)
+        return
+
+    frames, truths = load_val_frames(args.data, args.images)
+    rows = sweep(args.data, sweep_models(args.checkpoints, args.engines), frames, truths, args.imgsz, args.batch,
+                 args.conf, args.latency_images, args.skip_map, args.use_shards)
+    if not rows:
+        raise SystemExit("Nothing measured")
+    front = pareto_front(rows, args.objective, args.cost)
+    choice = pick(front, args.objective, args.cost, args.max_ms, args.min_precision)
+    csv_path, report_path = write_sweep(rows, front, choice, {**vars(args), 'images': len(frames)}, args.output)
+
+    print(f"\n{'engine':<15}{'imgsz':>6}{'batch':>6}{'conf':>5}{'prec':>7}{'recall':>7}{'f1':>7}{'mAP50-95':>9}{'ms/frame':>9}{'fps':>7}")
+    for row in front:
+        print(f"{row['engine']:<15}{row['imgsz']:>6}{row['batch']:>6}{row['min_confidence']:>5}{row['precision']:>7}"
+              f"{row['recall']:>7}{row['f1']:>7}{row['map50_95'] if row['map50_95'] is not None else '-':>9}"
+              f"{row['ms_per_frame']:>9}{row['fps']:>7}")
+    if choice:
+        print(f"\n✅ Suggested: ENGINE='{choice['engine']}' ({choice['weights']}), IMGSZ={choice['imgsz']}, "
+              f"MAX_BATCH_SIZE={choice['batch']}, MIN_CONFIDENCE={choice['min_confidence']}")
+    print(f"\n📁 Saved to {args.output}, {csv_path} and {report_path}")
+
+
+# 🚀 Main Function Entry Point
+if __name__ == "__main__":
+    main()